@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from typing import Dict, List
+
+import numpy as np
+
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+from repartition.optimizer import Optimizer, SolverException, BACKENDS
+from repartition.cost_analysis import CostAnalysis
+from repartition.results_store import RESULTS_FORMATS
+from repartition.utils import save_run
+
+from .generator import generate_community, STEPS_PER_DAY
+
+PHASES = ('parsing', 'keys', 'build', 'solve', 'results', 'cost_analysis', 'saving')
+DEFAULT_USERS = [5, 10, 50, 100, 500, 1000]
+DEFAULT_STEPS = [7 * STEPS_PER_DAY, 30 * STEPS_PER_DAY, 365 * STEPS_PER_DAY]  # One week, one month and one year.
+
+
+def benchmark_community(n_users: int, n_steps: int, args: argparse.Namespace) -> Dict[str, float]:
+    """
+    Times each phase of one run on a synthetic community.
+
+    @param n_users: Number of users.
+    @param n_steps: Number of time steps.
+    @param args: Benchmark options.
+    @return Duration of each phase, in seconds.
+    """
+    with tempfile.TemporaryDirectory() as path:
+        paths = generate_community(n_users, n_steps, os.path.join(path, 'inputs'), pv_share=args.pv_share,
+                                   price_heterogeneity=args.price_heterogeneity, min_ssr_user=args.min_ssr_user,
+                                   seed=args.seed)
+        output_path = os.path.join(path, 'results')
+        os.makedirs(output_path)
+
+        timings = dict()
+        tic = time.perf_counter()
+        inputs = RepartitionKeysInputs(initial_keys_path='uniform', output_path=output_path, **paths)
+        timings['parsing'] = time.perf_counter() - tic
+
+        tic = time.perf_counter()
+        inputs = inputs.with_initial_keys(args.initial_keys)
+        timings['keys'] = time.perf_counter() - tic
+
+        optimizer = Optimizer(solver_name=args.solver, backend=args.backend, is_closed_form=args.is_closed_form)
+        results = optimizer.optimization_keys(inputs)
+        timings.update(optimizer.timings)
+
+        tic = time.perf_counter()
+        analysis = CostAnalysis(inputs, results)
+        analysis.analyze(is_saved=args.output_format == 'csv')
+        timings['cost_analysis'] = time.perf_counter() - tic
+
+        tic = time.perf_counter()
+        save_run(inputs, results, analysis, output_path, data_format=args.output_format)
+        timings['saving'] = time.perf_counter() - tic
+
+    return timings
+
+
+def scaling_exponents(runs: List[dict]) -> Dict[str, Dict[str, float]]:
+    """
+    Fits, for each phase, the duration as a power law of the number of users and of time steps:
+    duration = c * users^a * steps^b.
+
+    @param runs: Benchmark runs.
+    @return Exponents (a, b) of each phase, for the phases timed in enough runs with different sizes.
+    """
+    exponents = dict()
+    for phase in PHASES:
+        points = [(r['users'], r['steps'], r['timings'][phase]) for r in runs if r['timings'].get(phase, 0) > 0]
+        if len(points) < 3:
+            continue
+        log_points = np.log(np.array(points, dtype=float))
+        design = np.column_stack([log_points[:, 0], log_points[:, 1], np.ones(len(points))])
+        (users_exponent, steps_exponent, _), _, rank, _ = np.linalg.lstsq(design, log_points[:, 2], rcond=None)
+        if rank == 3:
+            exponents[phase] = {'users': float(users_exponent), 'steps': float(steps_exponent)}
+
+    return exponents
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description="""Times each phase of the optimization of the repartition keys on
+                                     synthetic communities of N users x T time steps.""")
+    parser.add_argument('-n', '--users', dest='users', type=int, nargs='+', default=DEFAULT_USERS,
+                        help="Numbers of users of the grid.")
+    parser.add_argument('-t', '--steps', dest='steps', type=int, nargs='+', default=DEFAULT_STEPS,
+                        help="Numbers of 15-minute time steps of the grid (default: one week, one month, one year).")
+    parser.add_argument('--pv_share', dest='pv_share', type=float, default=0.3,
+                        help="Share of the users with a PV installation.")
+    parser.add_argument('--price_heterogeneity', dest='price_heterogeneity', type=float, default=0.0,
+                        help="Relative spread of the prices between users.")
+    parser.add_argument('--min_ssr_user', dest='min_ssr_user', type=float, default=0.0,
+                        help="Minimum self-sufficiency rate of the users.")
+    parser.add_argument('-k', '--initial_keys', dest='initial_keys', default='proportional_dynamic',
+                        help="Type of initial keys to use: uniform, proportional_static, or proportional_dynamic.")
+    parser.add_argument('-b', '--backend', dest='backend', choices=BACKENDS, default='matrix', help="Model backend.")
+    parser.add_argument('-s', '--solver', dest='solver', default='cbc', help="Solver name of the pyomo backend.")
+    parser.add_argument('-l', '--lp', dest='is_closed_form', action='store_false',
+                        help="Always solve the linear program.")
+    parser.add_argument('--output_format', dest='output_format', choices=('csv', *RESULTS_FORMATS), default='csv',
+                        help="Format of the results.")
+    parser.add_argument('--seed', dest='seed', type=int, default=0, help="Seed of the random generator.")
+    parser.add_argument('-o', '--output', dest='output', default='benchmarks.json', help="JSON report.")
+    args = parser.parse_args()
+
+    runs = list()
+    report = {'scaling': dict()}
+    for n_steps in sorted(args.steps):
+        for n_users in sorted(args.users):
+            try:
+                timings = benchmark_community(n_users, n_steps, args)
+            except SolverException:  # Minimum self-sufficiency rate out of reach for this community
+                print(f'{n_users} users x {n_steps} steps: infeasible', flush=True)
+                continue
+            runs.append({'users': n_users, 'steps': n_steps, 'timings': timings})
+            print(f'{n_users} users x {n_steps} steps: '
+                  + ', '.join(f'{phase}: {duration:.2f} s' for phase, duration in timings.items()), flush=True)
+
+            # Written after each run, so that a long benchmark can be stopped at any time
+            report = {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'numpy': np.__version__,
+                'options': {k: v for k, v in vars(args).items() if k not in ('users', 'steps', 'output')},
+                'runs': runs,
+                'scaling': scaling_exponents(runs)
+            }
+            with open(args.output, 'w') as f:
+                f.write(json.dumps(report, indent=2))
+
+    for phase, exponents in report['scaling'].items():
+        print(f"{phase}: users^{exponents['users']:.2f} x steps^{exponents['steps']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+STEPS_PER_DAY = 96  # 15-minute time steps.
+DEFAULT_PRICES = {  # Default prices of the inputs, in the same units as the inputs file.
+    'price_retailer_in': 220.0, 'price_retailer_out': 60.0, 'price_local_in': 172.0, 'price_local_out': 100.0
+}
+
+
+def generate_community(n_users: int, n_steps: int, output_path: str, pv_share: float = 0.3,
+                       price_heterogeneity: float = 0.0, min_ssr_user: float = 0.0, seed: int = 0) -> dict:
+    """
+    Generates a synthetic renewable energy community and writes its input files: consumption.csv, production.csv and
+    inputs.json.
+
+    The consumption of each user follows a daily profile with morning and evening peaks, scaled by a random yearly
+    consumption and noised. A share of the users are prosumers with a PV installation, producing along a daily bell
+    curve modulated by the season and by random cloudiness.
+
+    @param n_users: Number of users.
+    @param n_steps: Number of 15-minute time steps.
+    @param output_path: Directory of the input files.
+    @param pv_share: Share of the users with a PV installation.
+    @param price_heterogeneity: Relative spread of the prices between users, 0 for the same prices for all of them.
+    @param min_ssr_user: Minimum self-sufficiency rate of the users, 0 to allow the closed-form solution.
+    @param seed: Seed of the random generator.
+    @return Paths of the input files: consumption_path, production_path and input_options_path.
+    """
+    rng = np.random.default_rng(seed)
+    times = pd.date_range('2021-01-01', periods=n_steps, freq='15min')
+    users = [f'User{i + 1}' for i in range(n_users)]
+    hours = (np.arange(n_steps) % STEPS_PER_DAY) / 4
+    days = np.arange(n_steps) // STEPS_PER_DAY
+
+    # Consumption, in kWh per time step
+    daily_profile = 0.4 + 0.6 * np.exp(-((hours - 8) / 1.5) ** 2) + np.exp(-((hours - 19) / 2) ** 2)
+    yearly_consumption = rng.lognormal(np.log(3500), 0.5, n_users)
+    consumption = daily_profile[:, np.newaxis] * rng.gamma(10, 0.1, (n_steps, n_users))
+    consumption *= yearly_consumption / (daily_profile.mean() * 365 * STEPS_PER_DAY)
+
+    # PV production, in kWh per time step
+    n_prosumers = int(round(pv_share * n_users))
+    season = 0.6 + 0.4 * np.cos(2 * np.pi * (days - 172) / 365)
+    sun = np.clip(np.cos(np.pi * (hours - 13) / 14), 0.0, None) ** 2 * season
+    cloudiness = rng.uniform(0.3, 1.0, (days.max() + 1, n_prosumers))[days]
+    peak_power = rng.uniform(3, 10, n_prosumers)
+    production = pd.DataFrame(-sun[:, np.newaxis] * cloudiness * peak_power / 4, index=times,
+                              columns=users[:n_prosumers])
+
+    os.makedirs(output_path, exist_ok=True)
+    paths = {name: os.path.join(output_path, file) for name, file in [
+        ('consumption_path', 'consumption.csv'), ('production_path', 'production.csv'),
+        ('input_options_path', 'inputs.json')
+    ]}
+    pd.DataFrame(consumption, index=times, columns=users).to_csv(paths['consumption_path'])
+    production.to_csv(paths['production_path'])
+
+    input_options = {f'default_{name}': price for name, price in DEFAULT_PRICES.items()}
+    if price_heterogeneity > 0:
+        input_options.update({
+            name: dict(zip(users, (price * rng.uniform(1 - price_heterogeneity, 1 + price_heterogeneity, n_users))
+                           .tolist()))
+            for name, price in DEFAULT_PRICES.items()
+        })
+    input_options['default_min_ssr_user'] = min_ssr_user
+    with open(paths['input_options_path'], 'w') as f:
+        f.write(json.dumps(input_options, indent=2))
+
+    return paths
@@ -0,0 +1,40 @@
+import json
+import subprocess
+import sys
+
+from typing import List, Tuple
+
+IMPORT_TIME_BUDGET = 1.5  # Maximum cold import time of the package and of the command line, in seconds.
+HEAVY_MODULES = ('pyomo', 'matplotlib', 'scipy.optimize')  # Only imported by the capabilities needing them.
+
+_MEASURE = """
+import json, sys, time
+tic = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - tic
+print(json.dumps({{'elapsed': elapsed, 'modules': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import_time(module: str, runs: int = 3) -> Tuple[float, List[str]]:
+    """
+    Measures the time taken to import a module in a new interpreter.
+
+    @param module: Module to import, e.g. repartition or repartition.__main__ for the command line.
+    @param runs: Number of interpreters, the fastest one being kept to leave out the noise of the machine.
+    @return Import time in seconds and heavy modules imported along, see `HEAVY_MODULES`.
+    """
+    measures = list()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', _MEASURE.format(module=module, heavy=HEAVY_MODULES)],
+                                check=True, capture_output=True, text=True).stdout
+        measures.append(json.loads(output))
+
+    return min(m['elapsed'] for m in measures), measures[0]['modules']
+
+
+if __name__ == '__main__':
+    for name in ('repartition', 'repartition.__main__'):
+        elapsed, modules = measure_import_time(name)
+        print(f"{name}: {elapsed:.3f} seconds (budget {IMPORT_TIME_BUDGET:.1f}), heavy modules: "
+              f"{', '.join(modules) or 'none'}")
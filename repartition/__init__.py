@@ -1,4 +1,25 @@
+import importlib
+
 from .utils import *
 from .repartition_keys_inputs import RepartitionKeysInputs, UserInputException
-from .optimizer import Optimizer
-from .plotter import Plotter
+from .keys_strategies import register_keys_strategy, KEYS_STRATEGIES
+from .keys import Keys
+
+# Imported on first use, their dependencies (Pyomo, SciPy, matplotlib) being slow to import
+_LAZY_ATTRIBUTES = {
+    'Optimizer': '.optimizer',
+    'Plotter': '.plotter',
+    'KeyEvaluator': '.key_evaluator',
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
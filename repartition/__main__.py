@@ -1,96 +1,386 @@
 import argparse
+import json
 import os
 import time
 import sys
 
 from .repartition_keys_inputs import RepartitionKeysInputs, UserInputException
-from .optimizer import Optimizer, SolverException
+from .cache import InputsCache
+from .optimizer import Optimizer, SolverException, BACKENDS
 from .cost_analysis import CostAnalysis
-from .plotter import Plotter
-from .utils import save_df_dict, ParsingException
+from .sweep import read_grid, run_sweep
+from .billing_periods import PERIODS
+from .rolling_horizon import RollingHorizon
+from .frontier import SSRFrontier, TARGETS
+from .server import OptimizationServer
+from .results_store import RESULTS_FORMATS
+from .profiler import Profiler
+from .utils import convert_data, results_to_frames, save_run, ParsingException, BINARY_FORMATS
 
 import warnings
 warnings.simplefilter(action='ignore', category=UserWarning)
 
 
-if __name__ == "__main__":
-
-    # Create variable inputs
-    inputs = None
-
-    # Argument parsing
-    parser = argparse.ArgumentParser(description="Parses the inputs for the module to run.")
-    parser.add_argument('data_consumption', help="Input consumption profiles.")
-    parser.add_argument('-dp', '--data_production', dest='data_production', help="Input production profiles.")
+def _add_input_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the arguments reading the inputs and writing the outputs, shared by all the commands optimizing keys.
+    """
+    parser.add_argument('data_consumption',
+                        help="Input consumption profiles (csv, parquet, feather, npz or memory-mapped npy file).")
+    parser.add_argument('-dp', '--data_production', dest='data_production',
+                        help="Input production profiles, in the same formats as the consumption.")
     parser.add_argument('-k', '--initial_keys', dest='initial_keys',
-                        help="Type of initial keys to use: uniform, proportional_static, or proportional_dynamic.",
+                        help="""Type of initial keys to use: uniform, proportional_static, proportional_dynamic,
+                        proportional_rolling[:window], priority[:user,...] or any registered strategy, or file with the
+                        initial keys, in the same formats as the consumption.""",
                         default='uniform')
     parser.add_argument('-i', '--input_options', dest='input_options',
                         help="""json file with several options: price_retailer_in, price_retailer_out, price_local_in,
                         price_local_out, price_deviation_energy, max_deviation, default_max_deviation, min_ssr_user,
                         default_min_ssr_user, min_ssr_rec, scaling_factor, or slack_costs. More info can be found on the
                         README.""")
-    parser.add_argument('-s', '--solver', dest='solver', help="Solver name (cbc, cplex ...)", default='cbc')
+    parser.add_argument('--cache', dest='cache_path',
+                        help="Directory caching the parsed input files and the initial keys between runs.")
+    parser.add_argument('--cache_size', dest='cache_size', default=1024, type=float,
+                        help="Maximum size of the cache in MB, the least recently used inputs are removed beyond it.")
     parser.add_argument('-o', '--output', dest='output_path', default='.', type=str, help="Output path")
-    parser.add_argument('-p', '--plot', dest='is_plot', action='store_true', help="Plot flag")
     parser.add_argument('-d', '--debug', dest='is_debug', action='store_true', help="Debug mode")
     parser.add_argument('-v', '--verbose', dest='is_verbose', action='store_true', help="Verbose mode")
 
-    args = parser.parse_args()
 
+def _add_solver_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the arguments choosing how the keys are optimized, for the commands going through the optimizer.
+    """
+    parser.add_argument('-s', '--solver', dest='solver', default='cbc',
+                        help="Solver name (cbc, cplex ...). highs solves the model in memory, without files.")
+    parser.add_argument('-b', '--backend', dest='backend', choices=BACKENDS, default='pyomo',
+                        help="""Model backend: pyomo builds the model with Pyomo and solves it with the given solver,
+                        matrix builds it directly as sparse matrices and solves it in memory with HiGHS, decomposition
+                        splits it into blocks of time steps solved in parallel with the matrix backend.""")
+    parser.add_argument('--blocks', dest='block_frequency', default='W',
+                        help="Blocks of time steps of the decomposition backend, as a pandas frequency (default: W).")
+    parser.add_argument('-l', '--lp', dest='is_closed_form', action='store_false',
+                        help="""Always solve the linear program, even without minimum self-sufficiency rates, when the
+                        keys can be computed without solver.""")
+
+
+def _add_output_format_argument(parser: argparse.ArgumentParser):
+    """
+    Adds the format of the results, for the commands saving the results of runs.
+    """
+    parser.add_argument('--output_format', dest='output_format', choices=('csv', *RESULTS_FORMATS), default='csv',
+                        help="""Format of the results: csv files, or a single compressed file with all the results,
+                        inputs and metadata of the run (npz, or parquet which requires pyarrow).""")
+
+
+def _read_inputs(args: argparse.Namespace, profiler: Profiler) -> RepartitionKeysInputs:
+    """
+    Reads the input files, exits if they are not valid.
+    """
     # Prepare output path
     os.makedirs(args.output_path, exist_ok=True)
 
     # Read input files
     tic = time.time()
+    cache = None if args.cache_path is None else InputsCache(args.cache_path, int(args.cache_size * 2 ** 20))
     try:
-        inputs = RepartitionKeysInputs(
-            consumption_path=args.data_consumption,
-            production_path=args.data_production,
-            initial_keys_path=args.initial_keys,
-            output_path=args.output_path,
-            input_options_path=args.input_options
-        )
-    except (ParsingException, UserInputException) as e:
+        with profiler.phase('parsing'):
+            inputs = RepartitionKeysInputs(
+                consumption_path=args.data_consumption,
+                production_path=args.data_production,
+                initial_keys_path=args.initial_keys,
+                output_path=args.output_path,
+                input_options_path=args.input_options,
+                cache=cache
+            )
+    except (ParsingException, UserInputException, ImportError) as e:
         print(e, file=sys.stderr)
         exit(1)
+    profiler.add_statistics('inputs', {'time_steps': len(inputs.times), 'users': len(inputs.users)})
 
     if args.is_verbose:
         print(f"Input files read in {time.time() - tic:.2f} seconds.")
 
+    return inputs
+
+
+def run(args: argparse.Namespace):
+    """
+    Optimizes the repartition keys once.
+    """
+    profiler = Profiler(is_tracemalloc=args.is_profile_memory)
+    inputs = _read_inputs(args, profiler)
+
     # Optimize
-    optimizer = Optimizer(solver_name=args.solver, is_debug=args.is_debug)
+    optimizer = Optimizer(solver_name=args.solver, is_debug=args.is_debug, backend=args.backend,
+                          is_closed_form=args.is_closed_form, block_frequency=args.block_frequency, jobs=args.jobs,
+                          profiler=profiler, representative_days=args.representative_days,
+                          coarse_frequency=args.coarse_frequency, trust_radius=args.trust_radius,
+                          billing_period=args.billing_period)
     tic = time.time()
     try:
-        results = optimizer.optimization_keys(inputs)
+        arrays = optimizer.optimization_arrays(inputs)
+        results = results_to_frames(arrays, inputs.times, inputs.users)
     except SolverException as e:
         print(e, file=sys.stderr)
         exit(1)
 
+    # Errors of the representative days against the optimization over the whole horizon
+    if args.is_check_approximation and optimizer.representative_days_solver is not None:
+        exact_optimizer = Optimizer(solver_name=args.solver, is_debug=args.is_debug, backend=args.backend,
+                                    is_closed_form=args.is_closed_form, block_frequency=args.block_frequency,
+                                    jobs=args.jobs)
+        try:
+            exact_arrays = exact_optimizer.optimization_arrays(inputs)
+        except SolverException as e:
+            # The results of the representative days are still saved, without their errors
+            print(f'Approximation not checked, the optimization over the whole horizon failed: {e}', file=sys.stderr)
+        else:
+            errors = optimizer.representative_days_solver.errors(arrays, exact_arrays)
+            profiler.add_statistics('approximation_errors', errors)
+            with open(os.path.join(args.output_path, 'approximation.json'), 'w') as f:
+                f.write(json.dumps(errors, indent=2))
+            print('Errors of the representative days: ' + ', '.join(
+                f"{name}: ssr_user {e['ssr_user']:.2e}, ssr_rec {e['ssr_rec']:.2e}, objective {e['objective']:.2e}"
+                for name, e in errors.items()))
+
+    # Self-sufficiency rates of each billing period
+    if optimizer.billing_period_solver is not None:
+        optimizer.billing_period_solver.ssr_report().to_csv(os.path.join(args.output_path, 'ssr_periods.csv'))
+
     # Cost analysis
-    analysis = CostAnalysis(inputs, results)
-    analysis.analyze()
+    with profiler.phase('cost_analysis'):
+        analysis = CostAnalysis(inputs, results)
+        analysis.analyze(is_saved=args.output_format == 'csv')
 
     if args.is_verbose:
         print(f"Repartition keys optimized in {time.time() - tic:.2f} seconds.")
+        print(', '.join(f'{phase}: {duration:.2f} s' for phase, duration in optimizer.timings.items()))
+        if args.backend == 'decomposition':
+            print(f"Duality gap: {optimizer.duality_gap:.2e}.")
 
     # Save results
-    save_df_dict(results, args.output_path)
-    save_df_dict(
-        {
-            'initial_keys': inputs.initial_keys,
-            'initial_allocated_production': inputs.initial_allocated_production,
-            'consumption': inputs.consumption_total,
-            'production': inputs.production_total,
-            'self_consumption': analysis.self_consumption,
-            'global_sales': analysis.global_sales
-         },
-        args.output_path
-    )
+    metadata = {'arguments': vars(args), 'input_options': inputs.input_options, 'timings': optimizer.timings,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    with profiler.phase('saving'):
+        save_run(inputs, results, analysis, args.output_path, data_format=args.output_format, metadata=metadata)
 
     if args.is_plot:
-        plotter = Plotter(analysis, args.output_path)
-        plotter.plot_online_series()
+        from .plotter import Plotter  # matplotlib is slow to import
+
+        with profiler.phase('plotting'):
+            plotter = Plotter(analysis, args.output_path)
+            plotter.plot_online_series()
+
+    if args.is_profile or args.is_profile_memory:
+        profiler.save(os.path.join(args.output_path, 'profile.json'))
 
     if args.is_verbose:
         print(f'Results saved in "{args.output_path}".')
+
+
+def sweep(args: argparse.Namespace):
+    """
+    Optimizes the repartition keys for every point of a parameter grid, reading the input files once.
+    """
+    try:
+        points = read_grid(args.grid)
+    except UserInputException as e:
+        print(e, file=sys.stderr)
+        exit(1)
+    inputs = _read_inputs(args, Profiler())
+
+    tic = time.time()
+    summary = run_sweep(inputs, points, args.output_path, jobs=args.jobs, solver_name=args.solver,
+                        backend=args.backend, is_closed_form=args.is_closed_form,
+                        block_frequency=args.block_frequency, output_format=args.output_format,
+                        is_verbose=args.is_verbose)
+
+    if args.is_verbose:
+        print(f"Sweep of {len(summary)} grid points finished in {time.time() - tic:.2f} seconds.")
+        print(f'Results saved in "{args.output_path}".')
+
+
+def rolling(args: argparse.Namespace):
+    """
+    Optimizes the repartition keys of a new window, with the state of the previous windows of the year.
+    """
+    inputs = _read_inputs(args, Profiler())
+
+    tic = time.time()
+    try:
+        rolling_horizon = RollingHorizon(args.state_path, is_debug=args.is_debug)
+        arrays = rolling_horizon.step(inputs)
+        results = results_to_frames(arrays, inputs.times, inputs.users)
+    except (SolverException, UserInputException) as e:
+        print(e, file=sys.stderr)
+        exit(1)
+    analysis = CostAnalysis(inputs, results)
+    analysis.analyze(is_saved=args.output_format == 'csv')
+    metadata = {'arguments': vars(args), 'input_options': inputs.input_options, 'state': rolling_horizon.state,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    save_run(inputs, results, analysis, args.output_path, data_format=args.output_format, metadata=metadata)
+
+    if args.is_verbose:
+        print(f"Window {rolling_horizon.state['windows']} optimized in {time.time() - tic:.2f} seconds.")
+        print(f"Self-sufficiency rate of the REC to date: {arrays['ssr_rec']:.4f}.")
+        print(f'Results saved in "{args.output_path}".')
+
+
+def frontier(args: argparse.Namespace):
+    """
+    Traces the frontier of the costs against a minimum self-sufficiency rate.
+    """
+    inputs = _read_inputs(args, Profiler())
+
+    tic = time.time()
+    ssr_frontier = SSRFrontier(inputs, target=args.target, is_debug=args.is_debug)
+    try:
+        table = ssr_frontier.solve()
+    except SolverException as e:
+        print(e, file=sys.stderr)
+        exit(1)
+    table.to_csv(os.path.join(args.output_path, 'frontier.csv'))
+
+    if args.is_plot:
+        from .plotter import Plotter  # matplotlib is slow to import
+
+        Plotter.plot_frontier(table, args.output_path)
+
+    if args.is_verbose:
+        print(f"Frontier of {len(table)} breakpoints traced in {ssr_frontier.solves} solves and "
+              f"{time.time() - tic:.2f} seconds.")
+        print(f"Maximum feasible minimum self-sufficiency rate: {ssr_frontier.maximum_ssr:.4f}.")
+        print(f'Results saved in "{args.output_path}".')
+
+
+def serve(args: argparse.Namespace):
+    """
+    Serves optimization jobs until interrupted.
+    """
+    server = OptimizationServer(socket_path=args.socket_path, port=args.port, jobs=args.jobs,
+                                cache_path=args.cache_path, cache_size=int(args.cache_size * 2 ** 20),
+                                is_verbose=args.is_verbose)
+    server.run()
+
+
+def convert(args: argparse.Namespace):
+    """
+    Converts input files into another format.
+    """
+    os.makedirs(args.output_path, exist_ok=True)
+    for path in args.files:
+        try:
+            converted_path = convert_data(path, args.data_format, args.output_path)
+        except ParsingException as e:
+            print(f'{path}: {e}', file=sys.stderr)
+            exit(1)
+        except ImportError as e:
+            print(e, file=sys.stderr)
+            exit(1)
+        if args.is_verbose:
+            print(f'{path} converted into {converted_path}.')
+
+
+if __name__ == "__main__":
+
+    # Argument parsing
+    if len(sys.argv) > 1 and sys.argv[1] == 'sweep':
+        parser = argparse.ArgumentParser(prog='python -m repartition sweep',
+                                         description="Optimizes the repartition keys over a grid of parameters.")
+        _add_input_arguments(parser)
+        _add_solver_arguments(parser)
+        _add_output_format_argument(parser)
+        parser.add_argument('-g', '--grid', dest='grid', required=True,
+                            help="""json file {parameter: [values]} with the grid of parameters: initial_keys or any
+                            option of the inputs file except scaling.""")
+        parser.add_argument('-j', '--jobs', dest='jobs', default=1, type=int,
+                            help="Maximum number of grid points optimized in parallel.")
+        sweep(parser.parse_args(sys.argv[2:]))
+    elif len(sys.argv) > 1 and sys.argv[1] == 'rolling':
+        parser = argparse.ArgumentParser(prog='python -m repartition rolling',
+                                         description="""Optimizes the repartition keys of a new window (e.g. the last
+                                         day), with the minimum self-sufficiency rates as running targets over the
+                                         year.""")
+        _add_input_arguments(parser)
+        _add_output_format_argument(parser)
+        parser.add_argument('--state', dest='state_path', required=True,
+                            help="""Directory of the state store, keeping the totals of the previous windows of the
+                            year and the results of each window. Created at the first window.""")
+        rolling(parser.parse_args(sys.argv[2:]))
+    elif len(sys.argv) > 1 and sys.argv[1] == 'frontier':
+        parser = argparse.ArgumentParser(prog='python -m repartition frontier',
+                                         description="""Traces the exact frontier of the costs against the minimum
+                                         self-sufficiency rate, up to the maximum feasible one, in frontier.csv.""")
+        _add_input_arguments(parser)
+        parser.add_argument('-t', '--target', dest='target', choices=TARGETS, default='rec',
+                            help="""Minimum self-sufficiency rate traced: of the REC (min_ssr_rec), or the same one for
+                            all the users (default_min_ssr_user).""")
+        parser.add_argument('-p', '--plot', dest='is_plot', action='store_true', help="Plot flag")
+        frontier(parser.parse_args(sys.argv[2:]))
+    elif len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        parser = argparse.ArgumentParser(prog='python -m repartition serve',
+                                         description="""Serves optimization jobs sent as json lines on a local socket,
+                                         with the modules, inputs and models kept in memory between jobs.""")
+        address = parser.add_mutually_exclusive_group(required=True)
+        address.add_argument('--socket', dest='socket_path', help="Unix socket to listen on.")
+        address.add_argument('--port', dest='port', type=int, help="TCP port to listen on, on the local host.")
+        parser.add_argument('-j', '--jobs', dest='jobs', default=1, type=int,
+                            help="Number of worker processes, i.e. of jobs run in parallel.")
+        parser.add_argument('--cache', dest='cache_path',
+                            help="Directory caching the parsed input files (default: in the temporary directory).")
+        parser.add_argument('--cache_size', dest='cache_size', default=1024, type=float,
+                            help="Maximum size of the cache in MB.")
+        parser.add_argument('-v', '--verbose', dest='is_verbose', action='store_true', help="Verbose mode")
+        serve(parser.parse_args(sys.argv[2:]))
+    elif len(sys.argv) > 1 and sys.argv[1] == 'convert':
+        parser = argparse.ArgumentParser(prog='python -m repartition convert',
+                                         description="""Converts input files (consumption, production or initial
+                                         keys) into formats faster to read.""")
+        parser.add_argument('files', nargs='+', help="Input files to convert.")
+        parser.add_argument('-f', '--format', dest='data_format', choices=('csv', *BINARY_FORMATS), default='npy',
+                            help="""Format of the converted files (default: npy, memory-mapped with an index file
+                            <name>.index.npz). parquet and feather require pyarrow.""")
+        parser.add_argument('-o', '--output', dest='output_path', default='.', type=str, help="Output path")
+        parser.add_argument('-v', '--verbose', dest='is_verbose', action='store_true', help="Verbose mode")
+        convert(parser.parse_args(sys.argv[2:]))
+    else:
+        parser = argparse.ArgumentParser(description="Parses the inputs for the module to run.",
+                                         epilog="""Run 'python -m repartition sweep -h' for parameter sweeps,
+                                         'python -m repartition rolling -h' for the optimization window by window,
+                                         'python -m repartition frontier -h' for the costs against the minimum
+                                         self-sufficiency rate,
+                                         'python -m repartition serve -h' to serve optimization jobs and
+                                         'python -m repartition convert -h' to convert the input files.""")
+        _add_input_arguments(parser)
+        _add_solver_arguments(parser)
+        _add_output_format_argument(parser)
+        parser.add_argument('--profile', dest='is_profile', action='store_true',
+                            help="""Write a json report (profile.json in the output path) with the wall time, CPU time
+                            and peak memory of each phase, and the size and build time of the model.""")
+        parser.add_argument('--profile_memory', dest='is_profile_memory', action='store_true',
+                            help="""Profile with the peak memory allocated by Python in each phase (tracemalloc),
+                            slower.""")
+        parser.add_argument('-p', '--plot', dest='is_plot', action='store_true', help="Plot flag")
+        parser.add_argument('-j', '--jobs', dest='jobs', default=1, type=int,
+                            help="""Maximum number of blocks solved in parallel with the decomposition backend, or
+                            of billing periods with --period.""")
+        parser.add_argument('--period', dest='billing_period', choices=tuple(PERIODS), default=None,
+                            help="""Apply the minimum self-sufficiency rates per billing period: month (M), quarter
+                            (Q) or year (Y). The periods are solved independently and their self-sufficiency rates are
+                            reported in ssr_periods.csv.""")
+        parser.add_argument('--representative_days', dest='representative_days', default=0, type=int,
+                            help="""Solve approximately over this number of representative days, clustered from the
+                            days of the horizon, with the matrix backend.""")
+        parser.add_argument('--check_approximation', dest='is_check_approximation', action='store_true',
+                            help="""Also optimize over the whole horizon and report the errors of the representative
+                            days in approximation.json.""")
+        parser.add_argument('--coarse', dest='coarse_frequency', default=None,
+                            help="""Solve first at this coarser time resolution (pandas frequency, e.g. H or D), then
+                            exactly at the original one starting from the coarse solution, with the matrix or
+                            decomposition backend.""")
+        parser.add_argument('--trust_radius', dest='trust_radius', default=None, type=float,
+                            help="""With --coarse, first restrict the keys to this distance of the coarse keys, the
+                            restriction being lifted where it binds.""")
+        run(parser.parse_args())
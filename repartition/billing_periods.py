@@ -0,0 +1,121 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .repartition_keys_inputs import RepartitionKeysInputs
+from .matrix_model import MatrixModel
+from .closed_form import ClosedFormSolver
+from .utils import time_blocks, RESULT_ARRAYS
+
+EPS = 1e-6
+PERIODS = {'M': 30 * 96, 'Q': 91 * 96, 'Y': 365 * 96}  # Length of the periods for time steps that are not dates.
+
+
+class BillingPeriodSolver:
+    """
+    Optimization of the repartition keys with the minimum self-sufficiency rates applying per billing period (month,
+    quarter or year) instead of over the whole horizon.
+
+    The self-sufficiency rates being the only constraints linking the time steps, the problem splits into independent
+    problems, one per period, solved in parallel with the matrix backend (or in closed form when the period has no
+    minimum self-sufficiency rate). Their results are concatenated over the horizon, the self-sufficiency rates of the
+    results being the ones of the whole horizon, and the self-sufficiency rates of each period are reported apart.
+    """
+
+    def __init__(self, inputs: RepartitionKeysInputs, period: str = 'M', jobs: int = 1, is_closed_form: bool = True,
+                 is_debug: bool = False):
+        if period not in PERIODS:
+            raise ValueError(f'Unknown billing period {period}, expected one of: {", ".join(PERIODS)}.')
+        self.inputs = inputs
+        self.period = period
+        self.jobs = jobs
+        self.is_closed_form = is_closed_form
+        self.is_debug = is_debug
+
+        # Results of each period
+        self.periods = time_blocks(inputs.times, period, PERIODS[period])
+        self.ssr_user: List[Dict[str, float]] = list()
+        self.ssr_rec: List[float] = list()
+        self.slack_users: List[Dict[str, float]] = list()
+        self.slack_rec: List[float] = list()
+
+    def period_inputs(self, period: int) -> RepartitionKeysInputs:
+        """
+        Inputs of a period, sharing the data of the inputs.
+
+        @param period: Position of the period.
+        @return Inputs restricted to the time steps of the period.
+        """
+        return self.inputs.time_slice(*self.periods[period])
+
+    def solve_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys of each period.
+
+        @return Result arrays over the whole horizon, with the same layout as `Optimizer.optimization_arrays`.
+        """
+        inputs = self.inputs
+        period_inputs = [self.period_inputs(p) for p in range(len(self.periods))]
+        n_jobs = max(1, min(self.jobs, len(period_inputs)))
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                period_results = list(executor.map(_solve_period, period_inputs,
+                                                   [self.is_closed_form] * len(period_inputs)))
+        else:
+            period_results = [_solve_period(i, self.is_closed_form) for i in period_inputs]
+
+        self.ssr_user = [dict(zip(inputs.users, r['ssr_user'])) for r, _, _ in period_results]
+        self.ssr_rec = [r['ssr_rec'] for r, _, _ in period_results]
+        self.slack_users = [dict(zip(inputs.users, s)) for _, s, _ in period_results]
+        self.slack_rec = [s for _, _, s in period_results]
+        if self.is_debug:
+            for (start, _), ssr_rec in zip(self.periods, self.ssr_rec):
+                print(f"Period starting at {inputs.times[start]}: self-sufficiency rate of the REC {ssr_rec:.4f}.")
+
+        # Results over the whole horizon
+        output = {name: np.concatenate([r[name] for r, _, _ in period_results]) for name in RESULT_ARRAYS}
+        min_production_demand = np.minimum(inputs.data_consumption_values, -inputs.data_production_values).sum(
+            axis=0, dtype=float)
+        total_users_consumption = inputs.data_consumption_values.sum(axis=0, dtype=float)
+        verified_allocated_production = output['verified_allocated_production'].sum(axis=0)
+        is_consumer = total_users_consumption > EPS
+        output['ssr_user'] = np.where(
+            is_consumer,
+            (min_production_demand + verified_allocated_production) / np.where(is_consumer, total_users_consumption, 1),
+            1.0
+        )
+        output['ssr_rec'] = ((min_production_demand.sum() + verified_allocated_production.sum())
+                             / max(total_users_consumption.sum(), EPS))
+        output['objective'] = sum(r['objective'] for r, _, _ in period_results)
+
+        return output
+
+    def ssr_report(self) -> pd.DataFrame:
+        """
+        Self-sufficiency rates of each period.
+
+        @return Data frame with one row per period, indexed by its first time step, and one column per user and one for
+        the REC.
+        """
+        report = pd.DataFrame(self.ssr_user, index=self.inputs.times[[start for start, _ in self.periods]],
+                              columns=self.inputs.users)
+        report['REC'] = self.ssr_rec
+
+        return report
+
+
+def _solve_period(inputs: RepartitionKeysInputs, is_closed_form: bool) -> tuple:
+    """
+    Optimizes the repartition keys of a period.
+
+    @return Result arrays, slacks of the minimum self-sufficiency rates of the users and of the REC.
+    """
+    if is_closed_form and ClosedFormSolver.is_applicable(inputs):
+        return ClosedFormSolver(inputs).solve_arrays(), np.zeros(len(inputs.users)), 0.0
+    model = MatrixModel(inputs)
+    solution = model.solve()
+
+    return model.result_arrays(solution), model.values(solution, 'slack_ssr_user'), \
+        model.values(solution, 'slack_ssr_rec')[0]
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .keys_strategies import is_keys_strategy
+from .utils import index_path, encode_index, decode_index
+
+CACHE_VERSION = 3  # Changed whenever the layout or the computation of the cached arrays changes.
+CACHED_ARRAYS = (  # Arrays of the inputs stored in the cache.
+    'data_consumption_values', 'data_production_values', 'data_net_consumption_values', 'consumption_values',
+    'production_values', 'initial_keys_segments', 'initial_keys_starts', 'initial_allocated_production_values'
+)
+
+
+class InputsCache:
+    """
+    On-disk cache of the parsed input data and of the arrays derived from it (consumption, production, initial keys and
+    initial allocated production), so that the same files are only parsed once.
+
+    The entries are content-addressed: they are named after a hash of the input files and of the options changing the
+    derived arrays (scaling factors, initial keys and data type). Each entry is a directory of npy files, memory-mapped
+    when the entry is loaded so that the arrays are only read when they are used. When the cache grows larger than its
+    maximum size, the least recently used entries are removed.
+    """
+
+    def __init__(self, path: str, max_size: int = 2 ** 30):
+        """
+        @param path: Cache directory.
+        @param max_size: Maximum size of the cache, in bytes.
+        """
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, data_paths: Iterable[Optional[str]], initial_keys_path: str, scaling: Optional[dict],
+            dtype: np.dtype) -> str:
+        """
+        Computes the key of the inputs.
+
+        @param data_paths: Paths of the consumption and production files, None if missing.
+        @param initial_keys_path: Type of initial keys or path to the initial keys file.
+        @param scaling: Scaling factors per user.
+        @param dtype: Data type of the arrays.
+        @return Key of the cache entry.
+        """
+        description = {
+            'version': CACHE_VERSION,
+            'data': [None if path is None else self._hash_file(path) for path in data_paths],
+            'initial_keys': (initial_keys_path if is_keys_strategy(initial_keys_path)
+                             else self._hash_file(initial_keys_path)),
+            'scaling': scaling,
+            'dtype': np.dtype(dtype).str
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+    def load(self, key: str) -> Optional[Dict[str, object]]:
+        """
+        Loads an entry of the cache, marking it as recently used.
+
+        @param key: Key of the entry.
+        @return Dictionary with the times, the users and the memory-mapped arrays, None if the entry is missing.
+        """
+        entry_path = os.path.join(self.path, key)
+        try:
+            with np.load(os.path.join(entry_path, 'index.npz'), allow_pickle=False) as index:
+                entry = {'times': decode_index(index, 'times'), 'users': pd.Index(index['users'])}
+            for name in CACHED_ARRAYS:
+                entry[name] = np.load(os.path.join(entry_path, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+            os.utime(entry_path)
+        except (FileNotFoundError, ValueError):  # Missing, being evicted or damaged entry
+            return None
+
+        return entry
+
+    def store(self, key: str, entry: Dict[str, object]):
+        """
+        Stores an entry in the cache, then evicts the least recently used entries if the cache is too large.
+
+        @param key: Key of the entry.
+        @param entry: Dictionary with the times, the users and the arrays, see `load`.
+        """
+        # The entry is written in a temporary directory and renamed, so that concurrent runs never read partial entries
+        temporary_path = tempfile.mkdtemp(dir=self.path, prefix='.')
+        np.savez(os.path.join(temporary_path, 'index.npz'), **encode_index(entry['times'], 'times'),
+                 users=entry['users'].to_numpy(dtype=str))
+        for name in CACHED_ARRAYS:
+            np.save(os.path.join(temporary_path, f'{name}.npy'), entry[name])
+        try:
+            os.rename(temporary_path, os.path.join(self.path, key))
+        except OSError:  # Already stored by another run
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+        self.evict(keep=key)
+
+    def evict(self, keep: str = None):
+        """
+        Removes the least recently used entries until the size of the cache is below its maximum size.
+
+        @param keep: Key of an entry never removed, e.g. the one just stored.
+        """
+        entries = []
+        for name in os.listdir(self.path):
+            entry_path = os.path.join(self.path, name)
+            if name.startswith('.') or not os.path.isdir(entry_path):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry_path) if f.is_file())
+            entries.append((os.stat(entry_path).st_mtime, size, name))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if name != keep:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+                total_size -= size
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        """
+        Hashes the content of a file.
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(2 ** 20), b''):
+                digest.update(chunk)
+        # The index sidecar of npy files is part of the data
+        if path.lower().endswith('.npy'):
+            with open(index_path(path), 'rb') as f:
+                digest.update(f.read())
+
+        return digest.hexdigest()
@@ -0,0 +1,183 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from .repartition_keys_inputs import RepartitionKeysInputs
+from .utils import results_to_frames
+
+EPS = 1e-6  # Same tolerance as the models for the absence of production.
+
+
+class ClosedFormSolver:
+    """
+    Solves the repartition keys problem without a solver when no minimum self-sufficiency rate is set. Nothing links
+    the time steps together in that case, and each of them is solved at once for all the time steps with NumPy:
+
+    1. Every unit of production sold locally is worth the spread between the local and retailer prices of the consumer
+       and of the producer. When this is larger than the cost of the deviations it requires, the locally consumed
+       production is the largest one allowed by the maximum deviations and the sum of the keys.
+    2. The consumers lacking allocated production get it by water-filling, so that the largest positive deviation is
+       the smallest one. If the keys sum to 1, the production is taken by water-filling from the users allocated more
+       than their consumption, which are also lowered further when the allocation costs saved outweigh the deviation
+       costs.
+    3. The locally consumed production is bought from the producers in decreasing order of their price spread.
+
+    This is exact when the consumption prices (retailer and local) have the same spread and the allocation prices are
+    the same for all the users, and when the local sales pay for the deviations. `is_applicable` checks these
+    conditions, the linear program is solved otherwise.
+    """
+
+    def __init__(self, inputs: RepartitionKeysInputs):
+        self.inputs = inputs
+
+    @staticmethod
+    def is_applicable(inputs: RepartitionKeysInputs) -> bool:
+        """
+        Checks whether the problem can be solved in closed form.
+
+        @param inputs: Input data structure.
+        @return Boolean true if the closed-form solution is exact.
+        """
+        p = inputs.user_parameters
+        is_consumer = inputs.data_consumption_values.sum(axis=0) > EPS
+        is_producer = inputs.production_values.sum(axis=0) > EPS
+        if (p['minimum_ssr_user'][is_consumer] > 0).any() or inputs.minimum_ssr_rec > 0:
+            return False
+        if not is_producer.any():
+            return True
+        if (inputs.compact_initial_keys.row_sums() > 1 + EPS).any():
+            return False
+
+        consumption_spread = p['price_retailer_in'] - p['price_local_in']
+        if np.ptp(consumption_spread) > EPS or np.ptp(p['price_allocated_energy']) > EPS:
+            return False
+        production_spread = p['price_local_out'] - p['price_retailer_out']
+
+        # Worst case of a unit sold locally: allocated to a consumer that raises the positive deviation, taken from a
+        # user that raises the negative deviation and bought from the producer with the lowest spread.
+        return (consumption_spread[0] + production_spread[is_producer].min() - p['price_allocated_energy'][0]
+                - 2 * p['price_deviation_energy'].sum()) > EPS
+
+    def solve(self) -> Dict[str, pd.DataFrame]:
+        """
+        Computes the optimal repartition keys.
+
+        @return Result dictionary, with the same layout as `Optimizer.optimization_keys`.
+        """
+        return results_to_frames(self.solve_arrays(), self.inputs.times, self.inputs.users)
+
+    def solve_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Computes the optimal repartition keys.
+
+        @return Result arrays, with the same layout as `Optimizer.optimization_arrays`.
+        """
+        inputs = self.inputs
+        p = inputs.user_parameters
+        consumption = inputs.consumption_values.astype(float)
+        production = inputs.production_values.astype(float)
+        initial_keys = np.asarray(inputs.initial_keys_values, dtype=float)  # Broadcast, without copy, if static
+        initial_allocated_production = inputs.initial_allocated_production_values.astype(float)
+        total_community_production = production.sum(axis=1)
+        has_production = total_community_production > EPS
+        production_column = total_community_production[:, np.newaxis]
+
+        # Largest allocation and locally consumed production allowed by the maximum deviations and the keys
+        max_deviation = np.minimum(p['max_deviations'], 1.0) * production_column
+        upper = np.minimum(production_column, initial_allocated_production + max_deviation)
+        lower = np.maximum(0.0, initial_allocated_production - max_deviation)
+        max_local_consumption = np.minimum(
+            np.minimum(upper, consumption).sum(axis=1),
+            total_community_production - np.clip(lower - consumption, 0.0, None).sum(axis=1)
+        )
+        missing = max_local_consumption - np.minimum(initial_allocated_production, consumption).sum(axis=1)
+
+        # Raise the allocations of the consumers lacking production
+        raise_caps = np.clip(np.minimum(upper, consumption) - initial_allocated_production, 0.0, None)
+        raise_level = self._water_level(raise_caps, missing)
+        raised = np.minimum(raise_caps, raise_level[:, np.newaxis])
+
+        # Lower the allocations of the users allocated more than their consumption
+        lower_caps = np.clip(initial_allocated_production - np.maximum(lower, consumption), 0.0, None)
+        needed = np.clip(missing - (total_community_production - initial_allocated_production.sum(axis=1)), 0.0, None)
+        lower_level = self._water_level(lower_caps, needed)
+        max_lowered_users = int(np.floor(p['price_deviation_energy'].sum() / p['price_allocated_energy'][0] + EPS))
+        if max_lowered_users < lower_caps.shape[1]:
+            # Each additional unit of negative deviation saves the allocation costs of all the users still lowered
+            saving_level = -np.sort(-lower_caps, axis=1)[:, max_lowered_users]
+            lower_level = np.maximum(lower_level, saving_level)
+        lowered = np.minimum(lower_caps, lower_level[:, np.newaxis])
+
+        # Allocations, without anything to share when there is no production
+        allocated_production = np.where(has_production[:, np.newaxis],
+                                        initial_allocated_production + raised - lowered, 0.0)
+        optimized_keys = np.where(has_production[:, np.newaxis],
+                                  allocated_production / np.where(has_production, total_community_production, 1.0)[
+                                      :, np.newaxis],
+                                  initial_keys)
+        verified_allocated_production = np.minimum(allocated_production, consumption)
+        positive_allocated_deviation = np.clip(
+            (allocated_production - initial_allocated_production).max(axis=1, initial=0.0), 0.0, None)
+        negative_allocated_deviation = np.clip(
+            (initial_allocated_production - allocated_production).max(axis=1, initial=0.0), 0.0, None)
+
+        # Local sales in decreasing order of the spread of the producers
+        order = np.argsort(-(p['price_local_out'] - p['price_retailer_out']), kind='stable')
+        sold_before = np.cumsum(production[:, order], axis=1) - production[:, order]
+        local_consumption = verified_allocated_production.sum(axis=1)[:, np.newaxis]
+        locally_sold_production = np.empty_like(production)
+        locally_sold_production[:, order] = np.clip(local_consumption - sold_before, 0.0, production[:, order])
+
+        # Self-sufficiency rates
+        min_production_demand = np.minimum(inputs.data_consumption_values, -inputs.data_production_values).sum(
+            axis=0, dtype=float)
+        total_users_consumption = inputs.data_consumption_values.sum(axis=0, dtype=float)
+        is_consumer = total_users_consumption > EPS
+        ssr_user = np.where(
+            is_consumer,
+            (min_production_demand + verified_allocated_production.sum(axis=0))
+            / np.where(is_consumer, total_users_consumption, 1.0),
+            1.0
+        )
+        ssr_rec = (min_production_demand.sum() + verified_allocated_production.sum()) / total_users_consumption.sum()
+
+        objective = (
+            p['price_retailer_in'] @ (consumption - verified_allocated_production).sum(axis=0)
+            + p['price_local_in'] @ verified_allocated_production.sum(axis=0)
+            - p['price_local_out'] @ locally_sold_production.sum(axis=0)
+            - p['price_retailer_out'] @ (production - locally_sold_production).sum(axis=0)
+            + p['price_deviation_energy'].sum() * (positive_allocated_deviation + negative_allocated_deviation).sum()
+            + p['price_allocated_energy'] @ allocated_production.sum(axis=0)
+        )
+
+        return {
+            'optimized_keys': optimized_keys,
+            'allocated_production': allocated_production,
+            'verified_allocated_production': verified_allocated_production,
+            'locally_sold_production': locally_sold_production,
+            'ssr_user': ssr_user,
+            'ssr_rec': ssr_rec,
+            'objective': float(objective)
+        }
+
+    @staticmethod
+    def _water_level(caps: np.ndarray, amounts: np.ndarray) -> np.ndarray:
+        """
+        Computes, for each row, the smallest level such that the sum of min(level, cap) over the columns reaches the
+        amount. The amounts must not exceed the sum of the caps.
+
+        @param caps: Non-negative capacities, T x N.
+        @param amounts: Amounts to fill, one per row.
+        @return Levels, one per row.
+        """
+        n_columns = caps.shape[1]
+        sorted_caps = np.sort(caps, axis=1)
+        # Filled amount when the level reaches each cap: the smaller caps are full, the others filled to the level
+        filled = np.cumsum(sorted_caps, axis=1) + sorted_caps * np.arange(n_columns - 1, -1, -1)
+        position = np.minimum((filled < amounts[:, np.newaxis] - EPS).sum(axis=1), n_columns - 1)
+        rows = np.arange(caps.shape[0])
+        filled_below = np.where(position > 0, np.cumsum(sorted_caps, axis=1)[rows, position - 1], 0.0)
+        level = (amounts - filled_below) / (n_columns - position)
+
+        return np.where(amounts > EPS, np.clip(level, 0.0, None), 0.0)
@@ -0,0 +1,233 @@
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .repartition_keys_inputs import RepartitionKeysInputs
+from .matrix_model import MatrixModel
+from .decomposition import DecompositionSolver
+from .utils import time_blocks
+
+EPS = 1e-6
+TIME_STEP = pd.Timedelta(minutes=15)  # Duration of the time steps that are not dates.
+BACKENDS = ('matrix', 'decomposition')
+
+
+class CoarseToFineSolver:
+    """
+    Optimization of the repartition keys starting from a solution at a coarser time resolution, for long horizons.
+
+    The time steps are first aggregated into periods (e.g. hours of 15-minute time steps, see
+    `RepartitionKeysInputs.time_aggregate`) and the linear program is solved at this resolution, 4 to 96 times smaller.
+    The aggregation keeps the total consumption of each user, so that the multipliers of the self-sufficiency rates of
+    the coarse solution estimate the ones at the original resolution. They are then used in one of two ways:
+
+    - With the matrix backend, the model at the original resolution is first solved with its self-sufficiency rates
+      relaxed, the verified allocated production being valued at the coarse multipliers: the time steps are no longer
+      linked and this Lagrangian relaxation gives a lower bound of the optimal value. Its solution, completed with the
+      slacks of the self-sufficiency rates, is feasible and gives an upper bound. If they are further apart than the
+      tolerance, the variables held at a bound with a nonzero reduced cost are fixed there, the keys are optionally
+      restricted to a trust region around the coarse keys, and the restricted model is solved, warm-started. The
+      restrictions that would improve the objective if lifted (reduced cost pointing out of them) are lifted and the
+      model solved again, until the bounds meet or no such restriction is left: the solution is then optimal at the
+      original resolution.
+    - With the decomposition backend, the coarse multipliers start the decomposition of the horizon into blocks (see
+      `DecompositionSolver`).
+    """
+
+    def __init__(self, inputs: RepartitionKeysInputs, frequency: str = 'H', trust_radius: float = None,
+                 backend: str = 'matrix', block_frequency: str = 'W', jobs: int = 1, tolerance: float = 1e-6,
+                 is_debug: bool = False):
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown backend {backend}, expected one of: {", ".join(BACKENDS)}.')
+        self.inputs = inputs
+        self.frequency = frequency
+        self.trust_radius = trust_radius
+        self.backend = backend
+        self.block_frequency = block_frequency
+        self.jobs = jobs
+        self.tolerance = tolerance
+        self.is_debug = is_debug
+
+        # Results of the coarse solve
+        self.periods = time_blocks(inputs.times, frequency, self._default_length(frequency))
+        self.coarse_results: Dict[str, np.ndarray] = dict()
+        self.coarse_multipliers = (np.zeros(len(inputs.users)), 0.0)
+
+        # Results of the solve at the original resolution
+        self.iterations = 0  # Solves of the model, or iterations of the decomposition
+        self.fixed_variables = 0  # Variables fixed by the Lagrangian relaxation
+        self.lower_bound = -np.inf
+        self.upper_bound = np.inf
+        self.duality_gap = np.inf
+        self.ssr_user: Dict[str, float] = dict()
+        self.ssr_rec = 0.0
+        self.slack_users: Dict[str, float] = dict()
+        self.slack_rec = 0.0
+
+    @staticmethod
+    def _default_length(frequency: str) -> int:
+        """
+        Number of 15-minute time steps per period, for time steps that are not dates.
+        """
+        return max(int(pd.tseries.frequencies.to_offset(frequency).nanos // TIME_STEP.value), 1)
+
+    def solve_coarse(self):
+        """
+        Optimizes the repartition keys at the coarse resolution.
+        """
+        model = MatrixModel(self.inputs.time_aggregate(self.periods))
+        solution = model.solve(is_debug=self.is_debug)
+        self.coarse_results = model.result_arrays(solution)
+        self.coarse_multipliers = model.ssr_multipliers()
+        if self.is_debug:
+            print(f"Coarse model solved over {len(self.periods)} periods (objective "
+                  f"{self.coarse_results['objective']:.6f}).")
+
+    def solve_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys at the original resolution.
+
+        @return Result arrays, with the same layout as `Optimizer.optimization_arrays`.
+        """
+        if len(self.coarse_results) == 0:
+            self.solve_coarse()
+        if self.backend == 'decomposition':
+            return self._solve_decomposition()
+        return self._solve_matrix()
+
+    def _solve_decomposition(self) -> Dict[str, np.ndarray]:
+        """
+        Decomposition of the horizon into blocks, starting from the multipliers of the coarse solution.
+        """
+        solver = DecompositionSolver(self.inputs, block_frequency=self.block_frequency, jobs=self.jobs,
+                                     tolerance=self.tolerance, initial_multipliers=self.coarse_multipliers,
+                                     is_debug=self.is_debug)
+        results = solver.solve_arrays()
+        self.iterations = solver.iterations
+        self.lower_bound, self.upper_bound, self.duality_gap = solver.lower_bound, solver.upper_bound, \
+            solver.duality_gap
+        self.ssr_user, self.ssr_rec = solver.ssr_user, solver.ssr_rec
+        self.slack_users, self.slack_rec = solver.slack_users, solver.slack_rec
+
+        return results
+
+    def _solve_matrix(self) -> Dict[str, np.ndarray]:
+        """
+        Lagrangian relaxation at the coarse multipliers, then model restricted around its solution.
+        """
+        inputs = self.inputs
+        model = MatrixModel(inputs)
+        lower, upper = model.col_lower.copy(), model.col_upper.copy()
+
+        # Lagrangian relaxation: self-sufficiency rates relaxed, verified allocated production valued at the multipliers
+        dual_users, dual_rec = self.coarse_multipliers
+        rhs_users, rhs_rec = self._ssr_requirements()
+        model.update_parameters(inputs.with_options({'default_min_ssr_user': 0.0, 'min_ssr_user': {},
+                                                     'min_ssr_rec': 0.0}))
+        model.set_ssr_prices(dual_users + dual_rec)
+        solution = model.solve(is_debug=self.is_debug)
+        self.iterations = 1
+        self.lower_bound = model.objective(solution) + dual_users @ rhs_users + dual_rec * rhs_rec
+        reduced_costs = model.column_duals.copy()
+
+        # Its solution with the slacks of the self-sufficiency rates, feasible
+        model.update_parameters(inputs)
+        model.set_ssr_prices(np.zeros(len(inputs.users)))
+        solution = self._with_slacks(model, solution)
+        self._update_bounds(model, solution)
+
+        # Model restricted around the solution, until no restriction is left that would improve the objective
+        if self.duality_gap > self.tolerance:
+            is_fixed = (((solution <= lower + EPS) | (solution >= upper - EPS)) & (np.abs(reduced_costs) > EPS))
+            self.fixed_variables = int(is_fixed.sum())
+            fixed_lower = np.where(is_fixed, solution, lower)
+            fixed_upper = np.where(is_fixed, solution, upper)
+            restricted_lower, restricted_upper = self._trust_region(model)
+            restricted_lower = np.where(is_fixed, solution, restricted_lower)
+            restricted_upper = np.where(is_fixed, solution, restricted_upper)
+            while True:
+                model.set_column_bounds(restricted_lower, restricted_upper)
+                try:
+                    solution = model.solve(is_debug=self.is_debug)
+                except ValueError:
+                    if self.trust_radius is None or np.array_equal(restricted_lower, fixed_lower) and \
+                            np.array_equal(restricted_upper, fixed_upper):
+                        raise
+                    # Trust region incompatible with the fixed variables (e.g. keys of a fixed allocation): lifted
+                    restricted_lower, restricted_upper = fixed_lower.copy(), fixed_upper.copy()
+                    continue
+                self.iterations += 1
+                self._update_bounds(model, solution)
+                if self.duality_gap <= self.tolerance:
+                    break
+                reduced_costs = model.column_duals
+                is_held = (((restricted_lower > lower) & (solution <= restricted_lower + EPS) & (reduced_costs > EPS))
+                           | ((restricted_upper < upper) & (solution >= restricted_upper - EPS)
+                              & (reduced_costs < -EPS)))
+                if not is_held.any():  # Optimal without restrictions
+                    self.lower_bound = self.upper_bound
+                    self.duality_gap = 0.0
+                    break
+                restricted_lower[is_held] = fixed_lower[is_held] = lower[is_held]
+                restricted_upper[is_held] = fixed_upper[is_held] = upper[is_held]
+
+        self.ssr_user = dict(zip(model.users, model.values(solution, 'ssr_user')))
+        self.ssr_rec = model.values(solution, 'ssr_rec')[0]
+        self.slack_users = dict(zip(model.users, model.values(solution, 'slack_ssr_user')))
+        self.slack_rec = model.values(solution, 'slack_ssr_rec')[0]
+
+        return model.result_arrays(solution)
+
+    def _ssr_requirements(self) -> Tuple[np.ndarray, float]:
+        """
+        Verified allocated production required by the minimum self-sufficiency rates, of each user (zero for pure
+        producers) and of the REC.
+        """
+        inputs = self.inputs
+        min_production_demand = np.minimum(inputs.data_consumption_values, -inputs.data_production_values).sum(
+            axis=0, dtype=float)
+        total_users_consumption = inputs.data_consumption_values.sum(axis=0, dtype=float)
+        rhs_users = np.where(total_users_consumption > EPS, total_users_consumption
+                             * inputs.user_parameters['minimum_ssr_user'] - min_production_demand, 0.0)
+        rhs_rec = total_users_consumption.sum() * inputs.minimum_ssr_rec - min_production_demand.sum()
+
+        return rhs_users, rhs_rec
+
+    @staticmethod
+    def _with_slacks(model: MatrixModel, solution: np.ndarray) -> np.ndarray:
+        """
+        Sets the slacks of the self-sufficiency rates of a solution to their smallest feasible value.
+        """
+        solution = solution.copy()
+        shortfall_users = np.clip(model.row_lower[model.rows['min_self_sufficiency_rate_user']]
+                                  - solution[model.columns['ssr_user']], 0.0, None)
+        solution[model.columns['slack_ssr_user']] = shortfall_users
+        solution[model.columns['max_slack_ssr_user']] = shortfall_users.max(initial=0.0)
+        solution[model.columns['slack_ssr_rec']] = max(model.row_lower[model.rows['min_self_sufficiency_rate_rec']][0]
+                                                       - solution[model.columns['ssr_rec']][0], 0.0)
+
+        return solution
+
+    def _trust_region(self, model: MatrixModel) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Bounds of the variables with the keys restricted to the trust radius around the keys of their period in the
+        coarse solution, if any.
+        """
+        if self.trust_radius is not None:
+            lengths = [stop - start for start, stop in self.periods]
+            center = np.repeat(self.coarse_results['optimized_keys'], lengths, axis=0)
+            model.set_bounds('optimized_keys', np.clip(center - self.trust_radius, 0.0, 1.0),
+                             np.clip(center + self.trust_radius, 0.0, 1.0))
+
+        return model.col_lower.copy(), model.col_upper.copy()
+
+    def _update_bounds(self, model: MatrixModel, solution: np.ndarray):
+        """
+        Updates the upper bound and the duality gap with a feasible solution.
+        """
+        self.upper_bound = model.objective(solution)
+        self.duality_gap = max(self.upper_bound - self.lower_bound, 0.0) / max(abs(self.upper_bound), EPS)
+        if self.is_debug:
+            print(f"Solve {self.iterations}: lower bound {self.lower_bound:.6f}, upper bound {self.upper_bound:.6f}, "
+                  f"gap {self.duality_gap:.2e}.")
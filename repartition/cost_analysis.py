@@ -41,9 +41,11 @@ class CostAnalysis:
         self._price_retailer_out = inputs.price_retailer_out
         self._price_local_out = inputs.price_local_out
 
-    def analyze(self):
+    def analyze(self, is_saved: bool = True):
         """
         Performs the cost analysis.
+
+        :param is_saved: Boolean true to save the results in csv files.
         """
         self._compute_costs_comparison()
         self._compute_coverage_rate()
@@ -51,12 +53,26 @@ class CostAnalysis:
         self._compute_self_consumption()
         self._compute_costs()
 
+        if not is_saved:
+            return
         self._save_result(self.delta_costs, 'delta_costs', self._output_path)
         self._save_result(self.ssr_user_no_production, 'ssr_user_no_production', self._output_path)
         self._save_result(self.cost_users_no_deviation, 'costs_users_no_deviations', self._output_path)
         self._save_result(self.cost_users, 'costs_users', self._output_path)
         self._save_result(self.costs_users_no_rec, 'costs_users', self._output_path)
 
+    def results(self) -> Dict[str, pd.Series]:
+        """
+        Results of the cost analysis per user.
+        """
+        return {
+            'delta_costs': self.delta_costs,
+            'ssr_user_no_production': self.ssr_user_no_production,
+            'costs_users_no_deviations': self.cost_users_no_deviation,
+            'costs_users': self.cost_users,
+            'costs_users_no_rec': self.costs_users_no_rec
+        }
+
     def _compute_costs_comparison(self):
         """
         Compares the costs with and without REC for each user.
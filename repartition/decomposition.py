@@ -0,0 +1,321 @@
+import logging
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .repartition_keys_inputs import RepartitionKeysInputs
+from .matrix_model import MatrixModel
+from .utils import results_to_frames, time_blocks, RESULT_ARRAYS
+
+EPS = 1e-6
+MAX_COLUMN_AGE = 5  # Master problems after which a solution of a block left out of the combination is dropped.
+
+# Worker state: models and solutions of the blocks handled by the process, kept while in the master problem
+_blocks: Dict[int, MatrixModel] = dict()
+_columns: Dict[int, List[Dict[str, np.ndarray]]] = dict()
+
+
+class DecompositionSolver:
+    """
+    Dantzig-Wolfe decomposition of the repartition keys problem over blocks of time steps (e.g. weeks).
+
+    The self-sufficiency rates are the only constraints linking the time steps. They are kept in a master problem
+    choosing a convex combination of solutions of each block, while each block is solved without them, its verified
+    allocated production being valued at the multipliers of the self-sufficiency rate constraints in the master
+    problem. Each solution of a block improving the master problem is added to it, until none is left. The master
+    problem gives an upper bound of the optimal value and the blocks a Lagrangian lower bound, their relative
+    difference is the duality gap. The solutions left out of the combination for `MAX_COLUMN_AGE` master problems are
+    dropped, so that the memory does not grow with the iterations.
+
+    The first iteration values the verified allocated production at zero, or at initial multipliers estimated
+    beforehand (e.g. on a coarser time resolution, see `CoarseToFineSolver`), which saves iterations when they are
+    close to the optimal ones.
+
+    The blocks are solved in parallel, each process keeping the models of its blocks alive between iterations.
+    """
+
+    def __init__(self, inputs: RepartitionKeysInputs, block_frequency: str = 'W', jobs: int = 1,
+                 max_iterations: int = 100, tolerance: float = 1e-6,
+                 initial_multipliers: Tuple[np.ndarray, float] = None, is_debug: bool = False):
+        self.inputs = inputs
+        self.block_frequency = block_frequency
+        self.jobs = jobs
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.initial_multipliers = initial_multipliers  # Multipliers (users, REC) the first iteration starts from.
+        self.is_debug = is_debug
+
+        # Results of the decomposition
+        self.lower_bound = -np.inf
+        self.upper_bound = np.inf
+        self.duality_gap = np.inf
+        self.iterations = 0
+        self.solutions = 0  # Solutions of the blocks in the last master problem
+        self.ssr_user: Dict[str, float] = dict()
+        self.ssr_rec = 0.0
+        self.slack_users: Dict[str, float] = dict()
+        self.slack_rec = 0.0
+
+    def blocks(self) -> List[Tuple[int, int]]:
+        """
+        Splits the horizon into blocks of consecutive time steps in the same period (e.g. week).
+
+        @return List of (start, stop) positions of the blocks.
+        """
+        return time_blocks(self.inputs.times, self.block_frequency, 7 * 96)  # Weeks of 15-minute time steps by default
+
+    def solve(self) -> Dict[str, pd.DataFrame]:
+        """
+        Optimizes the repartition keys.
+
+        @return Result dictionary, with the same layout as `Optimizer.optimization_keys`.
+        """
+        return results_to_frames(self.solve_arrays(), self.inputs.times, self.inputs.users)
+
+    def solve_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys.
+
+        @return Result arrays, with the same layout as `Optimizer.optimization_arrays`.
+        """
+        inputs = self.inputs
+        blocks = self.blocks()
+        block_inputs = [
+            inputs.time_slice(start, stop).with_options({'default_min_ssr_user': 0.0, 'min_ssr_user': {},
+                                                         'min_ssr_rec': 0.0})
+            for start, stop in blocks
+        ]
+
+        # Self-sufficiency rate constraints of the master problem: sum of verified allocations >= right-hand side
+        p = inputs.user_parameters
+        min_production_demand = np.minimum(inputs.data_consumption_values, -inputs.data_production_values).sum(
+            axis=0, dtype=float)
+        total_users_consumption = inputs.data_consumption_values.sum(axis=0, dtype=float)
+        is_consumer = total_users_consumption > EPS
+        consumers = np.flatnonzero(is_consumer)
+        rhs_users = total_users_consumption[consumers] * p['minimum_ssr_user'][consumers] \
+            - min_production_demand[consumers]
+        rhs_rec = total_users_consumption.sum() * inputs.minimum_ssr_rec - min_production_demand.sum()
+        slack_costs = inputs.slack_costs * inputs.consumption_values.sum()
+
+        # Processes, each one handling a fixed subset of blocks
+        n_jobs = max(1, min(self.jobs, len(blocks)))
+        assignment = [list(range(j, len(blocks), n_jobs)) for j in range(n_jobs)]
+        executors = list()
+        if n_jobs > 1:
+            for block_ids in assignment:
+                executors.append(ProcessPoolExecutor(
+                    max_workers=1, initializer=_initialize_worker,
+                    initargs=({b: block_inputs[b] for b in block_ids},)
+                ))
+        else:
+            _initialize_worker(dict(enumerate(block_inputs)))
+        del block_inputs
+
+        costs = [list() for _ in blocks]  # Cost of each solution of each block
+        allocations = [list() for _ in blocks]  # Verified allocated production per user of each solution
+        ages = [list() for _ in blocks]  # Master problems since each solution was last in the combination
+        kept = dict()  # Solutions of each block kept at the last iteration, dropped in the processes at the next one
+        ssr_prices = np.zeros(len(inputs.users))
+        dual_rhs = 0.0
+        if self.initial_multipliers is not None:
+            dual_users = np.clip(self.initial_multipliers[0][consumers], 0.0, None)
+            dual_rec = max(self.initial_multipliers[1], 0.0)
+            ssr_prices[consumers] = dual_users
+            ssr_prices += dual_rec
+            dual_rhs = dual_users @ rhs_users + dual_rec * rhs_rec
+        try:
+            for self.iterations in range(1, self.max_iterations + 1):
+                tic = time.time()
+
+                # Solve the blocks for the current multipliers
+                if n_jobs > 1:
+                    futures = [executor.submit(_solve_blocks, ssr_prices, {b: kept[b] for b in block_ids if b in kept})
+                               for executor, block_ids in zip(executors, assignment)]
+                    block_results = [r for future in futures for r in future.result()]
+                else:
+                    block_results = _solve_blocks(ssr_prices, kept)
+
+                # Lagrangian lower bound and new solutions of the blocks
+                lagrangian = dual_rhs
+                for block_id, cost, allocation in block_results:
+                    costs[block_id].append(cost)
+                    allocations[block_id].append(allocation)
+                    ages[block_id].append(0)
+                    lagrangian += cost - ssr_prices @ allocation
+                self.lower_bound = max(self.lower_bound, lagrangian)
+
+                # Master problem
+                weights, slacks, self.upper_bound, duals = self._solve_master(
+                    costs, allocations, consumers, rhs_users, rhs_rec, total_users_consumption, slack_costs
+                )
+                dual_users, dual_rec = duals
+                ssr_prices = np.zeros(len(inputs.users))
+                ssr_prices[consumers] = dual_users
+                ssr_prices += dual_rec
+                dual_rhs = dual_users @ rhs_users + dual_rec * rhs_rec
+                self.solutions = sum(len(c) for c in costs)
+
+                self.duality_gap = max(self.upper_bound - self.lower_bound, 0.0) / max(abs(self.upper_bound), EPS)
+                if self.is_debug:
+                    print(f"Iteration {self.iterations}: lower bound {self.lower_bound:.6f}, upper bound "
+                          f"{self.upper_bound:.6f}, gap {self.duality_gap:.2e} ({time.time() - tic:.2f} seconds).")
+                if self.duality_gap <= self.tolerance:
+                    break
+
+                # Solutions left out of the combination for several iterations, dropped from the master problem
+                for block_id, block_weights in enumerate(weights):
+                    ages[block_id] = [0 if w > EPS else a + 1 for a, w in zip(ages[block_id], block_weights)]
+                    kept[block_id] = np.array(ages[block_id]) < MAX_COLUMN_AGE
+                    costs[block_id] = [c for c, k in zip(costs[block_id], kept[block_id]) if k]
+                    allocations[block_id] = [a for a, k in zip(allocations[block_id], kept[block_id]) if k]
+                    ages[block_id] = [a for a, k in zip(ages[block_id], kept[block_id]) if k]
+            else:
+                logging.warning(f'The decomposition did not converge in {self.max_iterations} iterations, the results '
+                                f'are suboptimal: duality gap {self.duality_gap:.2e} (tolerance {self.tolerance:.0e}).')
+
+            # Combination of the solutions of the blocks
+            if n_jobs > 1:
+                futures = [executor.submit(_combine_blocks, {b: weights[b] for b in block_ids})
+                           for executor, block_ids in zip(executors, assignment)]
+                combined = dict(r for future in futures for r in future.result().items())
+            else:
+                combined = _combine_blocks(dict(enumerate(weights)))
+        finally:
+            for executor in executors:
+                executor.shutdown()
+            if n_jobs == 1:
+                _initialize_worker(dict())
+
+        output = {name: np.concatenate([combined[b][name] for b in range(len(blocks))]) for name in RESULT_ARRAYS}
+
+        # Self-sufficiency rates
+        verified_allocated_production = output['verified_allocated_production'].sum(axis=0)
+        ssr_user = np.where(
+            is_consumer,
+            (min_production_demand + verified_allocated_production) / np.where(is_consumer, total_users_consumption, 1),
+            1.0
+        )
+        self.ssr_user = dict(zip(inputs.users, ssr_user))
+        self.ssr_rec = ((min_production_demand.sum() + verified_allocated_production.sum())
+                        / total_users_consumption.sum())
+        slack_users, self.slack_rec = slacks
+        self.slack_users = {u: 0.0 for u in inputs.users}
+        self.slack_users.update(zip(inputs.users[consumers], slack_users))
+
+        output['ssr_user'] = ssr_user
+        output['ssr_rec'] = self.ssr_rec
+        output['objective'] = self.upper_bound
+
+        return output
+
+    @staticmethod
+    def _solve_master(costs: List[List[float]], allocations: List[List[np.ndarray]], consumers: np.ndarray,
+                      rhs_users: np.ndarray, rhs_rec: float, total_users_consumption: np.ndarray,
+                      slack_costs: float) -> tuple:
+        """
+        Solves the master problem: choice of a convex combination of the solutions of each block meeting the
+        minimum self-sufficiency rates, or paying the slack costs.
+
+        @return Weights of the solutions of each block, slacks (users, REC), optimal value, multipliers of the
+        self-sufficiency rate constraints (users, REC).
+        """
+        from scipy.optimize import linprog  # Slow to import, only needed by the decomposition
+
+        n_blocks = len(costs)
+        n_consumers = len(consumers)
+        sizes = [len(c) for c in costs]
+        n_weights = sum(sizes)
+        block_of_weight = np.repeat(np.arange(n_blocks), sizes)
+        allocation = np.vstack([a for block in allocations for a in block])  # n_weights x N
+
+        # Variables: weights, slack of each consumer, maximum slack of the consumers, slack of the REC
+        i_max_slack = n_weights + n_consumers
+        i_slack_rec = i_max_slack + 1
+        n_variables = i_slack_rec + 1
+        cost = np.concatenate([np.concatenate(costs), np.zeros(n_consumers), [slack_costs, slack_costs]])
+
+        # Self-sufficiency rates (users and REC) and maximum slack, written as A x <= b
+        consumption = total_users_consumption[consumers]
+        a_ub = sparse.vstack([
+            sparse.hstack([-allocation[:, consumers].T, -sparse.diags(consumption), sparse.csr_matrix((n_consumers, 2))]),
+            sparse.hstack([-allocation.sum(axis=1)[np.newaxis, :], sparse.csr_matrix((1, n_consumers + 1)),
+                           np.full((1, 1), -total_users_consumption.sum())]),
+            sparse.hstack([sparse.csr_matrix((n_consumers, n_weights)), sparse.eye(n_consumers),
+                           -np.ones((n_consumers, 1)), sparse.csr_matrix((n_consumers, 1))])
+        ], format='csr')
+        b_ub = np.concatenate([-rhs_users, [-rhs_rec], np.zeros(n_consumers)])
+
+        # Convexity of the combination of the solutions of each block
+        a_eq = sparse.csr_matrix((np.ones(n_weights), (block_of_weight, np.arange(n_weights))),
+                                 shape=(n_blocks, n_variables))
+        result = linprog(cost, A_ub=a_ub, b_ub=b_ub, A_eq=a_eq, b_eq=np.ones(n_blocks), bounds=(0, None),
+                         method='highs')
+        if result.status != 0:
+            raise ValueError(f"Master problem not properly solved (status: {result.status}, "
+                             f"message: {result.message}).")
+
+        weights = np.split(result.x[:n_weights], np.cumsum(sizes)[:-1])
+        slacks = (result.x[n_weights:i_max_slack], result.x[i_slack_rec])
+        dual_users = np.clip(-result.ineqlin.marginals[:n_consumers], 0.0, None)
+        dual_rec = max(-result.ineqlin.marginals[n_consumers], 0.0)
+
+        return weights, slacks, result.fun, (dual_users, dual_rec)
+
+
+def _initialize_worker(block_inputs: Dict[int, RepartitionKeysInputs]):
+    """
+    Initializes the models of the blocks handled by a process.
+    """
+    _blocks.clear()
+    _columns.clear()
+    for block_id, inputs in block_inputs.items():
+        _blocks[block_id] = MatrixModel(inputs)
+        _columns[block_id] = list()
+
+
+def _solve_blocks(ssr_prices: np.ndarray, kept: Dict[int, np.ndarray]) -> List[Tuple[int, float, np.ndarray]]:
+    """
+    Solves the blocks handled by the process for the given value of the verified allocated production, keeping their
+    solutions.
+
+    @param ssr_prices: Value of a unit of verified allocated production, one per user.
+    @param kept: Solutions of each block still in the master problem, the other ones being dropped.
+    @return For each block, its identifier, the cost of the solution and its verified allocated production per user.
+    """
+    for block_id, block_kept in kept.items():
+        _columns[block_id] = [values for values, k in zip(_columns[block_id], block_kept) if k]
+
+    block_results = list()
+    for block_id, model in _blocks.items():
+        model.set_ssr_prices(ssr_prices)
+        solution = model.solve()
+        values = {name: model.values(solution, name) for name in RESULT_ARRAYS}
+        _columns[block_id].append(values)
+        allocation = values['verified_allocated_production'].sum(axis=0)
+        block_results.append((block_id, model.objective(solution) + ssr_prices @ allocation, allocation))
+
+    return block_results
+
+
+def _combine_blocks(weights: Dict[int, np.ndarray]) -> Dict[int, Dict[str, np.ndarray]]:
+    """
+    Combines the solutions of the blocks handled by the process.
+
+    @param weights: Weights of the solutions of each block.
+    @return For each block, the values of the result variables.
+    """
+    combined = dict()
+    for block_id, block_weights in weights.items():
+        combined[block_id] = {name: np.zeros_like(_columns[block_id][0][name]) for name in RESULT_ARRAYS}
+        for weight, values in zip(block_weights, _columns[block_id]):
+            if weight > 0:
+                for name in RESULT_ARRAYS:
+                    combined[block_id][name] += weight * values[name]
+
+    return combined
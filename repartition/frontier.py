@@ -0,0 +1,155 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .repartition_keys_inputs import RepartitionKeysInputs
+from .matrix_model import MatrixModel
+from .optimizer import SolverException
+
+EPS = 1e-6
+TARGETS = ('rec', 'user')  # Minimum self-sufficiency rate traced: of the REC, or the same one for all the users.
+FRONTIER_COLUMNS = ['objective', 'marginal_cost', 'ssr_rec', 'average_ssr_user', 'lowest_ssr_user']
+
+
+class SSRFrontier:
+    """
+    Exact frontier of the costs of the REC against its minimum self-sufficiency rate (min_ssr_rec), or against a
+    minimum self-sufficiency rate applying to all the users (default_min_ssr_user).
+
+    The model being a linear program whose minimum self-sufficiency rates are bounds of constraints, the optimal costs
+    are a convex piecewise linear function of the minimum rate, with the multiplier of the constraint as slope. The
+    breakpoints are found by intersecting the tangents at both ends of an interval: if the costs at the intersection
+    are on the tangents, it is a breakpoint, otherwise the interval is split there. Each solve finds a breakpoint or a
+    new piece, and warm-starts from the basis of the previous one in the persistent model (see
+    `MatrixModel.update_parameters`), so that the whole frontier takes about the time of a few solves.
+
+    The frontier is traced from a minimum rate of 0 up to the bound of `RepartitionKeysInputs.maximum_ssr`. Beyond the
+    maximum feasible rate, the slack of the constraint is paid at the slack costs, which is the last breakpoint.
+    """
+
+    def __init__(self, inputs: RepartitionKeysInputs, target: str = 'rec', tolerance: float = 1e-7,
+                 max_solves: int = 200, is_debug: bool = False):
+        if target not in TARGETS:
+            raise ValueError(f'Unknown target {target}, expected one of: {", ".join(TARGETS)}.')
+        self.inputs = inputs
+        self.target = target
+        self.tolerance = tolerance
+        self.max_solves = max_solves
+        self.is_debug = is_debug
+
+        self.model: MatrixModel = None
+        self.solves = 0
+        self.maximum_ssr = np.nan
+        self._points: Dict[float, dict] = dict()  # Solution at each minimum rate solved
+
+    def _target_inputs(self, min_ssr: float) -> RepartitionKeysInputs:
+        """
+        Inputs with the traced minimum self-sufficiency rate.
+        """
+        if self.target == 'rec':
+            return self.inputs.with_options({'min_ssr_rec': min_ssr})
+        return self.inputs.with_options({'default_min_ssr_user': min_ssr, 'min_ssr_user': {}})
+
+    def _solve(self, min_ssr: float) -> dict:
+        """
+        Solves the model at a minimum self-sufficiency rate, from the basis of the previous solve.
+
+        @param min_ssr: Minimum self-sufficiency rate.
+        @return Objective, slope of the frontier (multiplier of the minimum rate), slack of the minimum rate and
+        self-sufficiency rates of the solution.
+        """
+        if min_ssr in self._points:
+            return self._points[min_ssr]
+        if self.solves >= self.max_solves:
+            raise SolverException(f'The frontier was not traced within {self.max_solves} solves.')
+        self.model.update_parameters(self._target_inputs(min_ssr))
+        solution = self.model.solve()
+        self.solves += 1
+
+        model = self.model
+        is_consumer = self.inputs.data_consumption_values.sum(axis=0, dtype=float) > EPS
+        ssr_user = model.values(solution, 'ssr_user')[is_consumer]
+        if self.target == 'rec':
+            slope = model.row_duals[model.rows['min_self_sufficiency_rate_rec']].sum()
+            slack = model.values(solution, 'slack_ssr_rec')[0]
+        else:
+            slope = model.row_duals[model.rows['min_self_sufficiency_rate_user']][is_consumer].sum()
+            slack = model.values(solution, 'slack_ssr_user')[is_consumer].max(initial=0.0)
+        point = {'objective': model.objective(solution), 'slope': float(slope), 'slack': float(slack),
+                 'ssr_rec': model.values(solution, 'ssr_rec')[0], 'average_ssr_user': ssr_user.mean(),
+                 'lowest_ssr_user': ssr_user.min(initial=1.0)}
+        self._points[min_ssr] = point
+        if self.is_debug:
+            print(f"Minimum self-sufficiency rate {min_ssr:.6f}: objective {point['objective']:.4f}, "
+                  f"slope {point['slope']:.4f}, slack {point['slack']:.6f}.")
+
+        return point
+
+    def _is_on_line(self, min_ssr: float, value: float) -> bool:
+        """
+        Whether the costs at a minimum rate solved are on a line taking a value there, within the tolerance.
+        """
+        return abs(self._points[min_ssr]['objective'] - value) <= self.tolerance * max(1.0, abs(value))
+
+    def _trace(self, lower: float, upper: float):
+        """
+        Finds the breakpoints of the frontier between two minimum rates already solved.
+        """
+        intervals = [(lower, upper)]
+        while intervals:
+            a, b = intervals.pop()
+            pa, pb = self._points[a], self._points[b]
+            if pb['slope'] - pa['slope'] <= self.tolerance * max(1.0, abs(pa['slope'])) or b - a <= EPS * EPS:
+                continue  # Linear between a and b
+            # Intersection of the tangents at a and b
+            c = (pb['objective'] - pa['objective'] + pa['slope'] * a - pb['slope'] * b) / (pa['slope'] - pb['slope'])
+            if not a < c < b:
+                continue  # Breakpoint at a or b, up to the precision of the solver
+            self._solve(c)
+            if not self._is_on_line(c, pa['objective'] + pa['slope'] * (c - a)):
+                intervals += [(c, b), (a, c)]
+
+    def solve(self) -> pd.DataFrame:
+        """
+        Traces the frontier.
+
+        @return Data frame indexed by the minimum self-sufficiency rate at each breakpoint, from 0 to the maximum
+        feasible rate, with the objective, the marginal cost of the rate up to the next breakpoint, the
+        self-sufficiency rate of the REC, and the average and lowest self-sufficiency rates of the users.
+        """
+        self.model = MatrixModel(self._target_inputs(0.0))
+        self.solves = 0
+        self._points = dict()
+
+        maximum_ssr_user, maximum_ssr_rec = self.inputs.maximum_ssr()
+        is_consumer = self.inputs.data_consumption_values.sum(axis=0, dtype=float) > EPS
+        upper = maximum_ssr_rec if self.target == 'rec' else maximum_ssr_user[is_consumer].min(initial=1.0)
+        if self._solve(0.0)['slack'] > EPS:
+            raise SolverException('The other minimum self-sufficiency rates cannot be reached, there is no frontier.')
+        self._solve(upper)
+        self._trace(0.0, upper)
+
+        feasible = sorted(m for m, p in self._points.items() if p['slack'] <= EPS)
+        self.maximum_ssr = feasible[-1]
+        if self.is_debug:
+            print(f'Frontier traced in {self.solves} solves, maximum feasible rate {self.maximum_ssr:.6f}.')
+
+        return self._breakpoints(feasible)
+
+    def _breakpoints(self, min_ssrs: List[float]) -> pd.DataFrame:
+        """
+        Table of the breakpoints among the minimum rates solved, leaving out the ones inside a linear piece.
+        """
+        kept = [min_ssrs[0]]
+        for m, following in zip(min_ssrs[1:-1], min_ssrs[2:]):
+            pa, pb = self._points[kept[-1]], self._points[following]
+            chord = pa['objective'] + (pb['objective'] - pa['objective']) * (m - kept[-1]) / (following - kept[-1])
+            if not self._is_on_line(m, chord):
+                kept.append(m)
+        kept += min_ssrs[-1:] if len(min_ssrs) > 1 else []
+
+        frontier = pd.DataFrame([self._points[m] for m in kept], index=pd.Index(kept, name='min_ssr'))
+        frontier['marginal_cost'] = np.append(np.diff(frontier['objective']) / np.diff(kept), np.nan)
+
+        return frontier[FRONTIER_COLUMNS]
@@ -0,0 +1,180 @@
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+from .repartition_keys_inputs import RepartitionKeysInputs
+
+EPS = 1e-6  # Same tolerance as the models for the absence of production.
+
+
+class KeyEvaluator:
+    """
+    Evaluates sets of repartition keys without solving the linear program, with the definitions of the models:
+
+    - the production allocated to each user is its key times the production of the community, its verified allocated
+      production the part of it covered by its consumption, the rest is spilled;
+    - the spilled production can be redistributed to the users still lacking production, in proportion to their keys,
+      during a given number of passes;
+    - the locally consumed production is bought from the producers in decreasing order of their spread, as in the
+      closed-form solution;
+    - the objective value is the one of the linear program for these keys, without slack costs.
+
+    The keys are given as a T x N array or as a batch of K key sets in a K x T x N array, evaluated by chunks to bound
+    the memory used.
+    """
+
+    def __init__(self, inputs: RepartitionKeysInputs, redistribution_passes: int = 0, batch_size: int = 64):
+        """
+        @param inputs: Input data structure.
+        @param redistribution_passes: Number of redistributions of the spilled production.
+        @param batch_size: Number of key sets evaluated at once.
+        """
+        self.inputs = inputs
+        self.redistribution_passes = redistribution_passes
+        self.batch_size = batch_size
+
+        p = inputs.user_parameters
+        self._consumption = inputs.consumption_values.astype(float)
+        self._production = inputs.production_values.astype(float)
+        self._total_production = self._production.sum(axis=1)
+        self._sales_order = np.argsort(-(p['price_local_out'] - p['price_retailer_out']), kind='stable')
+        self._sorted_production = self._production[:, self._sales_order]
+        self._sold_before = np.cumsum(self._sorted_production, axis=1) - self._sorted_production
+        self._initial_allocated_production = inputs.initial_allocated_production_values.astype(float)
+        self._min_production_demand = np.minimum(inputs.data_consumption_values, -inputs.data_production_values).sum(
+            axis=0, dtype=float)
+        self._total_users_consumption = inputs.data_consumption_values.sum(axis=0, dtype=float)
+        self._is_consumer = self._total_users_consumption > EPS
+        self._prices = p
+        self._deviation_price = p['price_deviation_energy'].sum()
+
+    def evaluate(self, keys: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Evaluates one set or a batch of sets of keys.
+
+        @param keys: Keys, T x N or K x T x N.
+        @return Dictionary of the evaluations, with a first dimension of size K for a batch of keys:
+        "allocated_production", "verified_allocated_production", "spilled_production", "locally_sold_production"
+        (totals per user, N), "ssr_user" (N), "ssr_rec", "costs_users" (bills of the users without deviation costs, N)
+        and "objective".
+        """
+        keys = np.asarray(keys, dtype=float)
+        if keys.ndim == 2:
+            return {name: values[0] for name, values in self.evaluate(keys[np.newaxis]).items()}
+
+        evaluations = [self._evaluate_batch(keys[start:start + self.batch_size])
+                       for start in range(0, keys.shape[0], self.batch_size)]
+
+        return {name: np.concatenate([e[name] for e in evaluations]) for name in evaluations[0]}
+
+    def evaluate_strategies(self, strategies: Iterable[str]) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Evaluates the keys given by initial keys strategies (e.g. uniform, proportional_static or
+        proportional_dynamic) or files.
+
+        @param strategies: Types of initial keys or paths to initial keys files.
+        @return Evaluation of each strategy.
+        """
+        return {strategy: self.evaluate(self.inputs.with_initial_keys(strategy).initial_keys_values)
+                for strategy in strategies}
+
+    def result_arrays(self, keys: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Results of one set of keys, with the layout of `Optimizer.optimization_arrays`.
+
+        @param keys: Keys, T x N.
+        @return Result arrays, the optimized keys being the keys after the redistribution of the spilled production.
+        """
+        keys = np.asarray(keys, dtype=float)
+        allocated_production, verified_allocated_production = self._allocate(keys[np.newaxis])
+        evaluation = self.evaluate(keys)
+        has_production = (self._total_production > EPS)[:, np.newaxis]
+
+        return {
+            'optimized_keys': np.where(has_production, allocated_production[0] / np.where(
+                has_production, self._total_production[:, np.newaxis], 1.0), keys),
+            'allocated_production': allocated_production[0],
+            'verified_allocated_production': verified_allocated_production[0],
+            'locally_sold_production': self._sell(verified_allocated_production)[0],
+            'ssr_user': evaluation['ssr_user'],
+            'ssr_rec': float(evaluation['ssr_rec']),
+            'objective': float(evaluation['objective'])
+        }
+
+    def _allocate(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Allocated and verified allocated production of a batch of sets of keys, K x T x N.
+        """
+        consumption = self._consumption
+        allocated_production = keys * self._total_production[:, np.newaxis]
+        verified_allocated_production = np.minimum(allocated_production, consumption)
+
+        # Redistribution of the spilled production to the users lacking production, in proportion to their keys
+        for _ in range(self.redistribution_passes):
+            spilled = (allocated_production - verified_allocated_production).sum(axis=2, keepdims=True)
+            lacking_keys = np.where(verified_allocated_production < consumption, keys, 0.0)
+            lacking_sum = lacking_keys.sum(axis=2, keepdims=True)
+            extra = spilled * lacking_keys / np.where(lacking_sum > 0, lacking_sum, 1.0)
+            # The production stays spilled in the time steps without users lacking production
+            allocated_production = np.where(lacking_sum > 0, verified_allocated_production + extra,
+                                            allocated_production)
+            verified_allocated_production = np.minimum(allocated_production, consumption)
+
+        return allocated_production, verified_allocated_production
+
+    def _sell(self, verified_allocated_production: np.ndarray) -> np.ndarray:
+        """
+        Locally sold production of a batch, K x T x N, in decreasing order of the spread of the producers.
+        """
+        local_consumption = verified_allocated_production.sum(axis=2)[:, :, np.newaxis]
+        locally_sold_production = np.empty(verified_allocated_production.shape)
+        locally_sold_production[:, :, self._sales_order] = np.clip(local_consumption - self._sold_before, 0.0,
+                                                                   self._sorted_production)
+
+        return locally_sold_production
+
+    def _evaluate_batch(self, keys: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Evaluates a batch of sets of keys, K x T x N.
+        """
+        p = self._prices
+        consumption = self._consumption
+        allocated_production, verified_allocated_production = self._allocate(keys)
+        locally_sold_production = self._sell(verified_allocated_production).sum(axis=1)
+
+        # Deviations from the initially allocated production, for the objective
+        deviation = allocated_production - self._initial_allocated_production
+        positive_deviation = np.clip(deviation.max(axis=2), 0.0, None).sum(axis=1)
+        negative_deviation = np.clip((-deviation).max(axis=2), 0.0, None).sum(axis=1)
+
+        allocated = allocated_production.sum(axis=1)
+        verified = verified_allocated_production.sum(axis=1)
+        consumption_users = consumption.sum(axis=0)
+        production_users = self._production.sum(axis=0)
+        costs_users = (
+            p['price_retailer_in'] * (consumption_users - verified)
+            + p['price_local_in'] * verified
+            - p['price_retailer_out'] * (production_users - locally_sold_production)
+            - p['price_local_out'] * locally_sold_production
+        )
+        objective = (costs_users.sum(axis=1) + self._deviation_price * (positive_deviation + negative_deviation)
+                     + allocated @ p['price_allocated_energy'])
+
+        # Self-sufficiency rates
+        ssr_user = np.where(
+            self._is_consumer,
+            (self._min_production_demand + verified) / np.where(self._is_consumer, self._total_users_consumption, 1.0),
+            1.0
+        )
+        ssr_rec = (self._min_production_demand.sum() + verified.sum(axis=1)) / self._total_users_consumption.sum()
+
+        return {
+            'allocated_production': allocated,
+            'verified_allocated_production': verified,
+            'spilled_production': allocated - verified,
+            'locally_sold_production': locally_sold_production,
+            'ssr_user': ssr_user,
+            'ssr_rec': ssr_rec,
+            'costs_users': costs_users,
+            'objective': objective
+        }
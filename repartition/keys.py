@@ -0,0 +1,133 @@
+import numpy as np
+
+
+class Keys:
+    """
+    Repartition keys stored as run-length segments of time steps sharing the same keys: static keys are a single
+    segment, i.e. one vector of N keys, piecewise-constant keys (e.g. daily or monthly blocks) one row per block, and
+    time-varying keys one row per time step.
+
+    The dense T x N matrix is only built when needed: `as_array` gives a read-only T x N view, without copy for static
+    and time-varying keys, and the products with time series (e.g. the allocated production) are computed by
+    broadcasting.
+    """
+
+    def __init__(self, values: np.ndarray, starts: np.ndarray, n_times: int):
+        """
+        @param values: Keys of each segment, S x N.
+        @param starts: Position of the first time step of each segment, increasing from 0.
+        @param n_times: Number of time steps.
+        """
+        self.values = np.asarray(values)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.n_times = n_times
+        if self.values.ndim != 2 or len(self.starts) != len(self.values):
+            raise ValueError('The keys must have one row of N keys per segment.')
+        if n_times > 0 and (len(self.starts) == 0 or self.starts[0] != 0 or (np.diff(self.starts) <= 0).any()
+                            or self.starts[-1] >= n_times):
+            raise ValueError('The segments of the keys must start at 0 and be increasing within the time steps.')
+
+    @classmethod
+    def static(cls, keys: np.ndarray, n_times: int) -> 'Keys':
+        """
+        Keys that are the same at every time step.
+
+        @param keys: Vector of N keys.
+        @param n_times: Number of time steps.
+        """
+        return cls(np.asarray(keys)[np.newaxis, :], np.zeros(1, dtype=np.int64), n_times)
+
+    @classmethod
+    def from_array(cls, keys: np.ndarray) -> 'Keys':
+        """
+        Keys of a T x N array, stored as segments of the consecutive time steps sharing the same keys when they are few
+        enough. Broadcast arrays (e.g. `np.broadcast_to(vector, shape)`) give static keys without reading the rows.
+
+        @param keys: Keys, T x N.
+        """
+        keys = np.asarray(keys)
+        n_times = keys.shape[0]
+        if n_times == 0 or keys.strides[0] == 0:
+            return cls.static(keys[0] if n_times > 0 else np.zeros(keys.shape[1], dtype=keys.dtype), n_times)
+        starts = np.concatenate([[0], np.flatnonzero((keys[1:] != keys[:-1]).any(axis=1)) + 1])
+        if 2 * len(starts) > n_times:  # Not worth segmenting
+            return cls(keys, np.arange(n_times), n_times)
+
+        return cls(keys[starts], starts, n_times)
+
+    @property
+    def shape(self) -> tuple:
+        return self.n_times, self.values.shape[1]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.values.dtype
+
+    @property
+    def is_static(self) -> bool:
+        return len(self.starts) == 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """
+        Number of time steps of each segment.
+        """
+        return np.diff(np.append(self.starts, self.n_times))
+
+    def as_array(self) -> np.ndarray:
+        """
+        Keys as a read-only T x N array, without copy unless they are piecewise constant.
+        """
+        if self.is_static:
+            return np.broadcast_to(self.values, self.shape)
+        if len(self.starts) == self.n_times:
+            values = self.values.view()
+        else:
+            values = np.repeat(self.values, self.lengths, axis=0)
+        values.flags.writeable = False
+
+        return values
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        values = self.as_array()
+        return values if dtype is None and not copy else values.astype(dtype or values.dtype)
+
+    def row_sums(self) -> np.ndarray:
+        """
+        Sum of the keys of each time step.
+        """
+        return np.repeat(self.values.sum(axis=1), self.lengths)
+
+    def scale(self, factors: np.ndarray) -> np.ndarray:
+        """
+        Multiplies the keys of each time step by a factor, e.g. the production of the community to obtain the
+        allocated production.
+
+        @param factors: Vector of T factors.
+        @return Scaled keys, T x N.
+        """
+        factors = np.asarray(factors)[:, np.newaxis]
+        if len(self.starts) in (1, self.n_times):
+            return self.values * factors
+
+        return np.repeat(self.values, self.lengths, axis=0) * factors
+
+    def time_slice(self, start: int, stop: int) -> 'Keys':
+        """
+        Keys of a range of time steps, sharing the same data when possible.
+
+        @param start: Position of the first time step.
+        @param stop: Position after the last time step.
+        """
+        start, stop, _ = slice(start, stop).indices(self.n_times)
+        stop = max(start, stop)
+        first = np.searchsorted(self.starts, start, side='right') - 1
+        last = np.searchsorted(self.starts, stop, side='left')
+        starts = np.maximum(self.starts[first:last] - start, 0)
+        if stop == start:
+            return Keys(self.values[:1], np.zeros(1, dtype=np.int64), 0)
+
+        return Keys(self.values[first:last], starts, stop - start)
+
+    def astype(self, dtype: type) -> 'Keys':
+        return Keys(self.values.astype(dtype, copy=False), self.starts, self.n_times)
@@ -0,0 +1,149 @@
+from typing import Callable, Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from .keys import Keys
+
+EPS = 1e-4  # Same tolerance as the inputs.
+DEFAULT_WINDOW = 96  # One day of 15-minute time steps.
+
+KeysStrategy = Callable[['RepartitionKeysInputs', Optional[str]], Union[np.ndarray, Keys]]
+KEYS_STRATEGIES: Dict[str, KeysStrategy] = dict()
+
+
+def register_keys_strategy(name: str, strategy: KeysStrategy = None):
+    """
+    Registers a strategy of initial keys, usable as initial keys type wherever a built-in one is, e.g. "-k name" or
+    "-k name:argument" on the command line. Can be used as a decorator. A strategy registered under an existing name
+    replaces it.
+
+    @param name: Name of the strategy, without colon.
+    @param strategy: Function computing the T x N keys, or `Keys`, from the inputs and an optional argument given after
+    a colon.
+    @return The strategy, or a decorator registering it if missing.
+    """
+    if ':' in name:
+        raise ValueError(f'The name of the keys strategy {name} cannot contain a colon.')
+    if strategy is None:
+        return lambda s: register_keys_strategy(name, s)
+    KEYS_STRATEGIES[name] = strategy
+
+    return strategy
+
+
+def parse_keys_strategy(initial_keys: str) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    Splits a type of initial keys into the name of its strategy and its argument.
+
+    @param initial_keys: Type of initial keys, "name" or "name:argument", or path to an initial keys file.
+    @return Name and argument, None for a path to an initial keys file.
+    """
+    name, _, argument = initial_keys.partition(':')
+    if name not in KEYS_STRATEGIES:
+        return None
+
+    return name, argument or None
+
+
+def is_keys_strategy(initial_keys: str) -> bool:
+    """
+    Whether the initial keys are given by a registered strategy rather than by a file.
+    """
+    return parse_keys_strategy(initial_keys) is not None
+
+
+def compute_keys(inputs: 'RepartitionKeysInputs', initial_keys: str) -> Keys:
+    """
+    Computes the initial keys of a registered strategy.
+
+    @param inputs: Input data structure.
+    @param initial_keys: Type of initial keys, "name" or "name:argument".
+    @return Initial keys, static when the strategy returns a broadcast vector (see `np.broadcast_to`).
+    """
+    name, argument = parse_keys_strategy(initial_keys)
+    keys = KEYS_STRATEGIES[name](inputs, argument)
+    if not isinstance(keys, Keys):
+        keys = Keys.from_array(keys)
+    if keys.shape != (len(inputs.times), len(inputs.users)):
+        raise ValueError(f'The keys strategy {name} returned keys of shape {keys.shape} instead of '
+                         f'{(len(inputs.times), len(inputs.users))}.')
+
+    return keys.astype(inputs.dtype)
+
+
+def _proportional(weights: np.ndarray) -> np.ndarray:
+    """
+    Normalizes non-negative weights per time step, the time steps without weight getting null keys.
+    """
+    total = weights.sum(axis=-1, keepdims=True)
+
+    return weights / np.where(total <= EPS, EPS, total)
+
+
+@register_keys_strategy('uniform')
+def uniform_keys(inputs: 'RepartitionKeysInputs', argument: str = None) -> np.ndarray:
+    """
+    Distributes the production evenly among the consumers of the community.
+    """
+    is_consumer = inputs.consumption_values.max(axis=0, initial=0.0) > EPS
+    keys = np.where(is_consumer, 1 / max(is_consumer.sum(), 1), 0.0)
+
+    return np.broadcast_to(keys, inputs.consumption_values.shape)
+
+
+@register_keys_strategy('proportional_static')
+def proportional_static_keys(inputs: 'RepartitionKeysInputs', argument: str = None) -> np.ndarray:
+    """
+    Distributes the production in proportion to the consumption of the users over the whole horizon.
+    """
+    keys = _proportional(inputs.consumption_values.sum(axis=0))
+
+    return np.broadcast_to(keys, inputs.consumption_values.shape)
+
+
+@register_keys_strategy('proportional_dynamic')
+def proportional_dynamic_keys(inputs: 'RepartitionKeysInputs', argument: str = None) -> np.ndarray:
+    """
+    Distributes the production in proportion to the consumption of the users at each time step.
+    """
+    return _proportional(inputs.consumption_values)
+
+
+@register_keys_strategy('proportional_rolling')
+def proportional_rolling_keys(inputs: 'RepartitionKeysInputs', argument: str = None) -> np.ndarray:
+    """
+    Distributes the production in proportion to the consumption of the users over a trailing window of time steps,
+    given as argument (one day of 15-minute time steps by default), e.g. "proportional_rolling:672" for one week.
+    """
+    window = DEFAULT_WINDOW if argument is None else int(argument)
+    if window < 1:
+        raise ValueError(f'The window of the proportional rolling keys must be positive, not {window}.')
+    cumulated = np.cumsum(inputs.consumption_values, axis=0, dtype=float)
+    windowed = cumulated.copy()
+    windowed[window:] -= cumulated[:-window]
+
+    return _proportional(np.clip(windowed, 0.0, None))  # Rounding errors of the differences
+
+
+@register_keys_strategy('priority')
+def priority_keys(inputs: 'RepartitionKeysInputs', argument: str = None) -> np.ndarray:
+    """
+    Allocates the production in cascade: each user is covered as much as possible before the next one, in the order
+    given as argument, e.g. "priority:User3,User1", the other users following in the order of the inputs. The
+    production left when all the users are covered is not allocated.
+    """
+    priorities = [] if argument is None else [u.strip() for u in argument.split(',')]
+    unknown_users = [u for u in priorities if u not in inputs.user_index]
+    if len(unknown_users) > 0:
+        raise ValueError(f'Unknown users {", ".join(unknown_users)} in the priority keys.')
+    order = [inputs.user_index[u] for u in dict.fromkeys(priorities)]
+    order += [i for i in range(len(inputs.users)) if i not in set(order)]
+
+    consumption = inputs.consumption_values[:, order]
+    production = inputs.production_values.sum(axis=1, keepdims=True)
+    covered_before = np.cumsum(consumption, axis=1) - consumption
+    keys = np.empty(inputs.consumption_values.shape)
+    keys[:, order] = np.clip(production - covered_before, 0.0, consumption) / np.where(production <= EPS, 1.0,
+                                                                                         production)
+
+    return keys
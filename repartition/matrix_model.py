@@ -0,0 +1,693 @@
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .repartition_keys_inputs import RepartitionKeysInputs, USER_PARAMETERS
+from .presolve import Presolve
+from .utils import results_to_frames, RESULT_ARRAYS
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+EPS = 1e-6
+PRICE_PARAMETERS = {'price_retailer_in', 'price_retailer_out', 'price_local_in', 'price_local_out',
+                    'price_deviation_energy', 'price_allocated_energy', 'slack_costs'}
+MIN_WARM_TIME_LIMIT = 1.0  # Minimum time given to a warm-started solve before solving from scratch, in seconds.
+
+
+class MatrixModel:
+    """
+    Linear program of the repartition keys assembled directly into sparse matrices.
+
+    The formulation (variables, constraints and objective) is the one of the Pyomo model built in
+    `Optimizer.optimization_keys`. Variables are stored by families and, within a family indexed by (time, user), in
+    row-major order. The variables whose value is known beforehand (see `Presolve`) are left out of the model, the
+    families are expanded back into T x N arrays by `values`.
+
+    The time steps can be weighted, e.g. representative days standing for several days: the costs of each time step and
+    its contribution to the self-sufficiency rates are multiplied by its weight. The self-sufficiency rates can also
+    cover time steps before the ones of the model, e.g. the previous windows of a rolling horizon, through the totals
+    carried from them.
+    """
+
+    def __init__(self, inputs: RepartitionKeysInputs, is_presolve: bool = True, time_weights: np.ndarray = None,
+                 carried_totals: Dict[str, np.ndarray] = None):
+        self.times = inputs.times
+        self.users = inputs.users
+        self.time_weights = None if time_weights is None else np.asarray(time_weights, dtype=float)
+        # Totals per user of previous time steps in the self-sufficiency rates: "consumption", "min_production_demand"
+        # and "verified_allocated_production"
+        self.carried_totals = carried_totals
+        self.objective_offset = 0.0
+        self.is_presolve = is_presolve
+        self.presolve_summary = ''
+
+        # Columns and rows of the model
+        self.columns: Dict[str, slice] = dict()
+        self.shapes: Dict[str, Tuple[int, ...]] = dict()
+        self.masks: Dict[str, np.ndarray] = dict()  # Variables kept by the presolve, for the families reduced by it
+        self.fixed_values: Dict[str, np.ndarray] = dict()  # Values of the variables left out by the presolve
+        self._fixed_negative_deviation = 0.0
+        self.rows: Dict[str, slice] = dict()
+        self._cost = list()
+        self._col_lower = list()
+        self._col_upper = list()
+        self._row_lower = list()
+        self._row_upper = list()
+        self._coefficients = list()
+        self._n_columns = 0
+        self._n_rows = 0
+        self.ssr_prices = np.zeros(len(self.users))  # Value of the verified allocated production of each user
+        self.row_duals = np.zeros(0)  # Multipliers of the constraints in the last solution
+        self.column_duals = np.zeros(0)  # Reduced costs of the variables in the last solution
+
+        # Persistent solver and changes to pass to it
+        self._solver = None
+        self._cold_solve_time = 0.0
+        self._changed_columns = set()
+        self._changed_rows = set()
+        self._data = (inputs.data_consumption_values, inputs.data_production_values,
+                      inputs.data_net_consumption_values, inputs.compact_initial_keys)
+
+        # Build time of each step, e.g. of each family of variables and constraints
+        self.build_timings = {'variables': dict(), 'constraints': dict()}
+        self._tic = time.perf_counter()
+
+        self._build(inputs)
+
+        self.cost = np.concatenate(self._cost)
+        self.col_lower = np.concatenate(self._col_lower)
+        self.col_upper = np.concatenate(self._col_upper)
+        self.row_lower = np.concatenate(self._row_lower)
+        self.row_upper = np.concatenate(self._row_upper)
+        rows, cols, values = (np.concatenate(c) for c in zip(*self._coefficients))
+        self.matrix = sparse.csr_matrix((values, (rows, cols)), shape=(self._n_rows, self._n_columns))
+        del self._cost, self._col_lower, self._col_upper, self._row_lower, self._row_upper, self._coefficients
+        self._mark('matrix')
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.matrix.shape
+
+    def _build(self, inputs: RepartitionKeysInputs):
+        """
+        Builds the variables, the constraints and the objective function.
+
+        @param inputs: Input data structure.
+        """
+        n_times, n_users = len(self.times), len(self.users)
+        shape = (n_times, n_users)
+
+        # Parameters pre-processing
+        consumption = inputs.consumption_values.astype(float, copy=False)
+        production = inputs.production_values.astype(float, copy=False)
+        initial_keys = inputs.initial_keys_values.astype(float, copy=False)
+        initial_allocated_production = inputs.initial_allocated_production_values.astype(float, copy=False)
+        min_production_demand = self._weighted_sum(np.minimum(inputs.data_consumption_values,
+                                                              -inputs.data_production_values))
+        total_users_consumption = self._weighted_sum(inputs.data_consumption_values)
+        if self.carried_totals is not None:
+            min_production_demand = min_production_demand + self.carried_totals['min_production_demand'] \
+                + self.carried_totals['verified_allocated_production']
+            total_users_consumption = total_users_consumption + self.carried_totals['consumption']
+        total_community_production = production.sum(axis=1)
+        weights = np.ones(n_times) if self.time_weights is None else self.time_weights
+
+        # Parameters that can be updated without rebuilding the model
+        self._consumption_users = self._weighted_sum(consumption)
+        self._total_users_consumption = total_users_consumption
+        self._production_users = self._weighted_sum(production)
+        self._is_consumer = total_users_consumption > EPS
+        self.parameters = self._read_parameters(inputs)
+        costs = self._compute_costs()
+        max_deviations = self.parameters['max_deviations']
+        minimum_ssr_user = self.parameters['minimum_ssr_user']
+        self._mark('parameters')
+
+        # PRESOLVE
+        presolve = Presolve(inputs, is_enabled=self.is_presolve)
+        self.presolve_summary = presolve.summary()
+        key_entries = np.flatnonzero(presolve.key_entries)
+        verified_entries = np.flatnonzero(presolve.verified_entries)
+        sold_entries = np.flatnonzero(presolve.sold_entries)
+        active_times = presolve.active_times
+        time_row = np.cumsum(active_times) - 1  # Row of each kept time step in the constraints per time step
+        n_active_times = int(active_times.sum())
+        self._fixed_negative_deviation = self._weighted_sum(presolve.fixed_negative_deviation)
+        self._mark('presolve')
+
+        # DECISION VARIABLES
+        zeros = np.zeros(shape)
+        ones = np.ones(shape)
+        max_deviations_bound = np.broadcast_to(max_deviations, shape)
+        keys = self._add_variables('optimized_keys', zeros, ones, zeros, presolve.key_entries, presolve.fixed_keys)
+        deviation_positive = self._add_variables('key_deviation_positive', zeros, max_deviations_bound, zeros,
+                                                 presolve.key_entries)
+        deviation_negative = self._add_variables('key_deviation_negative', zeros, max_deviations_bound, zeros,
+                                                 presolve.key_entries)
+        locally_sold = self._add_variables('locally_sold_production', zeros, production,
+                                           costs['locally_sold_production'], presolve.sold_entries)
+        allocated = self._add_variables('allocated_production', zeros, np.full(shape, np.inf),
+                                        costs['allocated_production'], presolve.key_entries)
+        verified = self._add_variables('verified_allocated_production', zeros, consumption,
+                                       costs['verified_allocated_production'], presolve.verified_entries)
+        positive_deviation = self._add_variables('positive_allocated_deviation', np.zeros(n_times),
+                                                 np.full(n_times, np.inf), costs['positive_allocated_deviation'],
+                                                 active_times)
+        negative_deviation = self._add_variables('negative_allocated_deviation', np.zeros(n_times),
+                                                 np.full(n_times, np.inf), costs['negative_allocated_deviation'],
+                                                 active_times, presolve.fixed_negative_deviation)
+        ssr_user = self._add_variables('ssr_user', np.zeros(n_users), np.full(n_users, np.inf), np.zeros(n_users))
+        ssr_rec = self._add_variables('ssr_rec', np.zeros(1), np.full(1, np.inf), np.zeros(1))
+
+        # SLACK VARIABLES
+        slack_ssr_user = self._add_variables('slack_ssr_user', np.zeros(n_users), np.full(n_users, np.inf),
+                                             np.zeros(n_users))
+        max_slack_ssr_user = self._add_variables('max_slack_ssr_user', np.zeros(1), np.full(1, np.inf),
+                                                 costs['max_slack_ssr_user'])
+        slack_ssr_rec = self._add_variables('slack_ssr_rec', np.zeros(1), np.full(1, np.inf), costs['slack_ssr_rec'])
+
+        # Constant part of the objective function
+        self.objective_offset = self._compute_objective_offset()
+
+        # CONSTRAINTS, one row per kept entry or time step
+        key_times = key_entries // n_users
+        key_rows = np.arange(key_entries.size)
+        key_ones = np.ones(key_entries.size)
+        verified_times, verified_users = np.divmod(verified_entries, n_users)
+        verified_rows = np.arange(verified_entries.size)
+        verified_ones = np.ones(verified_entries.size)
+
+        # Allocated production: equal to the keys times the production, or zero if there is no production.
+        production_per_entry = total_community_production[key_times]
+        has_production = production_per_entry > EPS
+        self._add_constraints(
+            'allocated_production',
+            [(key_rows, allocated[key_entries], key_ones),
+             (key_rows[has_production], keys[key_entries[has_production]], -production_per_entry[has_production])],
+            np.zeros(key_entries.size), np.zeros(key_entries.size)
+        )
+
+        # Allocated production limit: total verified allocated production equal to the total locally sold production.
+        self._add_constraints(
+            'allocated_production_limit',
+            [(time_row[verified_times], verified[verified_entries], verified_ones),
+             (time_row[sold_entries // n_users], locally_sold[sold_entries], -np.ones(sold_entries.size))],
+            np.zeros(n_active_times), np.zeros(n_active_times)
+        )
+
+        # Positive and negative deviations from the initially allocated production.
+        self._add_constraints(
+            'allocation_positive_deviation',
+            [(key_rows, allocated[key_entries], key_ones),
+             (key_rows, positive_deviation[key_times], -key_ones)],
+            np.full(key_entries.size, -np.inf), initial_allocated_production.ravel()[key_entries]
+        )
+        self._add_constraints(
+            'allocation_negative_deviation',
+            [(key_rows, allocated[key_entries], key_ones),
+             (key_rows, negative_deviation[key_times], key_ones)],
+            initial_allocated_production.ravel()[key_entries], np.full(key_entries.size, np.inf)
+        )
+
+        # Verified allocated production bounded by the allocated production.
+        self._add_constraints(
+            'verified_allocated_production',
+            [(verified_rows, verified[verified_entries], verified_ones),
+             (verified_rows, allocated[verified_entries], -verified_ones)],
+            np.full(verified_entries.size, -np.inf), np.zeros(verified_entries.size)
+        )
+
+        # Sum of the keys lower or equal to 1.
+        self._add_constraints(
+            'key_limits',
+            [(time_row[key_times], keys[key_entries], key_ones)],
+            np.full(n_active_times, -np.inf), np.ones(n_active_times)
+        )
+
+        # Deviation from the initial keys.
+        self._add_constraints(
+            'key_deviation',
+            [(key_rows, deviation_positive[key_entries], key_ones),
+             (key_rows, deviation_negative[key_entries], -key_ones),
+             (key_rows, keys[key_entries], -key_ones)],
+            -initial_keys[key_times, key_entries % n_users], -initial_keys[key_times, key_entries % n_users]
+        )
+
+        # Self-sufficiency rate of the users (pure producers are set to 1).
+        is_consumer = self._is_consumer
+        consumer_per_entry = is_consumer[verified_users]
+        safe_consumption = np.where(is_consumer, total_users_consumption, 1.0)
+        ssr_user_rhs = np.where(is_consumer, min_production_demand / safe_consumption, 1.0)
+        self._add_constraints(
+            'compute_self_sufficiency_rate_user',
+            [(np.arange(n_users), ssr_user[np.arange(n_users)], np.ones(n_users)),
+             (verified_users[consumer_per_entry], verified[verified_entries[consumer_per_entry]],
+              -weights[verified_times[consumer_per_entry]] / safe_consumption[verified_users[consumer_per_entry]])],
+            ssr_user_rhs, ssr_user_rhs
+        )
+
+        # Self-sufficiency rate of the REC.
+        total_users_consumption_rec = total_users_consumption.sum()
+        ssr_rec_rhs = np.full(1, min_production_demand.sum() / total_users_consumption_rec)
+        self._add_constraints(
+            'compute_self_sufficiency_rate_rec',
+            [(np.zeros(1, dtype=int), ssr_rec, np.ones(1)),
+             (np.zeros(verified_entries.size, dtype=int), verified[verified_entries],
+              -weights[verified_times] / total_users_consumption_rec)],
+            ssr_rec_rhs, ssr_rec_rhs
+        )
+
+        # Minimum self-sufficiency rates (skipped for pure producers).
+        self._add_constraints(
+            'min_self_sufficiency_rate_user',
+            [(np.arange(n_users), ssr_user[np.arange(n_users)], np.ones(n_users)),
+             (np.arange(n_users), slack_ssr_user[np.arange(n_users)], np.ones(n_users))],
+            np.where(is_consumer, minimum_ssr_user, -np.inf), np.full(n_users, np.inf)
+        )
+        self._add_constraints(
+            'min_self_sufficiency_rate_rec',
+            [(np.zeros(1, dtype=int), ssr_rec, np.ones(1)), (np.zeros(1, dtype=int), slack_ssr_rec, np.ones(1))],
+            np.full(1, self.parameters['minimum_ssr_rec']), np.full(1, np.inf)
+        )
+
+        # Maximum slack of the self-sufficiency rate of the users.
+        self._add_constraints(
+            'compute_max_slack_ssr_user',
+            [(np.arange(n_users), np.repeat(max_slack_ssr_user, n_users), np.ones(n_users)),
+             (np.arange(n_users), slack_ssr_user[np.arange(n_users)], -np.ones(n_users))],
+            np.zeros(n_users), np.full(n_users, np.inf)
+        )
+
+    def _read_parameters(self, inputs: RepartitionKeysInputs) -> Dict[str, np.ndarray]:
+        """
+        Reads the parameters of the model that can be updated without rebuilding it.
+
+        @param inputs: Input data structure.
+        @return Dictionary of parameters, one value per user or a single value.
+        """
+        parameters = {name: inputs.user_parameters[name] for name in USER_PARAMETERS}
+        parameters['max_deviations'] = np.minimum(parameters['max_deviations'], 1.0)
+        parameters['minimum_ssr_rec'] = np.array(float(inputs.minimum_ssr_rec))
+        parameters['slack_costs'] = np.array(float(inputs.slack_costs))
+
+        return parameters
+
+    def _compute_costs(self) -> Dict[str, np.ndarray]:
+        """
+        Computes the coefficients of the objective function depending on the prices.
+
+        @return Dictionary of coefficients per variable family.
+        """
+        shape = (len(self.times), len(self.users))
+        p = self.parameters
+        slack_costs = p['slack_costs'] * self._consumption_users.sum()
+
+        return {
+            'locally_sold_production': self._weighted(np.broadcast_to(p['price_retailer_out'] - p['price_local_out'],
+                                                                      shape)),
+            'allocated_production': self._weighted(np.broadcast_to(p['price_allocated_energy'], shape)),
+            'verified_allocated_production': self._weighted(np.broadcast_to(
+                p['price_local_in'] - p['price_retailer_in'] - self.ssr_prices, shape)),
+            'positive_allocated_deviation': self._weighted(np.full(len(self.times), p['price_deviation_energy'].sum())),
+            'negative_allocated_deviation': self._weighted(np.full(len(self.times), p['price_deviation_energy'].sum())),
+            'max_slack_ssr_user': np.full(1, slack_costs),
+            'slack_ssr_rec': np.full(1, slack_costs),
+        }
+
+    def _weighted(self, values: np.ndarray) -> np.ndarray:
+        """
+        Multiplies values per time step (first dimension) by the weights of the time steps, if any.
+        """
+        if self.time_weights is None:
+            return values
+        return values * self.time_weights.reshape((-1,) + (1,) * (np.ndim(values) - 1))
+
+    def _weighted_sum(self, values: np.ndarray) -> np.ndarray:
+        """
+        Sums values per time step (first dimension), weighted by the weights of the time steps, if any.
+        """
+        if self.time_weights is None:
+            return values.sum(axis=0, dtype=float)
+        return self.time_weights @ values
+
+    def _compute_objective_offset(self) -> float:
+        """
+        Computes the constant part of the objective function.
+        """
+        return float(self.parameters['price_retailer_in'] @ self._consumption_users
+                     - self.parameters['price_retailer_out'] @ self._production_users
+                     + self.parameters['price_deviation_energy'].sum() * self._fixed_negative_deviation)
+
+    def shares_data(self, inputs: RepartitionKeysInputs) -> bool:
+        """
+        Checks whether the inputs share the data (time series and initial keys) the model was built with.
+        """
+        return all(a is b for a, b in zip(self._data, (inputs.data_consumption_values, inputs.data_production_values,
+                                                        inputs.data_net_consumption_values,
+                                                        inputs.compact_initial_keys)))
+
+    def update_parameters(self, inputs: RepartitionKeysInputs):
+        """
+        Updates the prices, the minimum self-sufficiency rates and the maximum deviations from inputs sharing the data
+        of the model (see `RepartitionKeysInputs.with_options`). Only the objective coefficients and the bounds are
+        modified, the changes are passed to the persistent solver at the next solve.
+
+        @param inputs: Input data structure.
+        """
+        parameters = self._read_parameters(inputs)
+        changed = {name for name, value in parameters.items() if not np.array_equal(value, self.parameters[name])}
+        self.parameters = parameters
+
+        if changed & PRICE_PARAMETERS:
+            for name, cost in self._compute_costs().items():
+                self.cost[self.columns[name]] = self._family_values(name, cost)
+                self._changed_columns.add(name)
+            self.objective_offset = self._compute_objective_offset()
+        if 'max_deviations' in changed:
+            for name in ['key_deviation_positive', 'key_deviation_negative']:
+                self.col_upper[self.columns[name]] = self._family_values(name, parameters['max_deviations'])
+                self._changed_columns.add(name)
+        if 'minimum_ssr_user' in changed:
+            self.row_lower[self.rows['min_self_sufficiency_rate_user']] = np.where(
+                self._is_consumer, parameters['minimum_ssr_user'], -np.inf)
+            self._changed_rows.add('min_self_sufficiency_rate_user')
+        if 'minimum_ssr_rec' in changed:
+            self.row_lower[self.rows['min_self_sufficiency_rate_rec']] = parameters['minimum_ssr_rec']
+            self._changed_rows.add('min_self_sufficiency_rate_rec')
+
+    def set_ssr_prices(self, ssr_prices: np.ndarray):
+        """
+        Values the verified allocated production of each user in the objective function, e.g. with the multipliers of
+        self-sufficiency rate constraints handled outside of the model. The change is passed to the persistent solver
+        at the next solve.
+
+        @param ssr_prices: Value of a unit of verified allocated production, one per user.
+        """
+        name = 'verified_allocated_production'
+        self.ssr_prices = np.asarray(ssr_prices, dtype=float)
+        self.cost[self.columns[name]] = self._family_values(name, self._compute_costs()[name])
+        self._changed_columns.add(name)
+
+    def set_bounds(self, name: str, lower: np.ndarray, upper: np.ndarray):
+        """
+        Changes the bounds of a family of variables, e.g. to restrict the keys to a trust region. The change is passed
+        to the persistent solver at the next solve.
+
+        @param name: Name of the variable family.
+        @param lower: Lower bounds, for the whole family.
+        @param upper: Upper bounds, for the whole family.
+        """
+        self.col_lower[self.columns[name]] = self._family_values(name, lower)
+        self.col_upper[self.columns[name]] = self._family_values(name, upper)
+        self._changed_columns.add(name)
+
+    def set_column_bounds(self, lower: np.ndarray, upper: np.ndarray):
+        """
+        Changes the bounds of all the variables of the model, e.g. to fix some of them. The change is passed to the
+        persistent solver at the next solve.
+
+        @param lower: Lower bounds, one per column of the model.
+        @param upper: Upper bounds, one per column of the model.
+        """
+        self.col_lower[:] = lower
+        self.col_upper[:] = upper
+        self._changed_columns.update(self.columns)
+
+    def _add_variables(self, name: str, lower: np.ndarray, upper: np.ndarray, cost: np.ndarray,
+                       mask: np.ndarray = None, fixed=0.0) -> np.ndarray:
+        """
+        Adds a family of variables to the model.
+
+        @param name: Name of the variable family.
+        @param lower: Lower bounds.
+        @param upper: Upper bounds.
+        @param cost: Coefficients in the objective function.
+        @param mask: Boolean array, false for the variables left out of the model by the presolve.
+        @param fixed: Values of the variables left out of the model.
+        @return Column index of each variable of the family, -1 for the variables left out.
+        """
+        shape = np.shape(lower)
+        self.shapes[name] = shape
+        if mask is not None:
+            self.masks[name] = np.ravel(mask)
+            self.fixed_values[name] = fixed
+        size = int(self.masks[name].sum()) if name in self.masks else int(np.prod(shape, dtype=int))
+        self.columns[name] = slice(self._n_columns, self._n_columns + size)
+        self._col_lower.append(self._family_values(name, lower))
+        self._col_upper.append(self._family_values(name, upper))
+        self._cost.append(self._family_values(name, cost))
+        self._n_columns += size
+
+        columns = np.full(int(np.prod(shape, dtype=int)), -1)
+        columns[self.masks[name] if name in self.masks else slice(None)] = np.arange(
+            self.columns[name].start, self.columns[name].stop)
+        self._mark('variables', name)
+
+        return columns
+
+    def _family_values(self, name: str, values: np.ndarray) -> np.ndarray:
+        """
+        Flattens values given for a whole family of variables, keeping only the variables of the model.
+        """
+        values = np.ravel(np.broadcast_to(values, self.shapes[name])).astype(float)
+        if name in self.masks:
+            return values[self.masks[name]]
+        return values
+
+    def _add_constraints(self, name: str, coefficients: list, lower: np.ndarray, upper: np.ndarray):
+        """
+        Adds a family of constraints lower <= A x <= upper to the model.
+
+        @param name: Name of the constraint family.
+        @param coefficients: List of (local row indices, column indices, values) triplets.
+        @param lower: Lower bounds of the rows.
+        @param upper: Upper bounds of the rows.
+        """
+        size = np.size(lower)
+        self.rows[name] = slice(self._n_rows, self._n_rows + size)
+        for rows, cols, values in coefficients:
+            self._coefficients.append((np.asarray(rows) + self._n_rows, np.asarray(cols), np.asarray(values, dtype=float)))
+        self._row_lower.append(np.asarray(lower, dtype=float))
+        self._row_upper.append(np.asarray(upper, dtype=float))
+        self._n_rows += size
+        self._mark('constraints', name)
+
+    def _mark(self, step: str, name: str = None):
+        """
+        Records the time spent since the previous step of the build.
+
+        @param step: Step of the build.
+        @param name: Name of the family of variables or constraints built by the step.
+        """
+        tic, self._tic = self._tic, time.perf_counter()
+        if name is None:
+            self.build_timings[step] = self._tic - tic
+        else:
+            self.build_timings[step][name] = self._tic - tic
+
+    def statistics(self) -> dict:
+        """
+        Statistics of the model: numbers of variables, constraints and nonzeros, per family, and build time of each
+        step.
+        """
+        indptr = self.matrix.indptr
+        return {
+            'variables': self.shape[1],
+            'constraints': self.shape[0],
+            'nonzeros': int(self.matrix.nnz),
+            'variable_families': {name: columns.stop - columns.start for name, columns in self.columns.items()},
+            'constraint_families': {
+                name: {'rows': rows.stop - rows.start, 'nonzeros': int(indptr[rows.stop] - indptr[rows.start])}
+                for name, rows in self.rows.items()
+            },
+            'build_time': self.build_timings
+        }
+
+    def solve(self, is_debug: bool = False) -> np.ndarray:
+        """
+        Solves the linear program in memory with HiGHS. The matrices are handed over directly to highspy when it is
+        installed, otherwise they are passed in one call to the HiGHS solver shipped with SciPy.
+
+        With highspy, the solver is kept alive: after `update_parameters`, only the modified coefficients and bounds are
+        passed to it and the solve is warm-started from the previous basis.
+
+        @param is_debug: Boolean true to display the solver log.
+        @return Primal solution.
+        """
+        if highspy is not None:
+            solution = self._solve_highspy(is_debug)
+        else:
+            solution = self._solve_linprog(is_debug)
+        self._changed_columns.clear()
+        self._changed_rows.clear()
+
+        return solution
+
+    @property
+    def is_warm(self) -> bool:
+        """
+        Boolean true if the next solve will be warm-started.
+        """
+        return self._solver is not None
+
+    def _solve_highspy(self, is_debug: bool) -> np.ndarray:
+        """
+        Solves the linear program passing the matrices directly to highspy, or only the changes since the last solve.
+        """
+        if self._solver is None:
+            lp = highspy.HighsLp()
+            lp.num_col_, lp.num_row_ = self._n_columns, self._n_rows
+            lp.col_cost_ = self.cost
+            lp.col_lower_ = self.col_lower
+            lp.col_upper_ = self.col_upper
+            lp.row_lower_ = self.row_lower
+            lp.row_upper_ = self.row_upper
+            lp.offset_ = self.objective_offset
+            lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+            lp.a_matrix_.start_ = self.matrix.indptr
+            lp.a_matrix_.index_ = self.matrix.indices
+            lp.a_matrix_.value_ = self.matrix.data
+
+            self._solver = highspy.Highs()
+            self._solver.setOptionValue('output_flag', is_debug)
+            self._solver.passModel(lp)
+            return self._run_highspy(is_warm=False)
+
+        # Warm solves skip the presolve, they are abandoned for a cold solve when they take longer than the last one
+        self._pass_changes()
+        self._solver.setOptionValue('time_limit', max(self._cold_solve_time, MIN_WARM_TIME_LIMIT))
+        try:
+            return self._run_highspy(is_warm=True)
+        except ValueError:
+            self._solver.clearSolver()
+        finally:
+            self._solver.setOptionValue('time_limit', highspy.kHighsInf)
+
+        return self._run_highspy(is_warm=False)
+
+    def _run_highspy(self, is_warm: bool) -> np.ndarray:
+        """
+        Runs the persistent solver.
+
+        @param is_warm: Boolean true if the solver is warm-started from the previous basis.
+        @return Primal solution.
+        """
+        tic = time.time()
+        self._solver.run()
+        if not is_warm:
+            self._cold_solve_time = time.time() - tic
+        status = self._solver.getModelStatus()
+        if status != highspy.HighsModelStatus.kOptimal:
+            raise ValueError(f"Problem not properly solved (status: {self._solver.modelStatusToString(status)}).")
+        solution = self._solver.getSolution()
+        self.row_duals = np.array(solution.row_dual)
+        self.column_duals = np.array(solution.col_dual)
+
+        return np.array(solution.col_value)
+
+    def _pass_changes(self):
+        """
+        Passes the modified objective coefficients and bounds to the persistent solver.
+        """
+        for name in self._changed_columns:
+            indices = np.arange(self.columns[name].start, self.columns[name].stop, dtype=np.int32)
+            self._solver.changeColsCost(indices.size, indices, self.cost[indices])
+            self._solver.changeColsBounds(indices.size, indices, self.col_lower[indices], self.col_upper[indices])
+        for name in self._changed_rows:
+            indices = np.arange(self.rows[name].start, self.rows[name].stop, dtype=np.int32)
+            self._solver.changeRowsBounds(indices.size, indices, self.row_lower[indices], self.row_upper[indices])
+        self._solver.changeObjectiveOffset(self.objective_offset)
+
+    def _solve_linprog(self, is_debug: bool) -> np.ndarray:
+        """
+        Solves the linear program in one call to the HiGHS solver shipped with SciPy.
+        """
+        from scipy.optimize import linprog  # Only needed without highspy, slow to import
+
+        is_equality = self.row_lower == self.row_upper
+        has_upper = ~is_equality & np.isfinite(self.row_upper)
+        has_lower = ~is_equality & np.isfinite(self.row_lower)
+        result = linprog(
+            self.cost,
+            A_ub=sparse.vstack([self.matrix[has_upper], -self.matrix[has_lower]], format='csr'),
+            b_ub=np.concatenate([self.row_upper[has_upper], -self.row_lower[has_lower]]),
+            A_eq=self.matrix[is_equality],
+            b_eq=self.row_upper[is_equality],
+            bounds=np.column_stack([self.col_lower, self.col_upper]),
+            method='highs',
+            options={'disp': is_debug}
+        )
+        if result.status != 0:
+            raise ValueError(f"Problem not properly solved (status: {result.status}, message: {result.message}).")
+
+        # Multipliers of the rows, from the ones of the equality and inequality constraints they were split into
+        n_upper = int(has_upper.sum())
+        self.row_duals = np.zeros(self._n_rows)
+        self.row_duals[is_equality] = result.eqlin.marginals
+        self.row_duals[has_upper] += result.ineqlin.marginals[:n_upper]
+        self.row_duals[has_lower] -= result.ineqlin.marginals[n_upper:]
+        self.column_duals = result.lower.marginals + result.upper.marginals
+
+        return result.x
+
+    def values(self, solution: np.ndarray, name: str) -> np.ndarray:
+        """
+        Retrieves the values of a family of variables, as a T x N array for the (time, user) families. The variables
+        left out of the model by the presolve take their known value.
+
+        @param solution: Primal solution.
+        @param name: Name of the variable family.
+        @return Array of values.
+        """
+        if name not in self.masks:
+            return solution[self.columns[name]].reshape(self.shapes[name])
+
+        values = np.ravel(np.broadcast_to(self.fixed_values[name], self.shapes[name])).astype(float)
+        values[self.masks[name]] = solution[self.columns[name]]
+
+        return values.reshape(self.shapes[name])
+
+    def ssr_multipliers(self) -> Tuple[np.ndarray, float]:
+        """
+        Multipliers of the self-sufficiency rates in the last solution: decrease of the objective function per unit of
+        verified allocated production added to the self-sufficiency rate of each user and of the REC. They are zero
+        when the minimum self-sufficiency rates are not binding.
+
+        @return Multipliers of the users (zero for pure producers) and of the REC.
+        """
+        is_consumer = self._is_consumer
+        dual_users = np.where(is_consumer, -self.row_duals[self.rows['compute_self_sufficiency_rate_user']]
+                              / np.where(is_consumer, self._total_users_consumption, 1.0), 0.0)
+        dual_rec = -self.row_duals[self.rows['compute_self_sufficiency_rate_rec']][0] \
+            / self._total_users_consumption.sum()
+
+        return np.clip(dual_users, 0.0, None), max(float(dual_rec), 0.0)
+
+    def objective(self, solution: np.ndarray) -> float:
+        """
+        Computes the value of the objective function.
+        """
+        return float(self.cost @ solution + self.objective_offset)
+
+    def result_arrays(self, solution: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Retrieves the results of the optimization as arrays, see `Optimizer.optimization_arrays`.
+        """
+        output = {name: self.values(solution, name) for name in RESULT_ARRAYS}
+        output['ssr_user'] = self.values(solution, 'ssr_user')
+        output['ssr_rec'] = self.values(solution, 'ssr_rec')[0]
+        output['objective'] = self.objective(solution)
+
+        return output
+
+    def process_results(self, solution: np.ndarray) -> Dict[str, pd.DataFrame]:
+        """
+        Retrieves the results of the optimization with the same layout as `Optimizer.optimization_keys`.
+        """
+        return results_to_frames(self.result_arrays(solution), self.times, self.users)
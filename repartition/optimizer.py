@@ -1,15 +1,28 @@
 import pandas as pd
 import time
 
-from typing import Dict, List
-from logging import getLogger, ERROR
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Tuple, TYPE_CHECKING
+from logging import getLogger, warning, ERROR
 
-import pyomo.environ as pyo
 import numpy as np
 
 from .repartition_keys_inputs import RepartitionKeysInputs
+from .matrix_model import MatrixModel
+from .closed_form import ClosedFormSolver
+from .decomposition import DecompositionSolver
+from .representative_days import RepresentativeDaysSolver
+from .coarse_to_fine import CoarseToFineSolver
+from .billing_periods import BillingPeriodSolver
+from .profiler import Profiler
+from .utils import results_to_frames, RESULT_ARRAYS
+
+if TYPE_CHECKING:
+    import pyomo.environ as pyo
 
 EPS = 1e-6
+BACKENDS = ('pyomo', 'matrix', 'decomposition')
+IN_PROCESS_SOLVERS = {'highs': 'appsi_highs'}  # Pyomo solvers keeping the model and the solution in memory.
 
 
 class SolverException(Exception):
@@ -21,45 +34,359 @@ class Optimizer:
     Contains the optimization programs, processes the output and saves it.
     """
 
-    def __init__(self, solver_name: str = 'cbc', is_debug: bool = False):
+    def __init__(self, solver_name: str = 'cbc', is_debug: bool = False, backend: str = 'pyomo',
+                 is_persistent: bool = False, is_closed_form: bool = True, block_frequency: str = 'W', jobs: int = 1,
+                 profiler: Profiler = None, representative_days: int = 0, coarse_frequency: str = None,
+                 trust_radius: float = None, billing_period: str = None):
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown backend {backend}, expected one of: {", ".join(BACKENDS)}.')
+        if is_persistent and backend != 'matrix':
+            raise ValueError('Persistent models are only available with the matrix backend.')
         self.solver_name = solver_name
         self.is_debug = is_debug
+        self.backend = backend
+        self.is_persistent = is_persistent
+        self.is_closed_form = is_closed_form  # Solve without solver when no self-sufficiency rate is set.
+        self.block_frequency = block_frequency  # Blocks of time steps of the decomposition backend (pandas frequency).
+        self.jobs = jobs  # Processes solving the blocks in parallel with the decomposition backend.
+        self.duality_gap = 0.0  # Relative duality gap of the last optimization with the decomposition backend.
+        self.timings: Dict[str, float] = dict()  # Duration of the phases of the last optimization, in seconds.
+        self.profiler = profiler  # Records the phases and the statistics of the model in detail.
+        self.representative_days = representative_days  # Solve over this number of representative days if positive.
+        self.representative_days_solver: RepresentativeDaysSolver = None  # Clustering of the last approximate solve.
+        self.coarse_frequency = coarse_frequency  # Solve first at this coarser resolution (pandas frequency) if any.
+        self.trust_radius = trust_radius  # Maximum distance of the keys to the coarse keys in the first fine solve.
+        self.billing_period = billing_period  # Minimum self-sufficiency rates applying per period (M, Q or Y) if any.
+        self.billing_period_solver: BillingPeriodSolver = None  # Periods of the last optimization per billing period.
+
+        # Model kept alive between optimizations in persistent mode
+        self._model = None
 
     def optimization_keys(self, inputs: RepartitionKeysInputs) -> Dict[str, pd.DataFrame]:
         """
         Optimizes the repartition keys.
 
         @param inputs: Input data structure.
-        @return Result dictionary.
+        @return Result dictionary: data frames of the optimized keys, allocated production, verified allocated
+        production and locally sold production (one column per user and one row per time step), series of the
+        self-sufficiency rates of the users and of the REC, and of the objective value.
+        """
+        return results_to_frames(self.optimization_arrays(inputs), inputs.times, inputs.users)
+
+    def optimization_arrays(self, inputs: RepartitionKeysInputs) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys, without building any pandas object: the results are read from the solution of
+        the model directly into arrays following the order of the times and users of the inputs.
+
+        @param inputs: Input data structure.
+        @return Result dictionary: T x N arrays "optimized_keys", "allocated_production",
+        "verified_allocated_production" and "locally_sold_production", vector "ssr_user" and floats "ssr_rec" and
+        "objective".
+        """
+        self.timings = dict()
+        if self.is_closed_form and ClosedFormSolver.is_applicable(inputs):
+            return self._optimization_keys_closed_form(inputs)
+        self._check_maximum_self_sufficiency_rates(inputs)
+        if self.billing_period is not None:
+            return self._optimization_keys_billing_periods(inputs)
+        if self.representative_days > 0:
+            return self._optimization_keys_representative_days(inputs)
+        if self.coarse_frequency is not None:
+            return self._optimization_keys_coarse_to_fine(inputs)
+        if self.backend == 'matrix':
+            return self._optimization_keys_matrix(inputs)
+        if self.backend == 'decomposition':
+            return self._optimization_keys_decomposition(inputs)
+        return self._optimization_keys_pyomo(inputs)
+
+    @contextmanager
+    def _phase(self, name: str):
+        """
+        Context manager timing a phase of the optimization, also recorded by the profiler if any.
+
+        @param name: Name of the phase.
         """
         tic = time.time()
+        with self.profiler.phase(name) if self.profiler is not None else nullcontext():
+            yield
+        self.timings[name] = time.time() - tic
+
+    def _optimization_keys_closed_form(self, inputs: RepartitionKeysInputs) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys in closed form, time step by time step, when nothing links the time steps
+        together (see `ClosedFormSolver`).
+
+        @param inputs: Input data structure.
+        @return Result arrays.
+        """
+        with self._phase('solve'):
+            results = ClosedFormSolver(inputs).solve_arrays()
+        if self.is_debug:
+            print(f"Optimization model solved in closed form in {self.timings['solve']:.2f} seconds.")
+
+        return results
+
+    def _optimization_keys_billing_periods(self, inputs: RepartitionKeysInputs) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys with the minimum self-sufficiency rates applying per billing period, the periods
+        being solved independently in parallel with the matrix backend (see `BillingPeriodSolver`).
+
+        @param inputs: Input data structure.
+        @return Result arrays over the whole horizon.
+        """
+        solver = BillingPeriodSolver(inputs, period=self.billing_period, jobs=self.jobs,
+                                     is_closed_form=self.is_closed_form, is_debug=self.is_debug)
+        with self._phase('solve'):
+            results = solver.solve_arrays()
+        self.billing_period_solver = solver
+        if self.profiler is not None:
+            self.profiler.add_statistics('billing_periods', {'periods': len(solver.periods)})
+        if self.is_debug:
+            print(f"Optimization model solved over {len(solver.periods)} periods in {self.timings['solve']:.2f} "
+                  f"seconds.")
+
+        for p, (start, _) in enumerate(solver.periods):
+            try:
+                self._check_self_sufficiency_rates(
+                    solver.period_inputs(p),
+                    ssr_user=solver.ssr_user[p],
+                    ssr_rec=solver.ssr_rec[p],
+                    slack_users=solver.slack_users[p],
+                    slack_rec=solver.slack_rec[p]
+                )
+            except SolverException as e:
+                raise SolverException(f'Period starting at {inputs.times[start]}: {e}')
+
+        return results
+
+    def _optimization_keys_representative_days(self, inputs: RepartitionKeysInputs) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys approximately, over representative days weighted by the number of days they
+        stand for, with the matrix backend (see `RepresentativeDaysSolver`). The minimum self-sufficiency rates missed
+        over the representative days only are an error of the approximation, not an infeasibility.
+
+        @param inputs: Input data structure.
+        @return Result arrays over the whole horizon.
+        """
+        solver = RepresentativeDaysSolver(inputs, self.representative_days, is_debug=self.is_debug)
+        with self._phase('clustering'):
+            solver.cluster()
+        with self._phase('solve'):
+            results = solver.solve_arrays()
+        self.representative_days_solver = solver
+        if self.profiler is not None:
+            self.profiler.add_statistics('representative_days', {'days': len(solver.days),
+                                                                 'representative_days': len(solver.medoids)})
+        if self.is_debug:
+            print(f"Optimization model solved over {len(solver.medoids)} representative days in "
+                  f"{self.timings['solve']:.2f} seconds.")
+
+        return results
+
+    def _optimization_keys_coarse_to_fine(self, inputs: RepartitionKeysInputs) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys first at a coarser time resolution, then at the original one starting from the
+        coarse solution, with the decomposition backend or otherwise the matrix one (see `CoarseToFineSolver`).
+
+        @param inputs: Input data structure.
+        @return Result arrays.
+        """
+        solver = CoarseToFineSolver(inputs, frequency=self.coarse_frequency, trust_radius=self.trust_radius,
+                                    backend='decomposition' if self.backend == 'decomposition' else 'matrix',
+                                    block_frequency=self.block_frequency, jobs=self.jobs, is_debug=self.is_debug)
+        with self._phase('coarse'):
+            solver.solve_coarse()
+        with self._phase('solve'):
+            results = solver.solve_arrays()
+        self.duality_gap = solver.duality_gap
+        if self.profiler is not None:
+            self.profiler.add_statistics('coarse_to_fine', {'periods': len(solver.periods),
+                                                            'iterations': solver.iterations,
+                                                            'fixed_variables': solver.fixed_variables,
+                                                            'duality_gap': self.duality_gap})
+        if self.is_debug:
+            print(f"Optimization model solved in {self.timings['coarse']:.2f} seconds over {len(solver.periods)} "
+                  f"periods then {self.timings['solve']:.2f} seconds ({solver.iterations} iterations, duality gap "
+                  f"{self.duality_gap:.2e}).")
+
+        self._check_self_sufficiency_rates(
+            inputs,
+            ssr_user=solver.ssr_user,
+            ssr_rec=solver.ssr_rec,
+            slack_users=solver.slack_users,
+            slack_rec=solver.slack_rec
+        )
+
+        return results
+
+    def _optimization_keys_decomposition(self, inputs: RepartitionKeysInputs) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys decomposing the horizon into blocks of time steps solved in parallel, coordinated
+        through the self-sufficiency rates (see `DecompositionSolver`).
+
+        @param inputs: Input data structure.
+        @return Result arrays.
+        """
+        solver = DecompositionSolver(inputs, block_frequency=self.block_frequency, jobs=self.jobs,
+                                     is_debug=self.is_debug)
+        with self._phase('solve'):
+            results = solver.solve_arrays()
+        self.duality_gap = solver.duality_gap
+        if self.profiler is not None:
+            self.profiler.add_statistics('decomposition', {'blocks': len(solver.blocks()),
+                                                           'iterations': solver.iterations,
+                                                           'duality_gap': self.duality_gap})
+        if self.is_debug:
+            print(f"Optimization model solved in {self.timings['solve']:.2f} seconds ({solver.iterations} "
+                  f"iterations, duality gap {self.duality_gap:.2e})")
+
+        self._check_self_sufficiency_rates(
+            inputs,
+            ssr_user=solver.ssr_user,
+            ssr_rec=solver.ssr_rec,
+            slack_users=solver.slack_users,
+            slack_rec=solver.slack_rec
+        )
+
+        return results
+
+    def _optimization_keys_matrix(self, inputs: RepartitionKeysInputs) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys building the linear program directly in matrix form. The model is solved in
+        memory with HiGHS, whatever the solver name.
+
+        In persistent mode, the model is kept alive: when the inputs share the data of the previous optimization (see
+        `RepartitionKeysInputs.with_options`), only the prices, minimum self-sufficiency rates and maximum deviations
+        are updated and the solve is warm-started from the previous basis.
+
+        @param inputs: Input data structure.
+        @return Result arrays.
+        """
+        if self.is_persistent and self._model is not None and self._model.shares_data(inputs):
+            model = self._model
+            with self._phase('update'):
+                model.update_parameters(inputs)
+        else:
+            with self._phase('build'):
+                model = MatrixModel(inputs)
+            if self.is_debug:
+                print(f"Optimization model built in {self.timings['build']:.2f} seconds.")
+                print(model.presolve_summary)
+            if self.is_persistent:
+                self._model = model
+        if self.profiler is not None:
+            self.profiler.add_statistics('model', model.statistics())
+        with self._phase('solve'):
+            solution = model.solve(is_debug=self.is_debug)
+        if self.is_debug:
+            print(f"Optimization model solved in {self.timings['solve']:.2f} seconds.")
+
+        with self._phase('results'):
+            self._check_self_sufficiency_rates(
+                inputs,
+                ssr_user=dict(zip(model.users, model.values(solution, 'ssr_user'))),
+                ssr_rec=model.values(solution, 'ssr_rec')[0],
+                slack_users=dict(zip(model.users, model.values(solution, 'slack_ssr_user'))),
+                slack_rec=model.values(solution, 'slack_ssr_rec')[0]
+            )
+
+            # Output results
+            results = model.result_arrays(solution)
+
+        return results
+
+    def _optimization_keys_pyomo(self, inputs: RepartitionKeysInputs) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys with a Pyomo model.
+
+        @param inputs: Input data structure.
+        @return Result arrays.
+        """
+        import pyomo.environ as pyo  # Only imported with the pyomo backend, slow to import
+
+        with self._phase('build'):
+            m, build_timings = self._build_pyomo_model(inputs)
+        if self.profiler is not None:
+            self.profiler.add_statistics('model', {'variables': m.nvariables(), 'constraints': m.nconstraints(),
+                                                   'build_time': build_timings})
+
+        # SOLVE THE PROBLEM
+        if self.is_debug:
+            print(f"Optimization model built in {self.timings['build']:.2f} seconds.")
+            m.write('optim.lp', io_options={'symbolic_solver_labels': True})
+        opt = self._solver_factory()
+        with self._phase('solve'):
+            results = opt.solve(m, tee=self.is_debug, keepfiles=False)
+        if self.is_debug:
+            print(f"Optimization model solved in {self.timings['solve']:.2f} seconds.")
+        if (results.solver.status != pyo.SolverStatus.ok
+                or results.solver.termination_condition not in {
+                    pyo.TerminationCondition.optimal,
+                    pyo.TerminationCondition.feasible
+                }
+        ):
+            m.write("debug.lp", io_options={'symbolic_solver_labels': True})
+            raise ValueError(f"""Problem not properly solved (status: {results.solver.status}, 
+                termination condition: {results.solver.termination_condition}).""")
+
+        with self._phase('results'):
+            self._check_self_sufficiency_rates(
+                inputs,
+                ssr_user={u: m.ssr_user[u].value for u in m.users},
+                ssr_rec=m.ssr_rec.value,
+                slack_users={u: m.slack_ssr_user[u].value for u in m.users},
+                slack_rec=m.slack_ssr_rec.value
+            )
+
+            # Output results
+            output = self._result_arrays(m)
+
+        return output
+
+    @staticmethod
+    def _build_pyomo_model(inputs: RepartitionKeysInputs) -> Tuple['pyo.ConcreteModel', Dict[str, float]]:
+        """
+        Builds the Pyomo model.
+
+        @param inputs: Input data structure.
+        @return Model and build time of each family of constraints.
+        """
+        import pyomo.environ as pyo
+
         # Remove pyomo warnings
         getLogger('pyomo.core').setLevel(ERROR)
 
-        # Parameters pre-processing
-        min_production_demand = pd.concat([inputs.data_consumption, -inputs.data_production]).min(level=0).sum(axis=0)
-        total_users_consumption = inputs.data_consumption.sum(axis=0)
-        total_community_production = inputs.production.sum(axis=1)
+        # Parameters pre-processing, the time series are accessed by position
+        time_index = {t: i for i, t in enumerate(inputs.times)}
+        user_index = inputs.user_index
+        consumption = inputs.consumption_values
+        production = inputs.production_values
+        initial_keys = inputs.initial_keys_values
+        initial_allocated_production = inputs.initial_allocated_production_values
+        min_production_demand = dict(zip(inputs.users, np.minimum(inputs.data_consumption_values,
+                                                                  -inputs.data_production_values).sum(axis=0)))
+        total_users_consumption = dict(zip(inputs.users, inputs.data_consumption_values.sum(axis=0)))
+        total_community_production = dict(zip(inputs.times, production.sum(axis=1)))
 
         # Bounds generators
         def _bounds_verified_allocated_production(m, t, u):
             """
             Defines the bounds of the verified allocated production.
             """
-            return 0, inputs.consumption.loc[t, u]
+            return 0, consumption[time_index[t], user_index[u]]
 
         def _locally_sold_production_limit(m, t, u):
             """
             Sets the limit to the locally sold production.
             """
-            return 0, inputs.production.loc[t, u]
+            return 0, production[time_index[t], user_index[u]]
 
         # LINEAR PROGRAM
         m = pyo.ConcreteModel()
 
         # SETS
-        m.times = pyo.Set(initialize=[t for t in inputs.data_net_consumption.index])
-        m.users = pyo.Set(initialize=[u for u in inputs.data_net_consumption.columns])
+        m.times = pyo.Set(initialize=[t for t in inputs.times])
+        m.users = pyo.Set(initialize=[u for u in inputs.users])
 
         # DECISION VARIABLES
         m.optimized_keys = pyo.Var(m.times, m.users, bounds=(0, 1))
@@ -90,17 +417,17 @@ class Optimizer:
                     pyo.quicksum(
                         pyo.quicksum(
                             (
-                                inputs.price_retailer_in[u] * (inputs.consumption.loc[t, u] - m.verified_allocated_production[t, u])
+                                inputs.price_retailer_in[u] * (consumption[time_index[t], user_index[u]] - m.verified_allocated_production[t, u])
                                 + inputs.price_local_in[u] * m.verified_allocated_production[t, u]
                                 - inputs.price_local_out[u] * m.locally_sold_production[t, u]
-                                - inputs.price_retailer_out[u] * (inputs.production.loc[t, u] - m.locally_sold_production[t, u])
+                                - inputs.price_retailer_out[u] * (production[time_index[t], user_index[u]] - m.locally_sold_production[t, u])
                                 + inputs.price_deviation_energy[u] * (m.positive_allocated_deviation[t] + m.negative_allocated_deviation[t])
                                 + inputs.price_allocated_energy[u] * m.allocated_production[t, u]
                             )
                             for t in m.times
                         ) for u in m.users
                     )
-                    + ((m.max_slack_ssr_user + m.slack_ssr_rec) * inputs.slack_costs * inputs.consumption.sum().sum())
+                    + ((m.max_slack_ssr_user + m.slack_ssr_rec) * inputs.slack_costs * consumption.sum())
             )
 
         # Constraints
@@ -127,7 +454,7 @@ class Optimizer:
             Computes the positive deviation from the initially allocated production.
             """
             return (
-                    m.allocated_production[t, u] - inputs.initial_allocated_production.loc[t, u] <=
+                    m.allocated_production[t, u] - initial_allocated_production[time_index[t], user_index[u]] <=
                     m.positive_allocated_deviation[t]
             )
 
@@ -136,7 +463,7 @@ class Optimizer:
             Computes the negative deviation from the initially allocated production.
             """
             return (
-                    inputs.initial_allocated_production.loc[t, u] - m.allocated_production[t, u] <=
+                    initial_allocated_production[time_index[t], user_index[u]] - m.allocated_production[t, u] <=
                     m.negative_allocated_deviation[t]
             )
 
@@ -158,7 +485,7 @@ class Optimizer:
             """
             return (
                     m.key_deviation_positive[t, u] - m.key_deviation_negative[t, u] ==
-                    m.optimized_keys[t, u] - inputs.initial_keys.loc[t, u]
+                    m.optimized_keys[t, u] - initial_keys[time_index[t], user_index[u]]
             )
 
         def _compute_self_sufficiency_rate_user(m, u):
@@ -209,6 +536,8 @@ class Optimizer:
             return m.ssr_rec + m.slack_ssr_rec >= inputs.minimum_ssr_rec
 
         # Max deviation constraints
+        build_timings = dict()
+        tic = time.perf_counter()
         m.max_key_deviation_positive_allowed_eqn = pyo.ConstraintList()
         m.max_key_deviation_negative_allowed_eqn = pyo.ConstraintList()
         for u, max_deviation_value in inputs.max_deviations.items():
@@ -220,102 +549,117 @@ class Optimizer:
                     m.key_deviation_negative[t, u] <= max_deviation_value
                 )
 
+        build_timings['max_key_deviation_allowed_eqn'] = time.perf_counter() - tic
+
         # CALL THE CONSTRAINTS
+        tic = time.perf_counter()
         m.objective_eqn = pyo.Objective(rule=_objective_function, sense=pyo.minimize)
-        m._allocated_production_eqn = pyo.Constraint(m.times, m.users, rule=_allocated_production)
-        m._allocated_production_limit_eqn = pyo.Constraint(m.times, rule=_allocated_production_limit)
-        m._allocation_positive_deviation_eqn = pyo.Constraint(m.times, m.users, rule=_allocation_positive_deviation)
-        m._allocation_negative_deviation_eqn = pyo.Constraint(m.times, m.users, rule=_allocation_negative_deviation)
-        m._verified_allocated_production_eqn = pyo.Constraint(m.times, m.users, rule=_verified_allocated_production)
-        m.key_limits_eqn = pyo.Constraint(m.times, rule=_key_limits)
-        m._key_deviation_eqn = pyo.Constraint(m.times, m.users, rule=_key_deviation)
-        m._compute_self_sufficiency_rate_user_eqn = pyo.Constraint(m.users, rule=_compute_self_sufficiency_rate_user)
-        m._compute_self_sufficiency_rate_rec_eqn = pyo.Constraint(rule=_compute_self_sufficiency_rate_rec)
-        m._min_self_sufficiency_rate_user_eqn = pyo.Constraint(m.users, rule=_min_self_sufficiency_rate_user)
-        m._min_self_sufficiency_rate_rec_eqn = pyo.Constraint(rule=_min_self_sufficiency_rate_rec)
-        m._compute_max_slack_ssr_user_eqn = pyo.Constraint(m.users, rule=_compute_max_slack_ssr_user)
+        build_timings['objective_eqn'] = time.perf_counter() - tic
+        for name, indexes, rule in [
+            ('_allocated_production_eqn', (m.times, m.users), _allocated_production),
+            ('_allocated_production_limit_eqn', (m.times,), _allocated_production_limit),
+            ('_allocation_positive_deviation_eqn', (m.times, m.users), _allocation_positive_deviation),
+            ('_allocation_negative_deviation_eqn', (m.times, m.users), _allocation_negative_deviation),
+            ('_verified_allocated_production_eqn', (m.times, m.users), _verified_allocated_production),
+            ('key_limits_eqn', (m.times,), _key_limits),
+            ('_key_deviation_eqn', (m.times, m.users), _key_deviation),
+            ('_compute_self_sufficiency_rate_user_eqn', (m.users,), _compute_self_sufficiency_rate_user),
+            ('_compute_self_sufficiency_rate_rec_eqn', (), _compute_self_sufficiency_rate_rec),
+            ('_min_self_sufficiency_rate_user_eqn', (m.users,), _min_self_sufficiency_rate_user),
+            ('_min_self_sufficiency_rate_rec_eqn', (), _min_self_sufficiency_rate_rec),
+            ('_compute_max_slack_ssr_user_eqn', (m.users,), _compute_max_slack_ssr_user)
+        ]:
+            tic = time.perf_counter()
+            setattr(m, name, pyo.Constraint(*indexes, rule=rule))
+            build_timings[name] = time.perf_counter() - tic
+
+        return m, build_timings
+
+    def _solver_factory(self):
+        """
+        Creates the Pyomo solver. In-process solvers (e.g. highs) work on the model in memory instead of writing it to
+        a file for an external executable, they fall back to cbc when they are not installed.
 
-        # SOLVE THE PROBLEM
-        if self.is_debug:
-            print(f"Optimization model built in {time.time() - tic:.2f} seconds.")
-            m.write('optim.lp', io_options={'symbolic_solver_labels': True})
-        opt = pyo.SolverFactory(self.solver_name)
-        tic = time.time()
-        results = opt.solve(m, tee=self.is_debug, keepfiles=False)
-        print(f"Optimization model solved in {time.time() - tic:.2f} seconds")
-        if (results.solver.status != pyo.SolverStatus.ok
-                or results.solver.termination_condition not in {
-                    pyo.TerminationCondition.optimal,
-                    pyo.TerminationCondition.feasible
-                }
-        ):
-            m.write("debug.lp", io_options={'symbolic_solver_labels': True})
-            raise ValueError(f"""Problem not properly solved (status: {results.solver.status}, 
-                termination condition: {results.solver.termination_condition}).""")
+        @return Pyomo solver.
+        """
+        import pyomo.environ as pyo
 
-        min_ssr_rec_given = inputs.minimum_ssr_rec
-        max_ssr_rec_feasible = m.ssr_rec.value
-        slack_rec = m.slack_ssr_rec.value
+        solver_name = IN_PROCESS_SOLVERS.get(self.solver_name, self.solver_name)
+        opt = pyo.SolverFactory(solver_name)
+        if solver_name != self.solver_name and not opt.available(exception_flag=False):
+            warning(f'Solver {self.solver_name} is not available, falling back to cbc.')
+            opt = pyo.SolverFactory('cbc')
+
+        return opt
+
+    @staticmethod
+    def _check_maximum_self_sufficiency_rates(inputs: RepartitionKeysInputs):
+        """
+        Checks that the minimum self-sufficiency rates are below their upper bounds before building any model (see
+        `RepartitionKeysInputs.maximum_ssr`), which rejects in milliseconds the rates that no keys can reach.
+
+        @param inputs: Input data structure.
+        """
+        minimum_ssr_user = inputs.user_parameters['minimum_ssr_user']
+        if not (minimum_ssr_user > 0).any() and inputs.minimum_ssr_rec <= 0:
+            return
+        maximum_ssr_user, maximum_ssr_rec = inputs.maximum_ssr()
+
+        unreachable = [f'{u} (given {minimum:.3f}, feasible range [0, {maximum:.3f}])'
+                       for u, minimum, maximum in zip(inputs.users, minimum_ssr_user, maximum_ssr_user)
+                       if minimum > maximum + EPS]
+        if inputs.minimum_ssr_rec > maximum_ssr_rec + EPS:
+            unreachable.append(f'the REC (given {inputs.minimum_ssr_rec:.3f}, feasible range [0, '
+                               f'{maximum_ssr_rec:.3f}])')
+        if len(unreachable) > 0:
+            raise SolverException(f"""The minimum self-sufficiency rates cannot be reached, whatever the keys within the
+            maximum deviations, for {', '.join(unreachable)}.""")
+
+    @staticmethod
+    def _check_self_sufficiency_rates(inputs: RepartitionKeysInputs, ssr_user: Dict[str, float], ssr_rec: float,
+                                      slack_users: Dict[str, float], slack_rec: float):
+        """
+        Checks that the minimum self-sufficiency rates have been reached, i.e. that the slack variables are null.
 
-        slack_users = {u: m.slack_ssr_user[u].value for u in m.users}
+        @param inputs: Input data structure.
+        @param ssr_user: Self-sufficiency rate of each user.
+        @param ssr_rec: Self-sufficiency rate of the REC.
+        @param slack_users: Slack of the minimum self-sufficiency rate of each user.
+        @param slack_rec: Slack of the minimum self-sufficiency rate of the REC.
+        """
+        min_ssr_rec_given = inputs.minimum_ssr_rec
+        max_ssr_rec_feasible = ssr_rec
         unfeasible_users = {u: v for u, v in slack_users.items() if v > EPS}
 
         if len(unfeasible_users) > 0:
             raise SolverException(f"""The problem is infeasible for the given input value of min_ssr_user (or
             default_min_ssr_user) for users {', '.join(map(str, unfeasible_users))}. 
             The given value was {', '.join([f'{inputs.minimum_ssr_user[u]:.3f}' for u in unfeasible_users])}. 
-            Try with a value <= {', '.join([f'{m.ssr_user[u].value:.3f}' for u in unfeasible_users])}.""")
+            Try with a value <= {', '.join([f'{ssr_user[u]:.3f}' for u in unfeasible_users])}.""")
 
         if slack_rec > EPS:
             raise SolverException(f"""The problem is infeasible for the given input value of min_ssr_rec. The given
             value was {min_ssr_rec_given}, however, the maximum feasible value for this variable is
             {max_ssr_rec_feasible}. Try with a value <= {max_ssr_rec_feasible}.""")
 
-        # Output results
-        return self._process_results(m)
-
-    @classmethod
-    def _process_results(cls, model: pyo.ConcreteModel) -> Dict[str, pd.DataFrame]:
-        """
-        Retrieves the results of the optimization.
-        """
-        # Extract from model
-        output = cls._retrieve_data(
-            model,
-            ['optimized_keys', 'allocated_production', 'verified_allocated_production', 'locally_sold_production',
-             'ssr_user', 'ssr_rec', 'objective']
-        )
-
-        return output
-
     @staticmethod
-    def _retrieve_data(model: pyo.ConcreteModel, attributes: List[str]) -> Dict[str, pd.DataFrame]:
+    def _result_arrays(model: 'pyo.ConcreteModel') -> Dict[str, np.ndarray]:
         """
-        Retrieves the optimised keys.
+        Retrieves the results of the optimization. The variables indexed by time step and user are read in the order of
+        their index set, which follows the times and the users of the inputs, directly into T x N arrays.
 
-        :param model: LP model with the data.
-        :param attributes: List of attributes to extract.
-        :return: Dictionary with the desired date.
+        @param model: Solved LP model.
+        @return Result arrays.
         """
-
-        output = dict()
-        for variable_name in attributes:
-            if variable_name == 'objective':
-                output_data = pd.Series(model.objective_eqn.expr())
-            else:
-                try:
-                    data = getattr(model,
-                                   variable_name).get_values()  # Get the value of the variable with the same name
-                except AttributeError:
-                    raise AttributeError(
-                        """The argument "variable" only accepts "optimized_keys", "allocated_consumption",
-                        "verified_allocated_consumption", "locally_sold_production", "ssr_user" or "ssr_rec",
-                        otherwise leave it empty."""
-                    )
-                output_data = pd.Series(data)
-                if type(output_data.index) == pd.core.indexes.multi.MultiIndex:
-                    output_data = output_data.unstack()
-
-            output[f'{variable_name}'] = output_data
+        import pyomo.environ as pyo
+
+        shape = (len(model.times), len(model.users))
+        output = {
+            name: np.array([v.value for v in getattr(model, name).values()], dtype=float).reshape(shape)
+            for name in RESULT_ARRAYS
+        }
+        output['ssr_user'] = np.array([v.value for v in model.ssr_user.values()], dtype=float)
+        output['ssr_rec'] = model.ssr_rec.value
+        output['objective'] = pyo.value(model.objective_eqn)
 
         return output
@@ -111,6 +111,28 @@ class Plotter:
         plt.savefig(os.path.join(output_path, 'costs_ssr.pdf'))
         plt.close(figure)
 
+    @staticmethod
+    def plot_frontier(frontier: pd.DataFrame, output_path: str):
+        """
+        Plots the costs alongside the average ssr of the users along the frontier of the minimum ssr (see SSRFrontier)
+        """
+        figure, ax = plt.subplots(nrows=1, ncols=1, figsize=(10, 8))
+        ax2 = ax.twinx()
+        ax.plot(frontier.index, frontier['objective'], color='blue', marker='o', alpha=0.5, label='Total costs [EUR]')
+        ax2.plot(frontier.index, frontier['average_ssr_user'] * 100, color='red', linestyle='--', alpha=0.5,
+                 label='Average SSR [%]')
+        ax.set_xlabel('Minimum SSR', fontsize=15)
+        ax.set_ylabel('Total costs [EUR]', fontsize=15)
+        ax2.set_ylabel('Average SSR of all AMRs [%]', fontsize=15)
+        ax.grid(True)
+        h1, l1 = ax.get_legend_handles_labels()
+        h2, l2 = ax2.get_legend_handles_labels()
+        ax.legend(h1 + h2, l1 + l2, loc=2, fontsize=15)
+        ax.tick_params(which='both', labelsize=15)
+        ax2.tick_params(which='both', labelsize=15)
+        plt.savefig(os.path.join(output_path, 'frontier.pdf'))
+        plt.close(figure)
+
     @staticmethod
     def _plot_series(series: pd.Series, output_path: str, plot_name: str, ssr_plot: float = None,
                      ssr_rec: float = None, series_2: pd.Series = None):
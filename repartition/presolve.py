@@ -0,0 +1,55 @@
+import numpy as np
+
+from .repartition_keys_inputs import RepartitionKeysInputs
+
+EPS = 1e-6  # Same tolerance as the models for the absence of production.
+
+
+class Presolve:
+    """
+    Finds the variables of the repartition keys problem whose optimal value is known before building the model, so that
+    they can be left out of it and filled in when the results are retrieved:
+
+    - At time steps without production, nothing can be allocated: the allocated, verified allocated and locally sold
+      productions are null, the keys are kept at their initial values and the negative allocated deviation is the
+      largest initially allocated production. Time steps whose initial keys sum to more than 1 are always kept.
+    - Users without consumption nor initial key at a time step keep a null key, allocating them production would only
+      add costs.
+    - The verified allocated production of users without consumption and the locally sold production of users without
+      production are null.
+    """
+
+    def __init__(self, inputs: RepartitionKeysInputs, is_enabled: bool = True):
+        consumption = inputs.consumption_values
+        production = inputs.production_values
+        initial_keys = inputs.initial_keys_values
+        initial_allocated_production = inputs.initial_allocated_production_values
+        shape = consumption.shape
+
+        if is_enabled:
+            has_production = production.sum(axis=1) > EPS
+            self.active_times = has_production | (inputs.compact_initial_keys.row_sums() > 1 + EPS)
+            active = self.active_times[:, np.newaxis]
+            self.key_entries = active & ((consumption > 0) | (initial_keys != 0))
+            self.verified_entries = active & (consumption > 0)
+            self.sold_entries = active & (production > 0)
+        else:
+            self.active_times = np.ones(shape[0], dtype=bool)
+            self.key_entries = np.ones(shape, dtype=bool)
+            self.verified_entries = np.ones(shape, dtype=bool)
+            self.sold_entries = np.ones(shape, dtype=bool)
+
+        # Values of the variables left out of the model
+        self.fixed_keys = initial_keys
+        self.fixed_negative_deviation = np.where(
+            self.active_times, 0.0, initial_allocated_production.max(axis=1, initial=0.0)
+        )
+
+    def summary(self) -> str:
+        """
+        Describes the reduction of the model.
+        """
+        n_times, n_users = self.key_entries.shape
+        return (f'Presolve kept {self.active_times.sum()} of {n_times} time steps, {self.key_entries.sum()} keys, '
+                f'{self.verified_entries.sum()} verified allocations and {self.sold_entries.sum()} local sales of '
+                f'{n_times * n_users}.')
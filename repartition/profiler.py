@@ -0,0 +1,102 @@
+import json
+import sys
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+Hook = Callable[[str, dict], None]
+
+
+class Profiler:
+    """
+    Records the wall time, the CPU time and the memory of the phases of a run (e.g. parsing, build, solve), together
+    with statistics such as the size of the model.
+
+    The memory is the peak resident set size of the process at the end of each phase and, when tracemalloc is enabled,
+    the peak of the memory allocated by Python during the phase. Tracemalloc slows the run down noticeably.
+
+    Library users can follow the phases as they end with hooks, called with the name of the phase and its record.
+    """
+
+    def __init__(self, is_tracemalloc: bool = False):
+        self.is_tracemalloc = is_tracemalloc
+        self.phases: Dict[str, dict] = dict()
+        self.statistics: Dict[str, dict] = dict()
+        self.hooks: List[Hook] = list()
+
+    def add_hook(self, hook: Hook):
+        """
+        Adds a function called at the end of each phase.
+
+        @param hook: Function called with the name of the phase and its record.
+        """
+        self.hooks.append(hook)
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Context manager recording a phase. A phase recorded several times accumulates its times.
+
+        @param name: Name of the phase.
+        """
+        is_tracing = self.is_tracemalloc and not tracemalloc.is_tracing()
+        if is_tracing:
+            tracemalloc.start()
+        elif self.is_tracemalloc:
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record = self.phases.setdefault(name, {'wall_time': 0.0, 'cpu_time': 0.0, 'calls': 0})
+            record['wall_time'] += time.perf_counter() - wall
+            record['cpu_time'] += time.process_time() - cpu
+            record['calls'] += 1
+            if resource is not None:
+                record['peak_rss'] = self._peak_rss()
+            if self.is_tracemalloc:
+                record['tracemalloc_peak'] = max(record.get('tracemalloc_peak', 0), tracemalloc.get_traced_memory()[1])
+                if is_tracing:
+                    tracemalloc.stop()
+            for hook in self.hooks:
+                hook(name, record)
+
+    def add_statistics(self, name: str, statistics: dict):
+        """
+        Records statistics of the run, e.g. the size of the model.
+
+        @param name: Name of the statistics.
+        @param statistics: Dictionary of statistics, serializable in json.
+        """
+        self.statistics[name] = statistics
+
+    def report(self) -> dict:
+        """
+        Report of the run: records of the phases and statistics.
+        """
+        return {'phases': self.phases, 'statistics': self.statistics}
+
+    def save(self, path: str):
+        """
+        Saves the report of the run in a json file.
+
+        @param path: Path of the file.
+        """
+        with open(path, 'w') as f:
+            f.write(json.dumps(self.report(), indent=2, default=float))
+
+    @staticmethod
+    def _peak_rss() -> int:
+        """
+        Peak resident set size of the process, in bytes.
+        """
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss if sys.platform == 'darwin' else peak_rss * 1024  # Kilobytes on Linux, bytes on macOS
+
@@ -1,12 +1,30 @@
+import copy
 import json
 import logging
 
+from typing import Dict, List, Tuple
+
 import numpy as np
 import pandas as pd
 
+from .cache import InputsCache, CACHED_ARRAYS
+from .keys import Keys
+from .keys_strategies import compute_keys, is_keys_strategy
 from .utils import read_data
 
 EPS = 1e-4  # Numerical tolerance and minimum slack value.
+MIN_CONSUMPTION = 1e-6  # Total consumption below which a user is a pure producer, as in the models.
+OPTIONS = (  # Optional inputs that can be replaced in existing inputs.
+    'default_price_retailer_in', 'price_retailer_in', 'default_price_retailer_out', 'price_retailer_out',
+    'default_price_local_in', 'price_local_in', 'default_price_local_out', 'price_local_out',
+    'default_price_deviation_energy', 'price_deviation_energy', 'default_price_allocated_energy',
+    'price_allocated_energy', 'slack_costs', 'default_min_ssr_user', 'min_ssr_user', 'min_ssr_rec',
+    'default_max_deviation', 'max_deviation'
+)
+USER_PARAMETERS = (  # Parameters given per user, also stored as vectors following the order of the users.
+    'price_retailer_in', 'price_retailer_out', 'price_local_in', 'price_local_out', 'price_deviation_energy',
+    'price_allocated_energy', 'max_deviations', 'minimum_ssr_user'
+)
 
 
 class UserInputException(Exception):
@@ -19,24 +37,7 @@ class RepartitionKeysInputs:
     """
 
     def __init__(self, consumption_path: str, initial_keys_path: str, output_path: str, input_options_path: str = None,
-                 production_path: str = None):
-
-        # Read data
-        self.data_consumption: pd.DataFrame = read_data(consumption_path)
-        self.users = self.data_consumption.columns
-
-        if production_path is None:
-            self.data_net_consumption: pd.DataFrame = self.data_consumption.copy(deep=False)
-            self.data_production = pd.DataFrame()
-        else:
-            self.data_production: pd.DataFrame = read_data(production_path)
-            self.data_net_consumption: pd.DataFrame = self.data_consumption.add(self.data_production, fill_value=0)
-
-            # Fill with zeroes all the users not present in the production file
-            users_already_present = self.data_production.columns
-            users_to_add = [u for u in self.users if u not in users_already_present]
-            for user in users_to_add:
-                self.data_production.insert(0, user, 0.0)
+                 production_path: str = None, dtype: type = np.float64, cache: InputsCache = None):
 
         # Optional inputs
         if input_options_path:
@@ -45,6 +46,156 @@ class RepartitionKeysInputs:
         else:
             input_options = {}
 
+        self.dtype = np.dtype(dtype)
+        self.initial_keys_path = initial_keys_path
+        self.output_path = output_path
+        self.input_options = input_options
+
+        # Data and derived arrays already computed from the same files and options
+        entry = None
+        if cache is not None:
+            cache_key = cache.key([consumption_path, production_path], initial_keys_path,
+                                  input_options.get('scaling'), self.dtype)
+            entry = cache.load(cache_key)
+        if entry is not None:
+            self.compact_initial_keys = Keys(entry.pop('initial_keys_segments'), entry.pop('initial_keys_starts'),
+                                             len(entry['times']))
+            for name, value in entry.items():
+                setattr(self, name, value)
+            self.user_index: Dict[str, int] = {u: i for i, u in enumerate(self.users)}
+            self._parse_input_options(input_options)
+            return
+
+        # Read data
+        data_consumption: pd.DataFrame = read_data(consumption_path)
+        if production_path is None:
+            data_production = pd.DataFrame(index=data_consumption.index, columns=data_consumption.columns, data=0.0)
+            data_net_consumption = data_consumption
+        else:
+            data_production: pd.DataFrame = read_data(production_path)
+            data_net_consumption = data_consumption.add(data_production, fill_value=0)
+            # Users in the order of the consumption file, so that its data is used without copy
+            data_net_consumption = data_net_consumption.reindex(
+                columns=data_consumption.columns.append(data_production.columns.difference(data_consumption.columns))
+            )
+
+        # Time series are stored as T x N arrays, the users being indexed by their position
+        self.times = data_net_consumption.index
+        self.users = data_net_consumption.columns
+        self.user_index: Dict[str, int] = {u: i for i, u in enumerate(self.users)}
+        self.data_consumption_values = self._to_array(data_consumption)
+        self.data_production_values = self._to_array(data_production)
+        self.data_net_consumption_values = self._to_array(data_net_consumption)
+        if production_path is None:  # Copy of the consumption, modified by the scaling
+            self.data_net_consumption_values = self.data_net_consumption_values.copy()
+        del data_consumption, data_production, data_net_consumption
+
+        self._parse_input_options(input_options)
+
+        # Scaling
+        try:
+            for user_name, scaling_factor in input_options['scaling'].items():
+                try:
+                    self.data_net_consumption_values[:, self.user_index[user_name]] *= scaling_factor
+                except KeyError:
+                    raise UserInputException(f'Unknown user {user_name} in scaling factors.')
+                except:
+                    raise UserInputException(f'Invalid scaling factor {scaling_factor} for user {user_name}.')
+        except KeyError:
+            pass
+
+        # Consumption by-products
+        self.consumption_values = np.clip(self.data_net_consumption_values, 0.0, None)
+        self.production_values = np.clip(-self.data_net_consumption_values, 0.0, None)
+
+        # Initial keys, static or piecewise-constant keys being stored compactly
+        self.compact_initial_keys = self._parse_initial_keys()
+
+        # Initial allocation of production
+        self.initial_allocated_production_values = self._compute_initial_allocated_production()
+
+        if cache is not None:
+            cache.store(cache_key, {'times': self.times, 'users': self.users,
+                                    **{name: getattr(self, name) for name in CACHED_ARRAYS}})
+
+    @property
+    def data_consumption(self) -> pd.DataFrame:
+        return self._to_frame(self.data_consumption_values)
+
+    @property
+    def data_production(self) -> pd.DataFrame:
+        return self._to_frame(self.data_production_values)
+
+    @property
+    def data_net_consumption(self) -> pd.DataFrame:
+        return self._to_frame(self.data_net_consumption_values)
+
+    @property
+    def consumption(self) -> pd.DataFrame:
+        return self._to_frame(self.consumption_values)
+
+    @property
+    def production(self) -> pd.DataFrame:
+        return self._to_frame(self.production_values)
+
+    @property
+    def consumption_total(self) -> pd.Series:
+        return pd.Series(self.consumption_values.sum(axis=1), index=self.times)
+
+    @property
+    def production_total(self) -> pd.Series:
+        return pd.Series(-self.production_values.sum(axis=1), index=self.times)
+
+    @property
+    def consumption_local(self) -> pd.Series:
+        return pd.Series(self._compute_local_consumption(), index=self.times)
+
+    @property
+    def initial_keys_values(self) -> np.ndarray:
+        return self.compact_initial_keys.as_array()
+
+    @property
+    def initial_keys_segments(self) -> np.ndarray:
+        return self.compact_initial_keys.values
+
+    @property
+    def initial_keys_starts(self) -> np.ndarray:
+        return self.compact_initial_keys.starts
+
+    @property
+    def initial_keys(self) -> pd.DataFrame:
+        return self._to_frame(self.initial_keys_values)
+
+    @property
+    def initial_allocated_production(self) -> pd.DataFrame:
+        return self._to_frame(self.initial_allocated_production_values)
+
+    def _to_array(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Transforms a data frame into a contiguous T x N array following the order of the times and the users.
+
+        :param df: Data frame, one column per user and one row per time step. Missing users are filled with zeroes.
+        :return: Array, sharing the memory of the data frame (e.g. memory-mapped) if it is already aligned.
+        """
+        if not (df.index.equals(self.times) and df.columns.equals(self.users)):
+            df = df.reindex(index=self.times, columns=self.users, fill_value=0.0)
+        return np.ascontiguousarray(df.to_numpy(dtype=self.dtype))
+
+    def _to_frame(self, values: np.ndarray) -> pd.DataFrame:
+        """
+        Creates a data frame view, without copy, of a T x N array.
+
+        :param values: Array.
+        :return: Data frame, one column per user and one row per time step.
+        """
+        return pd.DataFrame(values, index=self.times, columns=self.users, copy=False)
+
+    def _parse_input_options(self, input_options: dict):
+        """
+        Parses the prices, the minimum self-sufficiency rates and the maximum deviations of the optional inputs.
+
+        :param input_options: Optional inputs.
+        """
         _default_price_retailer_in = input_options.get('default_price_retailer_in', 220)
         self.price_retailer_in = self._retrieve_input_dict(
             input_options, 'price_retailer_in', _default_price_retailer_in, self.users, message=f"""The price of
@@ -90,138 +241,202 @@ of "price_allocated_energy" must be strictly positive, its given value has been
         self.max_deviations = self._retrieve_input_dict(input_options, 'max_deviation', _default_max_deviation,
                                                         self.users)
 
-        # Scaling
-        try:
-            for user_name, scaling_factor in input_options['scaling'].items():
-                try:
-                    self.data_net_consumption[user_name] *= scaling_factor
-                except KeyError:
-                    raise UserInputException(f'Unknown user {user_name} in scaling factors.')
-                except:
-                    raise UserInputException(f'Invalid scaling factor {scaling_factor} for user {user_name}.')
-        except KeyError:
-            pass
-
-        # Consumption by-products
-        self.consumption = self.data_net_consumption.clip(lower=0.0)
-        self.production = -self.data_net_consumption.clip(upper=0.0)
-        self.consumption_total = self.consumption.sum(axis=1)
-        self.production_total = -self.production.sum(axis=1)
-        self.consumption_local = self._compute_local_consumption()
-
-        # Initial keys
-        self.initial_keys_path = initial_keys_path
-        self.initial_keys: pd.DataFrame = self._parse_initial_keys()
-
-        # Initial allocation of production
-        self.initial_allocated_production = self._compute_initial_allocated_production()
-        # Output path
-        self.output_path = output_path
-
-        # Auxiliary variables
-        self._keys = None
+        # Vectors of the parameters given per user
+        self.user_parameters: Dict[str, np.ndarray] = {
+            name: self.user_vector(getattr(self, name)) for name in USER_PARAMETERS
+        }
 
-    def _parse_initial_keys(self, ) -> pd.DataFrame:
+    def with_options(self, input_options: dict, is_merged: bool = True) -> 'RepartitionKeysInputs':
         """
-        Parse the initial keys file. If the input file contains a single row, transform it into a time series of keys.
+        Creates a copy of the inputs sharing the same data, with some optional inputs replaced (e.g. prices, minimum
+        self-sufficiency rates or maximum deviations). The scaling factors cannot be replaced.
 
-        :return: Initial keys.
+        :param input_options: Optional inputs to replace.
+        :param is_merged: Boolean true to keep the other optional inputs, false to replace all of them except the
+        scaling factors.
+        :return: New inputs.
         """
-        if self.initial_keys_path == 'uniform':  # Create uniform keys
-            keys = self._compute_uniform_keys()
-        elif self.initial_keys_path == 'proportional_static':  # Create proportional static keys
-            keys = self._compute_proportional_static_keys()
-        elif self.initial_keys_path == 'proportional_dynamic':  # Create proportional dynamic keys
-            keys = self._compute_proportional_dynamic_keys()
+        for option in input_options:
+            if option not in OPTIONS:
+                raise UserInputException(f'The option {option} of existing inputs cannot be replaced.')
+        inputs = copy.copy(self)
+        if is_merged:
+            inputs.input_options = {**self.input_options, **input_options}
         else:
-            # Try reading time series keys
-            keys: pd.DataFrame = read_data(self.initial_keys_path)
+            inputs.input_options = {**{o: v for o, v in self.input_options.items() if o not in OPTIONS},
+                                    **input_options}
+        inputs._parse_input_options(inputs.input_options)
 
-            # If single row keys, transform it into a keys time series
-            if len(keys.index) == 1:
-                base_keys = pd.read_csv(self.initial_keys_path)
-                base_key_users = list(base_keys.columns)
-                keys = pd.DataFrame(index=self.consumption.index, columns=base_key_users)
-                keys[base_key_users] = base_keys.values
+        return inputs
 
-        return keys
+    def with_initial_keys(self, initial_keys_path: str) -> 'RepartitionKeysInputs':
+        """
+        Creates a copy of the inputs sharing the same data, with other initial keys.
 
-    def _compute_uniform_keys(self) -> pd.DataFrame:
+        :param initial_keys_path: Type of initial keys or path to the initial keys file.
+        :return: New inputs.
         """
-        Computes the initial keys according to the principle of uniformity among the participants of a renewable energy
-        community.
+        inputs = copy.copy(self)
+        inputs.initial_keys_path = initial_keys_path
+        inputs.compact_initial_keys = inputs._parse_initial_keys()
+        inputs.initial_allocated_production_values = inputs._compute_initial_allocated_production()
 
-        :return: Initial keys.
+        return inputs
+
+    def time_slice(self, start: int, stop: int) -> 'RepartitionKeysInputs':
         """
-        not_consumers = list()
-        for name, value in (self.consumption.max()).iteritems():
-            if value <= EPS:
-                not_consumers.append(name)
+        Creates a copy of the inputs restricted to a range of time steps, sharing the same data.
 
-        keys_aux = np.empty(self.consumption.shape)
-        keys_aux[:] = 1 / (len(self.users) - len(not_consumers))
-        self._keys = pd.DataFrame(index=self.data_net_consumption.index, columns=self.users, data=keys_aux)
-        self._keys[not_consumers] = 0.0
+        :param start: Position of the first time step.
+        :param stop: Position after the last time step.
+        :return: New inputs.
+        """
+        inputs = copy.copy(self)
+        inputs.times = self.times[start:stop]
+        for name in ['data_consumption_values', 'data_production_values', 'data_net_consumption_values',
+                     'consumption_values', 'production_values', 'initial_allocated_production_values']:
+            setattr(inputs, name, getattr(self, name)[start:stop])
+        inputs.compact_initial_keys = self.compact_initial_keys.time_slice(start, stop)
 
-        return self._keys
+        return inputs
 
-    def _compute_proportional_static_keys(self) -> pd.DataFrame:
+    def time_select(self, positions: np.ndarray) -> 'RepartitionKeysInputs':
         """
-        Computes the initial keys according to the principle of yearly proportionality of a consumer's demand and the
-        total demand of the renewable energy community.
+        Creates a copy of the inputs restricted to any time steps, e.g. representative days, copying their data.
 
-        :return: Initial keys.
+        :param positions: Positions of the time steps, in the order of the new inputs.
+        :return: New inputs.
         """
-        total_consumption_users = self.consumption.sum(axis=0)
-        total_consumption_system = total_consumption_users.sum()
-        self._keys = pd.DataFrame(index=self.data_net_consumption.index, columns=self.users)
-        for user in self.users:
-            self._keys[user] = total_consumption_users[user] / total_consumption_system
+        inputs = copy.copy(self)
+        inputs.times = self.times[positions]
+        for name in ['data_consumption_values', 'data_production_values', 'data_net_consumption_values',
+                     'consumption_values', 'production_values', 'initial_allocated_production_values']:
+            setattr(inputs, name, np.ascontiguousarray(getattr(self, name)[positions]))
+        inputs.compact_initial_keys = Keys.from_array(self.initial_keys_values[positions])
 
-        return self._keys
+        return inputs
 
-    def _compute_proportional_dynamic_keys(self) -> pd.DataFrame:
+    def time_aggregate(self, blocks: List[Tuple[int, int]]) -> 'RepartitionKeysInputs':
+        """
+        Creates a copy of the inputs aggregated over blocks of consecutive time steps, e.g. hours of 15-minute time
+        steps, summing their data. The initial keys of a block allocate its production as the initial keys of its time
+        steps do.
+
+        :param blocks: List of (start, stop) positions of the blocks, covering all the time steps in order.
+        :return: New inputs, with one time step per block, dated by its first time step.
+        """
+        starts = np.array([start for start, _ in blocks], dtype=int)
+        inputs = copy.copy(self)
+        inputs.times = self.times[starts]
+        for name in ['data_consumption_values', 'data_production_values', 'data_net_consumption_values',
+                     'consumption_values', 'production_values', 'initial_allocated_production_values']:
+            setattr(inputs, name, np.add.reduceat(getattr(self, name), starts, axis=0))
+        production = inputs.production_values.sum(axis=1, keepdims=True)
+        keys = np.where(production > 0, inputs.initial_allocated_production_values / np.where(production > 0,
+                                                                                             production, 1.0),
+                        self.initial_keys_values[starts])
+        inputs.compact_initial_keys = Keys.from_array(keys.astype(self.dtype, copy=False))
+
+        return inputs
+
+    def _parse_initial_keys(self, ) -> Keys:
         """
-        Computes the initial keys according to the principle of quarterly proportionality of a consumer's demand and the
-        total demand of the renewable energy community.
+        Parse the initial keys file. If the input file contains a single row, the keys are the same at every time step.
 
         :return: Initial keys.
         """
-        total_consumption_system = self.consumption.sum(axis=1)
-        self._keys = pd.DataFrame(index=self.data_net_consumption.index, columns=self.users)
-        for timestamp, users in self.consumption.iterrows():
-            if total_consumption_system[timestamp] <= EPS:
-                value = EPS
-            else:
-                value = total_consumption_system[timestamp]
-            self._keys.loc[timestamp] = users / value
+        if is_keys_strategy(self.initial_keys_path):  # Keys computed by a built-in or registered strategy
+            try:
+                return compute_keys(self, self.initial_keys_path)
+            except ValueError as e:
+                raise UserInputException(f'Invalid initial keys {self.initial_keys_path}: {e}')
+        else:
+            # Try reading time series keys
+            keys: pd.DataFrame = read_data(self.initial_keys_path)
 
-        return self._keys
+            # Single row keys, the same at every time step
+            is_static = len(keys.index) == 1
+            if is_static and self.initial_keys_path.lower().endswith('.csv'):
+                keys = keys.reset_index()  # Single row csv files have no index, the first user was read as index
 
-    def _compute_local_consumption(self) -> pd.DataFrame:
+            missing_users = [u for u in self.users if u not in keys.columns]
+            if len(missing_users) > 0:
+                raise UserInputException(f'Missing users {", ".join(map(str, missing_users))} in the initial keys.')
+            if is_static:
+                return Keys.static(keys.loc[keys.index[0], self.users].to_numpy(dtype=self.dtype), len(self.times))
+            keys = keys.reindex(index=self.times, columns=self.users)
+            if keys.isna().any(axis=None):
+                raise UserInputException('The initial keys do not cover all the time steps of the consumption.')
+
+            return Keys.from_array(np.ascontiguousarray(keys.to_numpy(dtype=self.dtype)))
+
+    def _compute_local_consumption(self) -> np.ndarray:
         """
         Computes the part of the consumption covered from locally produced energy.
 
         :return: Proportion of the consumption covered by the local generation.
         """
-        net_consumption_production = self.consumption_total.subtract(self.production_total).clip(lower=0.0)
-        consumption_local = self.consumption_total.subtract(net_consumption_production).clip(lower=0.0)
+        consumption_total = self.consumption_values.sum(axis=1)
+        production_total = -self.production_values.sum(axis=1)
+        net_consumption_production = np.clip(consumption_total - production_total, 0.0, None)
+        consumption_local = np.clip(consumption_total - net_consumption_production, 0.0, None)
 
         return consumption_local
 
-    def _compute_initial_allocated_production(self) -> pd.DataFrame:
+    def _compute_initial_allocated_production(self) -> np.ndarray:
         """
         Computes the initial allocation of the production given the initial keys.
 
         :return: Initial allocation of production.
         """
-        index = self.initial_keys.index
-        initial_allocated_production = pd.DataFrame(index=index, columns=self.users)
-        production_sum = self.production.sum(axis=1)
-        for u in self.users:
-            initial_allocated_production.loc[:, u] = self.initial_keys.loc[:, u] * production_sum
+        return self.compact_initial_keys.scale(self.production_values.sum(axis=1))
+
+    def maximum_ssr(self) -> Tuple[np.ndarray, float]:
+        """
+        Computes upper bounds of the self-sufficiency rates that the optimized keys can reach, without solver.
+
+        At each time step, the keys are within the maximum deviations of the initial keys and sum to at most 1, and the
+        verified allocated production of a user is its allocated production up to its consumption. A user reaches its
+        highest rate with its highest keys, the other users keeping their lowest ones. The REC reaches its highest rate
+        sharing the keys left above the lowest ones among the users still consuming more than their allocation. Each
+        bound is reached on its own, not necessarily all together.
+
+        :return: Maximum self-sufficiency rate of each user (1 for pure producers) and of the REC.
+        """
+        production = self.production_values.sum(axis=1, dtype=float)
+        consumption = self.consumption_values
+        max_deviations = np.minimum(self.user_parameters['max_deviations'], 1.0)
+        initial_keys = self.initial_keys_values
+        lowest_keys = np.clip(initial_keys - max_deviations, 0.0, None)
+        free_keys = np.clip(1.0 - lowest_keys.sum(axis=1), 0.0, None)
+        highest_keys = np.minimum(np.minimum(initial_keys + max_deviations, 1.0),
+                                  lowest_keys + free_keys[:, np.newaxis])
+
+        # Highest and lowest verified allocated production of each user
+        lowest_verified = np.minimum(consumption, lowest_keys * production[:, np.newaxis])
+        highest_verified = np.minimum(consumption, highest_keys * production[:, np.newaxis])
+        verified_rec = lowest_verified.sum(axis=1) + np.minimum(free_keys * production,
+                                                                 (highest_verified - lowest_verified).sum(axis=1))
+
+        min_production_demand = np.minimum(self.data_consumption_values, -self.data_production_values).sum(
+            axis=0, dtype=float)
+        total_users_consumption = self.data_consumption_values.sum(axis=0, dtype=float)
+        is_consumer = total_users_consumption > MIN_CONSUMPTION
+        maximum_ssr_user = np.where(is_consumer, (min_production_demand + highest_verified.sum(axis=0)) / np.where(
+            is_consumer, total_users_consumption, 1.0), 1.0)
+        maximum_ssr_rec = float((min_production_demand.sum() + verified_rec.sum())
+                                / max(total_users_consumption.sum(), MIN_CONSUMPTION))
+
+        return maximum_ssr_user, maximum_ssr_rec
+
+    def user_vector(self, values: dict) -> np.ndarray:
+        """
+        Transforms a dictionary {user: value} into a vector following the order of the users.
 
-        return initial_allocated_production
+        :param values: Dictionary of values per user.
+        :return: Vector of values, one per user.
+        """
+        return np.array([values[u] for u in self.users], dtype=float)
 
     @staticmethod
     def _retrieve_input_dict(inputs: dict, parameter: str, default_value: float, list_users: list,
@@ -0,0 +1,189 @@
+import logging
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .repartition_keys_inputs import RepartitionKeysInputs
+from .matrix_model import MatrixModel
+from .key_evaluator import KeyEvaluator
+from .utils import time_blocks
+
+EPS = 1e-6
+STEPS_PER_DAY = 96  # Days of 15-minute time steps, for time steps that are not dates.
+
+
+class RepresentativeDaysSolver:
+    """
+    Approximate optimization of the repartition keys over representative days, for long horizons.
+
+    The days are clustered by k-medoids on their joint consumption and production: the consumption and production of
+    each user over the day and the intraday profiles of the consumption and production of the community. The linear
+    program is solved over the medoids only, each one weighted by the number of days of its cluster, so that the
+    self-sufficiency rates of the reduced problem stand for the ones of the whole horizon. The keys of each medoid are
+    then applied to all the days of its cluster, and the results are computed on the whole horizon with these keys (see
+    `KeyEvaluator`). The days with another number of time steps than most of them, e.g. a truncated last day, are kept
+    as they are.
+
+    The minimum self-sufficiency rates reachable over the whole horizon may not be over the representative days alone:
+    their slack in the reduced problem is then an error of the approximation, reported with a warning and by `errors`,
+    and the results are still computed with the keys found.
+    """
+
+    def __init__(self, inputs: RepartitionKeysInputs, n_days: int, seed: int = 0, max_iterations: int = 100,
+                 is_debug: bool = False):
+        self.inputs = inputs
+        self.n_days = n_days
+        self.seed = seed
+        self.max_iterations = max_iterations
+        self.is_debug = is_debug
+
+        # Clustering and results of the reduced problem
+        self.days: List[Tuple[int, int]] = list()
+        self.medoids = np.zeros(0, dtype=int)  # Position of the representative day of each cluster in the days
+        self.labels = np.zeros(0, dtype=int)  # Cluster of each day, -1 for the days kept as they are
+        self.reduced_results: Dict[str, np.ndarray] = dict()
+        self.slack_users: Dict[str, float] = dict()
+        self.slack_rec = 0.0
+
+    def cluster(self):
+        """
+        Clusters the days of the horizon into representative days.
+        """
+        self.days = time_blocks(self.inputs.times, 'D', STEPS_PER_DAY)
+        lengths = np.array([stop - start for start, stop in self.days])
+        day_length = np.bincount(lengths).argmax()
+        full_days = np.flatnonzero(lengths == day_length)
+
+        features = self._features(full_days, day_length)
+        medoids = self._k_medoids(features, min(self.n_days, len(full_days)))
+        self.medoids = full_days[medoids[0]]
+        self.labels = np.full(len(self.days), -1)
+        self.labels[full_days] = medoids[1]
+
+    def solve_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys over the representative days.
+
+        @return Result arrays over the whole horizon, with the same layout as `Optimizer.optimization_arrays`.
+        """
+        if len(self.days) == 0:
+            self.cluster()
+        inputs = self.inputs
+
+        # Reduced problem: representative days weighted by the size of their cluster, then the days kept as they are
+        kept_days = np.flatnonzero(self.labels < 0)
+        reduced_days = [self.days[d] for d in np.concatenate([self.medoids, kept_days])]
+        day_weights = np.concatenate([np.bincount(self.labels[self.labels >= 0], minlength=len(self.medoids)),
+                                      np.ones(len(kept_days))])
+        positions = np.concatenate([np.arange(start, stop) for start, stop in reduced_days])
+        weights = np.repeat(day_weights, [stop - start for start, stop in reduced_days])
+        model = MatrixModel(inputs.time_select(positions), time_weights=weights)
+        solution = model.solve(is_debug=self.is_debug)
+        self.reduced_results = model.result_arrays(solution)
+        self.slack_users = dict(zip(model.users, model.values(solution, 'slack_ssr_user')))
+        self.slack_rec = model.values(solution, 'slack_ssr_rec')[0]
+        short = [str(u) for u, v in self.slack_users.items() if v > EPS] + (['the REC'] if self.slack_rec > EPS else [])
+        if len(short) > 0:
+            logging.warning(f'Minimum self-sufficiency rates not reached over the {len(self.medoids)} representative '
+                            f'days for {", ".join(short)}, the results are approximate: try with more representative '
+                            f'days.')
+
+        # Keys of each day: the ones of its representative day at the same time of the day
+        reduced_start = np.cumsum([0] + [stop - start for start, stop in reduced_days])
+        reduced_index = {day: i for i, day in enumerate(np.concatenate([self.medoids, kept_days]))}
+        source = np.empty(len(inputs.times), dtype=int)
+        for day, (start, stop) in enumerate(self.days):
+            representative = self.medoids[self.labels[day]] if self.labels[day] >= 0 else day
+            source[start:stop] = reduced_start[reduced_index[representative]] + np.arange(stop - start)
+
+        return KeyEvaluator(inputs).result_arrays(self.reduced_results['optimized_keys'][source])
+
+    def errors(self, results: Dict[str, np.ndarray], exact_results: Dict[str, np.ndarray]) -> Dict[str, dict]:
+        """
+        Errors of the approximation against the results of the optimization over the whole horizon.
+
+        @param results: Results of `solve_arrays`.
+        @param exact_results: Results of the optimization over the whole horizon.
+        @return Errors of the self-sufficiency rates and objective estimated by the reduced problem ("estimated"), and of
+        the ones obtained on the whole horizon with the keys of the representative days ("horizon"): largest absolute
+        error of the self-sufficiency rates of the users, absolute error of the one of the REC and relative error of the
+        objective. The estimated errors also give the largest slack of the minimum self-sufficiency rates of the users
+        and the slack of the one of the REC in the reduced problem.
+        """
+        errors = {name: {
+            'ssr_user': float(np.abs(r['ssr_user'] - exact_results['ssr_user']).max(initial=0.0)),
+            'ssr_rec': float(abs(r['ssr_rec'] - exact_results['ssr_rec'])),
+            'objective': float(abs(r['objective'] - exact_results['objective'])
+                               / max(abs(exact_results['objective']), 1.0))
+        } for name, r in [('estimated', self.reduced_results), ('horizon', results)]}
+        errors['estimated'].update({'slack_ssr_user': float(max(self.slack_users.values(), default=0.0)),
+                                    'slack_ssr_rec': float(self.slack_rec)})
+
+        return errors
+
+    def _features(self, days: np.ndarray, day_length: int) -> np.ndarray:
+        """
+        Features of the days clustered: consumption and production of each user over the day and intraday profiles of
+        the consumption and production of the community, each group of features having the same weight.
+
+        @param days: Positions of the days in the days of the horizon.
+        @param day_length: Number of time steps of these days.
+        @return Features, one row per day.
+        """
+        positions = np.concatenate([np.arange(self.days[d][0], self.days[d][1]) for d in days])
+        groups = list()
+        for values in [self.inputs.consumption_values, self.inputs.production_values]:
+            daily = values[positions].reshape(len(days), day_length, -1)
+            groups += [daily.sum(axis=1), daily.sum(axis=2)]
+
+        scaled_groups = list()
+        for group in groups:
+            spread = group.std(axis=0)
+            group = (group - group.mean(axis=0)) / np.where(spread > 0, spread, 1.0)
+            scaled_groups.append(group / np.sqrt(group.shape[1]))
+
+        return np.hstack(scaled_groups)
+
+    def _k_medoids(self, features: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Clusters points with the k-medoids algorithm, initialized as k-means++ and improved by alternating the
+        assignment of the points to the closest medoid and the choice of the medoid of each cluster.
+
+        @param features: Points, one per row.
+        @param k: Number of clusters.
+        @return Positions of the medoids in the points and cluster of each point.
+        """
+        n_points = len(features)
+        if k >= n_points:
+            return np.arange(n_points), np.arange(n_points)
+
+        squared_norms = (features ** 2).sum(axis=1)
+        distances = np.sqrt(np.clip(squared_norms[:, np.newaxis] + squared_norms - 2 * features @ features.T, 0.0,
+                                    None))
+
+        rng = np.random.default_rng(self.seed)
+        medoids = [int(rng.integers(n_points))]
+        for _ in range(1, k):
+            weights = distances[:, medoids].min(axis=1) ** 2
+            if weights.sum() <= 0:  # Identical points
+                weights = np.ones(n_points)
+                weights[medoids] = 0.0
+            medoids.append(int(rng.choice(n_points, p=weights / weights.sum())))
+        medoids = np.array(medoids)
+
+        for _ in range(self.max_iterations):
+            labels = distances[:, medoids].argmin(axis=1)
+            labels[medoids] = np.arange(k)
+            new_medoids = medoids.copy()
+            for c in range(k):
+                members = np.flatnonzero(labels == c)
+                new_medoids[c] = members[distances[np.ix_(members, members)].sum(axis=0).argmin()]
+            if np.array_equal(new_medoids, medoids):
+                break
+            medoids = new_medoids
+
+        labels = distances[:, medoids].argmin(axis=1)
+        labels[medoids] = np.arange(k)
+
+        return medoids, labels
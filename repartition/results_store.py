@@ -0,0 +1,189 @@
+import json
+import os
+
+from typing import Dict, Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+RESULTS_FORMATS = {'npz': 'results.npz', 'parquet': 'results.parquet'}  # File of the results per format.
+LAYOUT_KEY = 'repartition'  # Member of the npz file or key of the parquet metadata describing the stored data.
+ROW_GROUP_SIZE = 96 * 7 * 4  # Time steps per row group of the parquet files, four weeks of 15-minute data.
+
+Data = Union[pd.DataFrame, pd.Series]
+
+
+def save_results_store(data: Dict[str, Data], path: str, metadata: dict = None):
+    """
+    Saves the results and inputs of a run in one compressed file, see `RESULTS_FORMATS`:
+
+    - npz: NumPy archive, one compressed member per array, read separately;
+    - parquet (requires pyarrow): columnar file, one column per user of the data given per time step, compressed by
+      column and by row group, the other data (e.g. per user) being stored in the metadata of the file.
+
+    @param data: Data frames and series to save, by name.
+    @param path: Path of the file, its extension giving the format.
+    @param metadata: Run metadata (e.g. options, solver, timings), must be serializable in json.
+    """
+    if path.endswith('.parquet'):
+        _save_parquet(data, path, metadata or {})
+    else:
+        _save_npz(data, path, metadata or {})
+
+
+def load_results_store(path: str, names: Iterable[str] = None) -> Dict[str, Data]:
+    """
+    Loads the results and inputs of a run saved with `save_results_store`, only reading the requested data.
+
+    @param path: Path of the file.
+    @param names: Names of the data to load, everything if None.
+    @return Data frames and series, by name.
+    """
+    if path.endswith('.parquet'):
+        return _load_parquet(path, names)
+    return _load_npz(path, names)
+
+
+def load_results_metadata(path: str) -> dict:
+    """
+    Loads the run metadata of a file saved with `save_results_store`.
+    """
+    return _read_layout(path)['metadata']
+
+
+def results_store_path(output_path: str, data_format: str) -> str:
+    """
+    Path of the file of the results in an output directory.
+    """
+    return os.path.join(output_path, RESULTS_FORMATS[data_format])
+
+
+def _read_layout(path: str) -> dict:
+    """
+    Reads the description of the data stored in a file.
+    """
+    if path.endswith('.parquet'):
+        check_pyarrow()
+        return json.loads(pq.read_schema(path).metadata[LAYOUT_KEY.encode()])
+    with np.load(path, allow_pickle=False) as store:
+        return json.loads(str(store[LAYOUT_KEY]))
+
+
+def _save_npz(data: Dict[str, Data], path: str, metadata: dict):
+    """
+    Saves data in a compressed npz file: values, index and columns of each data frame or series.
+    """
+    arrays = dict()
+    layout = {'metadata': metadata, 'data': dict()}
+    for name, df in data.items():
+        layout['data'][name] = 'frame' if isinstance(df, pd.DataFrame) else 'series'
+        arrays[f'{name}.values'] = df.to_numpy(dtype=float)
+        arrays[f'{name}.index'] = _axis_array(df.index)
+        if isinstance(df, pd.DataFrame):
+            arrays[f'{name}.columns'] = _axis_array(df.columns)
+    arrays[LAYOUT_KEY] = np.array(json.dumps(layout, default=str))
+
+    np.savez_compressed(path, **arrays)
+
+
+def _load_npz(path: str, names: Iterable[str] = None) -> Dict[str, Data]:
+    """
+    Loads data from a compressed npz file, only decompressing the requested members.
+    """
+    output = dict()
+    with np.load(path, allow_pickle=False) as store:
+        layout = json.loads(str(store[LAYOUT_KEY]))
+        for name in names or layout['data']:
+            if layout['data'][name] == 'frame':
+                output[name] = pd.DataFrame(store[f'{name}.values'], index=store[f'{name}.index'],
+                                            columns=store[f'{name}.columns'])
+            else:
+                output[name] = pd.Series(store[f'{name}.values'], index=store[f'{name}.index'], name=name)
+
+    return output
+
+
+def _save_parquet(data: Dict[str, Data], path: str, metadata: dict):
+    """
+    Saves data in a parquet file. The data given per time step are the columns of one table, named "<name>/<user>" for
+    the data frames and "<name>" for the series, the other data are stored in the metadata of the file.
+    """
+    check_pyarrow()
+    times = next(df.index for df in data.values() if isinstance(df, pd.DataFrame))
+    columns = dict()
+    layout = {'metadata': metadata, 'data': dict()}
+    for name, df in data.items():
+        if not df.index.equals(times):
+            layout['data'][name] = {'index': df.index.tolist(), 'values': df.to_numpy(dtype=float).tolist()}
+            if isinstance(df, pd.DataFrame):
+                layout['data'][name]['columns'] = df.columns.astype(str).tolist()
+        elif isinstance(df, pd.DataFrame):
+            layout['data'][name] = {'columns': df.columns.astype(str).tolist()}
+            columns.update({f'{name}/{column}': df[column].to_numpy(dtype=float) for column in df.columns})
+        else:
+            layout['data'][name] = {}
+            columns[name] = df.to_numpy(dtype=float)
+
+    table = pa.Table.from_pandas(pd.DataFrame(columns, index=times), preserve_index=True)
+    table = table.replace_schema_metadata(
+        {**table.schema.metadata, LAYOUT_KEY.encode(): json.dumps(layout, default=str).encode()}
+    )
+    pq.write_table(table, path, compression='zstd', row_group_size=ROW_GROUP_SIZE)
+
+
+def _load_parquet(path: str, names: Iterable[str] = None) -> Dict[str, Data]:
+    """
+    Loads data from a parquet file, only reading the columns of the requested data.
+    """
+    layout = _read_layout(path)
+    names = list(names or layout['data'])
+    columns = list()
+    for name in names:
+        description = layout['data'][name]
+        if 'index' in description:
+            continue
+        if 'columns' in description:
+            columns.extend(f'{name}/{column}' for column in description['columns'])
+        else:
+            columns.append(name)
+    table = pq.read_table(path, columns=columns, use_pandas_metadata=True).to_pandas()
+
+    output = dict()
+    for name in names:
+        description = layout['data'][name]
+        if 'index' in description and 'columns' in description:
+            output[name] = pd.DataFrame(description['values'], index=description['index'],
+                                        columns=description['columns'])
+        elif 'index' in description:
+            output[name] = pd.Series(description['values'], index=description['index'], name=name)
+        elif 'columns' in description:
+            output[name] = table[[f'{name}/{column}' for column in description['columns']]].set_axis(
+                description['columns'], axis=1)
+        else:
+            output[name] = table[name]
+
+    return output
+
+
+def _axis_array(axis: pd.Index) -> np.ndarray:
+    """
+    Transforms an index into an array readable without pickle, the objects (e.g. names of the users) being stored as
+    strings.
+    """
+    values = axis.to_numpy()
+    return values.astype(str) if values.dtype == object else values
+
+
+def check_pyarrow(data_format: str = 'parquet'):
+    """
+    Checks that the parquet format (or another format of pyarrow, e.g. feather) is available.
+    """
+    if pq is None:
+        raise ImportError(f'The {data_format} format requires pyarrow: pip install pyarrow.')
+
@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from .repartition_keys_inputs import RepartitionKeysInputs, UserInputException
+from .matrix_model import MatrixModel
+from .closed_form import ClosedFormSolver
+from .results_store import save_results_store
+from .utils import results_to_frames
+
+EPS = 1e-6
+STATE_VERSION = 1  # Changed whenever the layout of the state store changes.
+CARRIED_TOTALS = ('consumption', 'min_production_demand', 'verified_allocated_production')
+
+
+class RollingHorizon:
+    """
+    Operational optimization of the repartition keys window by window (e.g. day by day), as the meter data arrives.
+
+    The minimum self-sufficiency rates are targets over the year: each window is optimized with the self-sufficiency
+    rates of the year to date, i.e. including the consumption and the verified allocated production of the previous
+    windows of the year. A window thus makes up for the shortfall of the previous ones, or uses their surplus, and the
+    targets become running targets. A running target that cannot be reached in the window is reported, not raised.
+
+    The state store is a directory keeping the totals per user carried from the previous windows (state.json) and the
+    results of each window, appended in a compressed file per window (see `save_results_store`). Only the totals are
+    read back, so that the time taken by a window does not depend on the length of the history. The totals are reset
+    at the first window of a new year, for dated time steps.
+    """
+
+    def __init__(self, state_path: str, is_debug: bool = False):
+        self.state_path = state_path
+        self.is_debug = is_debug
+        self.state = self._load_state()
+
+    @property
+    def state_file(self) -> str:
+        return os.path.join(self.state_path, 'state.json')
+
+    def _load_state(self) -> dict:
+        """
+        Loads the state of the store, or an empty state if there is none yet.
+        """
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.loads(f.read())
+        except FileNotFoundError:
+            return {'version': STATE_VERSION, 'year': None, 'last_time': None, 'windows': 0, 'time_steps': 0,
+                    'totals': {name: dict() for name in CARRIED_TOTALS}}
+        if state.get('version') != STATE_VERSION:
+            raise UserInputException(f'Unsupported state store version {state.get("version")} in {self.state_path}.')
+
+        return state
+
+    def _save_state(self):
+        """
+        Saves the state of the store, replacing the previous one at once.
+        """
+        temporary_file = f'{self.state_file}.tmp'
+        with open(temporary_file, 'w') as f:
+            f.write(json.dumps(self.state, indent=2))
+        os.replace(temporary_file, self.state_file)
+
+    def carried_totals(self, inputs: RepartitionKeysInputs) -> Dict[str, np.ndarray]:
+        """
+        Totals carried from the previous windows of the year, for the users of the inputs (zero for new users).
+
+        @param inputs: Inputs of the window.
+        @return Vectors of totals per user, see `CARRIED_TOTALS`.
+        """
+        totals = self.state['totals']
+        if self._is_new_year(inputs):
+            totals = {name: dict() for name in CARRIED_TOTALS}
+
+        return {name: np.array([totals[name].get(str(u), 0.0) for u in inputs.users]) for name in CARRIED_TOTALS}
+
+    def _is_new_year(self, inputs: RepartitionKeysInputs) -> bool:
+        """
+        Checks whether the window starts a new year, for dated time steps.
+        """
+        return isinstance(inputs.times, pd.DatetimeIndex) and self.state['year'] is not None \
+            and inputs.times[0].year != self.state['year']
+
+    def _follows(self, inputs: RepartitionKeysInputs) -> bool:
+        """
+        Checks whether the window starts after the last window of the store.
+        """
+        last_time = self.state['last_time']
+        if last_time is None:
+            return True
+        if isinstance(inputs.times, pd.DatetimeIndex):
+            return inputs.times[0] > pd.Timestamp(last_time)
+        return inputs.times[0] > type(inputs.times[0])(last_time)
+
+    def step(self, inputs: RepartitionKeysInputs) -> Dict[str, np.ndarray]:
+        """
+        Optimizes the repartition keys of a window following the previous ones, then appends its results to the store.
+
+        @param inputs: Inputs of the window, holding only its data.
+        @return Result arrays of the window, with the same layout as `Optimizer.optimization_arrays`, the
+        self-sufficiency rates being the ones of the year to date.
+        """
+        if not self._follows(inputs):
+            raise UserInputException(f'The window starting at {inputs.times[0]} does not follow the last window of the '
+                                     f'state store, ending at {self.state["last_time"]}.')
+        carried = self.carried_totals(inputs)
+
+        # Optimization of the window, in closed form when no self-sufficiency rate links the time steps
+        if ClosedFormSolver.is_applicable(inputs):
+            results = ClosedFormSolver(inputs).solve_arrays()
+        else:
+            model = MatrixModel(inputs, carried_totals=carried)
+            solution = model.solve(is_debug=self.is_debug)
+            results = model.result_arrays(solution)
+            slack_users = model.values(solution, 'slack_ssr_user')
+            slack_rec = model.values(solution, 'slack_ssr_rec')[0]
+            if (slack_users > EPS).any() or slack_rec > EPS:
+                logging.warning(f'Running self-sufficiency rate targets not reached at {inputs.times[-1]} for '
+                                f'{", ".join(map(str, inputs.users[slack_users > EPS]))}'
+                                f'{" and the REC" if slack_rec > EPS else ""}.')
+
+        # Totals of the year to date
+        totals = {
+            'consumption': carried['consumption'] + inputs.data_consumption_values.sum(axis=0, dtype=float),
+            'min_production_demand': carried['min_production_demand'] + np.minimum(
+                inputs.data_consumption_values, -inputs.data_production_values).sum(axis=0, dtype=float),
+            'verified_allocated_production': carried['verified_allocated_production']
+            + results['verified_allocated_production'].sum(axis=0)
+        }
+        is_consumer = totals['consumption'] > EPS
+        results['ssr_user'] = np.where(is_consumer, (totals['min_production_demand']
+                                                     + totals['verified_allocated_production'])
+                                       / np.where(is_consumer, totals['consumption'], 1.0), 1.0)
+        results['ssr_rec'] = float((totals['min_production_demand'] + totals['verified_allocated_production']).sum()
+                                   / max(totals['consumption'].sum(), EPS))
+
+        # Results of the window appended to the store, then state of the year to date
+        os.makedirs(self.state_path, exist_ok=True)
+        save_results_store(results_to_frames(results, inputs.times, inputs.users),
+                           os.path.join(self.state_path, f'window_{self.state["windows"]:06d}.npz'),
+                           {'start': str(inputs.times[0]), 'stop': str(inputs.times[-1])})
+        if self._is_new_year(inputs):
+            self.state['totals'] = {name: dict() for name in CARRIED_TOTALS}
+        for name, values in totals.items():
+            self.state['totals'][name].update(zip(map(str, inputs.users), values.tolist()))
+        if isinstance(inputs.times, pd.DatetimeIndex):
+            self.state['year'] = int(inputs.times[0].year)
+        self.state['last_time'] = str(inputs.times[-1])
+        self.state['windows'] += 1
+        self.state['time_steps'] += len(inputs.times)
+        self._save_state()
+
+        return results
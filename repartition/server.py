@@ -0,0 +1,269 @@
+import asyncio
+import itertools
+import json
+import os
+import signal
+import socket
+import tempfile
+import time
+import traceback
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+from .repartition_keys_inputs import RepartitionKeysInputs, UserInputException
+from .cache import InputsCache
+from .optimizer import Optimizer, SolverException
+from .cost_analysis import CostAnalysis
+from .utils import save_run, ParsingException
+
+JOB_DEFAULTS = {  # Fields of a job and their default values, named after the arguments of the command line.
+    'data_consumption': None, 'data_production': None, 'initial_keys': 'uniform', 'input_options': None,
+    'output_path': '.', 'output_format': 'csv', 'solver': 'cbc', 'backend': 'matrix', 'is_closed_form': True,
+    'block_frequency': 'W', 'representative_days': 0, 'coarse_frequency': None, 'trust_radius': None,
+    'billing_period': None
+}
+OPTIMIZER_FIELDS = {  # Fields of a job passed to the optimizer, with the name of its argument.
+    'solver': 'solver_name', 'backend': 'backend', 'is_closed_form': 'is_closed_form',
+    'block_frequency': 'block_frequency', 'representative_days': 'representative_days',
+    'coarse_frequency': 'coarse_frequency', 'trust_radius': 'trust_radius', 'billing_period': 'billing_period'
+}
+MAX_WARM_INPUTS = 8  # Inputs kept in memory by each worker, with their models.
+
+# Worker state, shared by all the jobs run by the same process
+_cache: InputsCache = None
+_inputs: Dict[str, RepartitionKeysInputs] = OrderedDict()
+_optimizers: Dict[Tuple[str, str], Optimizer] = dict()
+
+
+class OptimizationServer:
+    """
+    Local server optimizing the repartition keys of the jobs it receives, for schedulers launching many runs.
+
+    The jobs are sent on a Unix socket (or on a TCP port of the local host), one json object per line with the fields
+    of `JOB_DEFAULTS`, named after the arguments of the command line. They are queued and run in a pool of worker
+    processes started once, with the modules already imported. Each worker keeps the last inputs it parsed in memory,
+    with their models: a job on the same data only updates the options of the inputs and, with the matrix backend, is
+    warm-started from the previous solve of the model (see `Optimizer`). Other inputs are read through the on-disk
+    cache (see `InputsCache`), shared by the workers.
+
+    The progress of each job is streamed back on the connection it was sent on, one json object per line: "queued"
+    when received, "running" when a worker starts it, then its outcome: "optimal" with the objective, the
+    self-sufficiency rate of the REC and the timings, "infeasible" or "failed" with a message.
+    """
+
+    def __init__(self, socket_path: str = None, port: int = None, jobs: int = 1, cache_path: str = None,
+                 cache_size: int = 2 ** 30, is_verbose: bool = False):
+        if (socket_path is None) == (port is None):
+            raise ValueError('Either a socket path or a port is expected.')
+        self.socket_path = socket_path
+        self.port = port
+        self.jobs = jobs
+        self.cache_path = cache_path or os.path.join(tempfile.gettempdir(), 'repartition_cache')
+        self.cache_size = cache_size
+        self.is_verbose = is_verbose
+
+        self._job_ids = itertools.count(1)
+        self._executor: ProcessPoolExecutor = None
+        self._slots: asyncio.Semaphore = None  # Free workers
+        self._queued = 0
+
+    def run(self):
+        """
+        Serves until interrupted or terminated.
+        """
+        try:
+            asyncio.run(self.serve())
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
+
+    async def serve(self):
+        """
+        Starts the workers and serves the jobs.
+        """
+        self._slots = asyncio.Semaphore(self.jobs)
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=_initialize_worker,
+                                 initargs=(self.cache_path, self.cache_size)) as self._executor:
+            # Workers started before any connection is accepted, so that they do not inherit its socket
+            loop = asyncio.get_running_loop()
+            loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+            await asyncio.gather(*[loop.run_in_executor(self._executor, os.getpid) for _ in range(self.jobs)])
+            if self.socket_path is not None:
+                if os.path.exists(self.socket_path):
+                    os.remove(self.socket_path)
+                server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+            else:
+                server = await asyncio.start_server(self._handle_connection, host='127.0.0.1', port=self.port)
+            if self.is_verbose:
+                print(f'Serving on {self.socket_path or self.port} with {self.jobs} workers.')
+            try:
+                async with server:
+                    await server.serve_forever()
+            finally:
+                if self.socket_path is not None and os.path.exists(self.socket_path):
+                    os.remove(self.socket_path)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Reads the jobs of a connection, then waits for all of them before closing it.
+        """
+        tasks = list()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.strip():
+                tasks.append(asyncio.create_task(self._handle_job(line, writer)))
+        await asyncio.gather(*tasks)
+        writer.close()
+
+    async def _handle_job(self, line: bytes, writer: asyncio.StreamWriter):
+        """
+        Queues a job, runs it in a worker and reports its progress.
+        """
+        job_id = next(self._job_ids)
+        try:
+            job = parse_job(line)
+        except UserInputException as e:
+            await self._send(writer, {'job': job_id, 'status': 'failed', 'message': str(e)})
+            return
+
+        self._queued += 1
+        await self._send(writer, {'job': job_id, 'status': 'queued', 'position': self._queued})
+        async with self._slots:
+            self._queued -= 1
+            await self._send(writer, {'job': job_id, 'status': 'running'})
+            outcome = await asyncio.get_running_loop().run_in_executor(self._executor, _run_job, job)
+        await self._send(writer, {'job': job_id, **outcome})
+        if self.is_verbose:
+            print(f"Job {job_id} ({job['data_consumption']}): {outcome['status']}")
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, message: dict):
+        """
+        Sends a message on a connection, unless it has been closed by the client.
+        """
+        if writer.is_closing():
+            return
+        writer.write((json.dumps(message, default=float) + '\n').encode())
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def parse_job(line: bytes) -> dict:
+    """
+    Parses a job, completed with the default values of its fields.
+
+    @param line: json object with the fields of the job.
+    @return Job.
+    """
+    try:
+        job = json.loads(line)
+    except ValueError:
+        raise UserInputException('The job is not a valid json object.')
+    if not isinstance(job, dict):
+        raise UserInputException('The job is not a valid json object.')
+    for field in job:
+        if field not in JOB_DEFAULTS:
+            raise UserInputException(f'Unknown field {field} in the job.')
+    if job.get('data_consumption') is None:
+        raise UserInputException('The job has no consumption file (data_consumption).')
+
+    return {**JOB_DEFAULTS, **job}
+
+
+def submit(job: dict, socket_path: str = None, port: int = None) -> Iterator[dict]:
+    """
+    Sends a job to a server and yields its progress until it is finished.
+
+    @param job: Fields of the job, see `JOB_DEFAULTS`.
+    @param socket_path: Unix socket of the server.
+    @param port: TCP port of the server on the local host, if it has no socket.
+    @return Iterator on the progress messages of the job.
+    """
+    if socket_path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(socket_path)
+    else:
+        connection = socket.create_connection(('127.0.0.1', port))
+    with connection:
+        connection.sendall((json.dumps(job) + '\n').encode())
+        connection.shutdown(socket.SHUT_WR)
+        with connection.makefile('r') as messages:
+            for line in messages:
+                yield json.loads(line)
+
+
+def _initialize_worker(cache_path: str, cache_size: int):
+    """
+    Initializes the state of a process running jobs.
+    """
+    global _cache
+    _cache = InputsCache(cache_path, cache_size)
+    _inputs.clear()
+    _optimizers.clear()
+
+
+def _run_job(job: dict) -> dict:
+    """
+    Optimizes the repartition keys of a job and saves its results.
+
+    @param job: Job, see `parse_job`.
+    @return Outcome of the job.
+    """
+    tic = time.time()
+    try:
+        inputs, optimizer = _warm_inputs(job)
+        os.makedirs(job['output_path'], exist_ok=True)
+        results = optimizer.optimization_keys(inputs)
+        analysis = CostAnalysis(inputs, results)
+        analysis.analyze(is_saved=job['output_format'] == 'csv')
+        save_run(inputs, results, analysis, job['output_path'], data_format=job['output_format'],
+                 metadata={'job': job, 'timings': optimizer.timings, 'created': time.strftime('%Y-%m-%dT%H:%M:%S')})
+    except SolverException as e:
+        return {'status': 'infeasible', 'message': ' '.join(str(e).split())}
+    except (ParsingException, UserInputException, OSError) as e:
+        return {'status': 'failed', 'message': f'{type(e).__name__}: {e}'}
+    except Exception:
+        return {'status': 'failed', 'message': traceback.format_exc()}
+
+    return {'status': 'optimal', 'objective': results['objective'].iloc[0], 'ssr_rec': results['ssr_rec'].iloc[0],
+            'output_path': job['output_path'], 'timings': {**optimizer.timings, 'total': time.time() - tic}}
+
+
+def _warm_inputs(job: dict) -> Tuple[RepartitionKeysInputs, Optimizer]:
+    """
+    Inputs and optimizer of a job, reusing the ones of the previous jobs of the process on the same data.
+    """
+    input_options = dict()
+    if job['input_options'] is not None:
+        with open(job['input_options'], 'r') as f:
+            input_options = json.loads(f.read())
+    key = _cache.key([job['data_consumption'], job['data_production']], job['initial_keys'],
+                     input_options.get('scaling'), np.float64)
+
+    if key in _inputs:
+        _inputs.move_to_end(key)
+    else:
+        _inputs[key] = RepartitionKeysInputs(consumption_path=job['data_consumption'],
+                                             production_path=job['data_production'],
+                                             initial_keys_path=job['initial_keys'], output_path=job['output_path'],
+                                             input_options_path=job['input_options'], cache=_cache)
+        while len(_inputs) > MAX_WARM_INPUTS:
+            evicted, _ = _inputs.popitem(last=False)
+            for optimizer_key in [k for k in _optimizers if k[0] == evicted]:
+                del _optimizers[optimizer_key]
+    inputs = _inputs[key].with_options({o: v for o, v in input_options.items() if o != 'scaling'}, is_merged=False)
+    inputs.output_path = job['output_path']
+
+    optimizer_options = {argument: job[field] for field, argument in OPTIMIZER_FIELDS.items()}
+    optimizer_key = (key, json.dumps(optimizer_options, sort_keys=True))
+    if optimizer_key not in _optimizers:
+        _optimizers[optimizer_key] = Optimizer(**optimizer_options, is_persistent=job['backend'] == 'matrix')
+
+    return inputs, _optimizers[optimizer_key]
@@ -0,0 +1,169 @@
+import itertools
+import json
+import os
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from .repartition_keys_inputs import RepartitionKeysInputs, UserInputException, OPTIONS
+from .optimizer import Optimizer, SolverException
+from .cost_analysis import CostAnalysis
+from .utils import save_run
+
+MARKER_FILE = 'sweep_point.json'  # Written in the output directory of a grid point once it is finished.
+
+# Worker state, shared by all the grid points solved by the same process
+_inputs: RepartitionKeysInputs = None
+_optimizer_options: dict = dict()
+_output_format: str = 'csv'
+_inputs_per_keys: Dict[str, RepartitionKeysInputs] = dict()
+_optimizers: Dict[str, Optimizer] = dict()
+
+
+def read_grid(path: str) -> List[dict]:
+    """
+    Reads a grid specification and expands it into the list of its points.
+
+    The specification is a json file {parameter: [values]} where the parameters are the initial keys
+    ("initial_keys") or any option of the inputs file except the scaling factors. The grid is the cartesian product of
+    the values.
+
+    @param path: Path to the json grid specification.
+    @return List of grid points, each one being a dictionary {parameter: value}.
+    """
+    with open(path, 'r') as f:
+        grid = json.loads(f.read())
+
+    for parameter, values in grid.items():
+        if parameter != 'initial_keys' and parameter not in OPTIONS:
+            raise UserInputException(f'Unknown parameter {parameter} in the grid specification.')
+        if not isinstance(values, list) or len(values) == 0:
+            raise UserInputException(f'The values of {parameter} in the grid specification must be a non-empty list.')
+
+    # Points sharing the same initial keys are kept together so that they can reuse the same model
+    parameters = sorted(grid, key=lambda p: p != 'initial_keys')
+    return [dict(zip(parameters, values)) for values in itertools.product(*(grid[p] for p in parameters))]
+
+
+def point_name(point: dict) -> str:
+    """
+    Names the output directory of a grid point after its parameters, so that it does not depend on the position of
+    the point in the grid.
+
+    @param point: Grid point.
+    @return Directory name.
+    """
+    values = {p: v if isinstance(v, str) else json.dumps(v, sort_keys=True, separators=(',', ':')).replace('"', '')
+              for p, v in point.items()}
+    return '__'.join(f'{parameter}={value}' for parameter, value in values.items()).replace(os.sep, '-')
+
+
+def run_sweep(inputs: RepartitionKeysInputs, points: List[dict], output_path: str, jobs: int = 1,
+              solver_name: str = 'cbc', backend: str = 'pyomo', is_closed_form: bool = True,
+              block_frequency: str = 'W', output_format: str = 'csv', is_verbose: bool = False) -> pd.DataFrame:
+    """
+    Optimizes the repartition keys for every point of a grid, writing the results of each point in its own directory.
+    The points already finished in a previous run are skipped.
+
+    @param inputs: Input data structure, parsed once for the whole sweep.
+    @param points: Grid points.
+    @param output_path: Output path, one directory per point is created inside.
+    @param jobs: Maximum number of processes solving points in parallel.
+    @param solver_name: Solver name.
+    @param backend: Model backend.
+    @param is_closed_form: Boolean true to solve without solver the points without minimum self-sufficiency rates.
+    @param block_frequency: Blocks of time steps of the decomposition backend.
+    @param output_format: Format of the results of each point, see `save_run`.
+    @param is_verbose: Boolean true to report the progress.
+    @return Summary of the sweep, one row per point.
+    """
+    pending = [p for p in points if not os.path.exists(os.path.join(output_path, point_name(p), MARKER_FILE))]
+    if is_verbose:
+        print(f'{len(points) - len(pending)} of {len(points)} grid points already finished.')
+
+    optimizer_options = {'solver_name': solver_name, 'backend': backend, 'is_closed_form': is_closed_form,
+                         'block_frequency': block_frequency}
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_initialize_worker,
+                                 initargs=(inputs, optimizer_options, output_format)) as executor:
+            for point, status in executor.map(_solve_point, pending, itertools.repeat(output_path)):
+                if is_verbose:
+                    print(f'{point_name(point)}: {status}')
+    else:
+        _initialize_worker(inputs, optimizer_options, output_format)
+        for point in pending:
+            _, status = _solve_point(point, output_path)
+            if is_verbose:
+                print(f'{point_name(point)}: {status}')
+
+    summary = pd.DataFrame([_read_marker(os.path.join(output_path, point_name(p))) for p in points])
+    summary.to_csv(os.path.join(output_path, 'sweep.csv'), index=False)
+
+    return summary
+
+
+def _initialize_worker(inputs: RepartitionKeysInputs, optimizer_options: dict, output_format: str):
+    """
+    Initializes the state of a process solving grid points.
+    """
+    global _inputs, _optimizer_options, _output_format
+    _inputs = inputs
+    _optimizer_options = optimizer_options
+    _output_format = output_format
+    _inputs_per_keys.clear()
+    _optimizers.clear()
+
+
+def _solve_point(point: dict, output_path: str) -> Tuple[dict, str]:
+    """
+    Optimizes the repartition keys for one grid point and saves its results.
+
+    @param point: Grid point.
+    @param output_path: Output path of the sweep.
+    @return Grid point and its status.
+    """
+    path = os.path.join(output_path, point_name(point))
+    os.makedirs(path, exist_ok=True)
+
+    # Initial keys and model are reused by all the points of this process with the same initial keys
+    initial_keys = point.get('initial_keys', _inputs.initial_keys_path)
+    if initial_keys not in _inputs_per_keys:
+        _inputs_per_keys[initial_keys] = _inputs.with_initial_keys(initial_keys)
+        _optimizers[initial_keys] = Optimizer(
+            **_optimizer_options, is_persistent=_optimizer_options['backend'] == 'matrix'
+        )
+    inputs = _inputs_per_keys[initial_keys].with_options({p: v for p, v in point.items() if p != 'initial_keys'})
+    inputs.output_path = path
+
+    marker = {'point': point_name(point), **point}
+    try:
+        results = _optimizers[initial_keys].optimization_keys(inputs)
+    except SolverException as e:
+        marker.update(status='infeasible', message=' '.join(str(e).split()))
+    except Exception:
+        return point, f'failed\n{traceback.format_exc()}'
+    else:
+        analysis = CostAnalysis(inputs, results)
+        analysis.analyze(is_saved=_output_format == 'csv')
+        save_run(inputs, results, analysis, path, data_format=_output_format,
+                 metadata={'point': point, 'optimizer_options': _optimizer_options})
+        marker.update(status='optimal', objective=results['objective'].iloc[0], ssr_rec=results['ssr_rec'].iloc[0])
+
+    with open(os.path.join(path, MARKER_FILE), 'w') as f:
+        f.write(json.dumps(marker, default=float))
+
+    return point, marker['status']
+
+
+def _read_marker(path: str) -> dict:
+    """
+    Reads the marker of a grid point, if it is finished.
+    """
+    try:
+        with open(os.path.join(path, MARKER_FILE), 'r') as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return {'point': os.path.basename(path), 'status': 'failed'}
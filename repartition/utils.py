@@ -1,8 +1,20 @@
-from typing import Dict
+import datetime
+import os
+
+from typing import Dict, List, Tuple
 
 import numpy as np
 import pandas as pd
 
+from .results_store import save_results_store, results_store_path, check_pyarrow
+
+
+RESULT_ARRAYS = (  # Results of an optimization given per time step and user.
+    'optimized_keys', 'allocated_production', 'verified_allocated_production', 'locally_sold_production'
+)
+BINARY_FORMATS = {'parquet': '.parquet', 'feather': '.feather', 'npz': '.npz', 'npy': '.npy'}  # Extension per format
+PARQUET_EXTENSIONS = {'.parquet', '.pq'}
+
 
 class ParsingException(Exception):
     def __init__(self, indexes: list):
@@ -15,18 +27,188 @@ class ParsingException(Exception):
 
 def read_data(path: str) -> pd.DataFrame:
     """
-    Reads the data needed to compute the repartition of keys.
+    Reads the data needed to compute the repartition of keys. The format is given by the extension of the file:
+
+    - csv: text file, the first column being the index;
+    - parquet, feather: columnar binary files (requires pyarrow);
+    - npz: NumPy archive with the arrays "values", "index" and "columns";
+    - npy: NumPy array of the values, memory-mapped, with an npz sidecar "<name>.index.npz" holding the arrays "index"
+      and "columns".
 
     @param path: Path with the data to read.
     @return Data frame with the read data.
     """
-    df = pd.read_csv(path, header=0, index_col=0, parse_dates=True, infer_datetime_format=True, dtype=float)
+    extension = os.path.splitext(path)[1].lower()
+    if extension in BINARY_FORMATS.values() or extension in PARQUET_EXTENSIONS:
+        df = _read_binary_data(path, extension)
+    else:
+        df = pd.read_csv(path, header=0, index_col=0, parse_dates=True, infer_datetime_format=True, dtype=float)
     null_loc, _ = np.where(df.isna())
     if len(null_loc) != 0:
         raise ParsingException(indexes=df.index[null_loc])
     return df
 
 
+def _read_binary_data(path: str, extension: str) -> pd.DataFrame:
+    """
+    Reads data from a binary file.
+
+    @param path: Path with the data to read.
+    @param extension: Extension of the file.
+    @return Data frame with the read data.
+    """
+    if extension in PARQUET_EXTENSIONS or extension == '.feather':
+        check_pyarrow(extension.lstrip('.'))
+    if extension in PARQUET_EXTENSIONS:
+        df = pd.read_parquet(path)
+    elif extension == '.feather':
+        df = pd.read_feather(path)
+        df = df.set_index(df.columns[0])
+        df.index.name = None
+    elif extension == '.npz':
+        with np.load(path, allow_pickle=False) as data:
+            df = pd.DataFrame(data['values'], index=decode_index(data, 'index'), columns=data['columns'])
+    else:
+        values = np.load(path, mmap_mode='r', allow_pickle=False)
+        with np.load(index_path(path), allow_pickle=False) as index:
+            df = pd.DataFrame(values, index=decode_index(index, 'index'), columns=index['columns'], copy=False)
+
+    return df.astype(float, copy=False)
+
+
+def write_data(df: pd.DataFrame, path: str):
+    """
+    Writes data in the format given by the extension of the file, see `read_data`.
+
+    @param df: Data frame, one column per user and one row per time step.
+    @param path: Path of the file.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    columns = df.columns.astype(str)
+    if extension in PARQUET_EXTENSIONS or extension == '.feather':
+        check_pyarrow(extension.lstrip('.'))
+    if extension in PARQUET_EXTENSIONS:
+        df.set_axis(columns, axis=1).to_parquet(path)
+    elif extension == '.feather':
+        df.set_axis(columns, axis=1).rename_axis('index').reset_index().to_feather(path)
+    elif extension == '.npz':
+        np.savez(path, values=df.to_numpy(dtype=float), **encode_index(df.index, 'index'),
+                 columns=columns.to_numpy(dtype=str))
+    elif extension == '.npy':
+        np.save(path, np.ascontiguousarray(df.to_numpy(dtype=float)))
+        np.savez(index_path(path), **encode_index(df.index, 'index'), columns=columns.to_numpy(dtype=str))
+    else:
+        df.to_csv(path)
+
+
+def convert_data(path: str, data_format: str, output_path: str) -> str:
+    """
+    Converts a data file into another format, see `read_data`.
+
+    @param path: Path of the file to convert.
+    @param data_format: Format of the converted file (csv, parquet, feather, npz or npy).
+    @param output_path: Directory of the converted file, named after the original one.
+    @return Path of the converted file.
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    converted_path = os.path.join(output_path, f'{name}{BINARY_FORMATS.get(data_format, ".csv")}')
+    write_data(read_data(path), converted_path)
+
+    return converted_path
+
+
+def index_path(path: str) -> str:
+    """
+    Path of the index sidecar of a memory-mapped npy file.
+    """
+    return f'{os.path.splitext(path)[0]}.index.npz'
+
+
+def encode_index(index: pd.Index, name: str) -> Dict[str, np.ndarray]:
+    """
+    Encodes an index into arrays of a NumPy archive, read without pickle. Dates are stored as nanoseconds since the
+    epoch (in UTC for timezone-aware dates) with the name of their timezone in the array "<name>_timezone", empty for
+    naive dates. Object arrays are stored as strings.
+
+    @param index: Index to encode.
+    @param name: Name of the array of the index in the archive.
+    @return Arrays to save in the archive.
+    """
+    if isinstance(index, pd.DatetimeIndex):
+        return {name: index.asi8, f'{name}_timezone': np.array(_timezone_name(index.tz))}
+    values = index.to_numpy()
+
+    return {name: values.astype(str) if values.dtype == object else values}
+
+
+def decode_index(archive, name: str) -> pd.Index:
+    """
+    Decodes an index from the arrays of a NumPy archive, see `encode_index`.
+
+    @param archive: Loaded NumPy archive.
+    @param name: Name of the array of the index in the archive.
+    @return Index, a DatetimeIndex for dates.
+    """
+    if f'{name}_timezone' not in archive:
+        return pd.Index(archive[name])
+    index = pd.DatetimeIndex(archive[name])
+    timezone = str(archive[f'{name}_timezone'])
+
+    return index.tz_localize('UTC').tz_convert(timezone) if timezone else index
+
+
+def _timezone_name(timezone: datetime.tzinfo) -> str:
+    """
+    Name of a timezone (e.g. Europe/Brussels), or its offset for a fixed offset (e.g. +01:00), empty if None.
+    """
+    if timezone is None:
+        return ''
+    offset = timezone.utcoffset(None)
+    if offset is None:
+        return str(timezone)
+    minutes = int(offset.total_seconds()) // 60
+
+    return f"{'-' if minutes < 0 else '+'}{abs(minutes) // 60:02d}:{abs(minutes) % 60:02d}"
+
+
+def results_to_frames(arrays: Dict[str, np.ndarray], times: pd.Index, users: pd.Index) -> Dict[str, pd.DataFrame]:
+    """
+    Wraps the results of an optimization given as arrays (see `Optimizer.optimization_arrays`) into data frames, without
+    copying them.
+
+    @param arrays: Result arrays: T x N arrays per time step and user, the self-sufficiency rates of the users, the
+    self-sufficiency rate of the REC and the objective value.
+    @param times: Time steps.
+    @param users: Users.
+    @return Result dictionary.
+    """
+    output = {name: pd.DataFrame(arrays[name], index=times, columns=users, copy=False) for name in RESULT_ARRAYS}
+    output['ssr_user'] = pd.Series(arrays['ssr_user'], index=users, copy=False)
+    output['ssr_rec'] = pd.Series({None: float(arrays['ssr_rec'])})
+    output['objective'] = pd.Series(float(arrays['objective']))
+
+    return output
+
+
+def time_blocks(times: pd.Index, frequency: str, default_length: int) -> List[Tuple[int, int]]:
+    """
+    Splits time steps into blocks of consecutive time steps in the same period (e.g. day or week).
+
+    @param times: Time steps.
+    @param frequency: Period of the blocks, as a pandas frequency, for datetime time steps.
+    @param default_length: Number of time steps of the blocks for other time steps.
+    @return List of (start, stop) positions of the blocks.
+    """
+    if isinstance(times, pd.DatetimeIndex):
+        periods = times.to_period(frequency)
+        starts = np.flatnonzero(np.concatenate([[True], periods[1:] != periods[:-1]]))
+    else:
+        starts = np.arange(0, len(times), default_length)
+    stops = np.append(starts[1:], len(times))
+
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
 def save_df_dict(d: Dict[str, pd.DataFrame], path_prefix: str = '.'):
     """
     Save each data frame of the dictionary into separate csv files named after their key.
@@ -43,6 +225,35 @@ def save_df_dict(d: Dict[str, pd.DataFrame], path_prefix: str = '.'):
             item.to_csv(f'{path_prefix}/{key}.csv', header=True)
 
 
+def save_run(inputs, results: Dict[str, pd.DataFrame], analysis, path_prefix: str = '.', data_format: str = 'csv',
+             metadata: dict = None):
+    """
+    Save the results of one run with the inputs and the cost analysis they derive from.
+
+    @param inputs: Input data structure (RepartitionKeysInputs).
+    @param results: Result dictionary of the optimization.
+    @param analysis: Cost analysis of the results (CostAnalysis).
+    @param path_prefix: Path prefix to the output path.
+    @param data_format: csv for one csv file per result, or npz or parquet for a single file with all of them, see
+    `save_results_store`.
+    @param metadata: Run metadata, only saved in a single file.
+    """
+    run_inputs = {
+        'initial_keys': inputs.initial_keys,
+        'initial_allocated_production': inputs.initial_allocated_production,
+        'consumption': inputs.consumption_total,
+        'production': inputs.production_total,
+        'self_consumption': analysis.self_consumption,
+        'global_sales': analysis.global_sales
+    }
+    if data_format == 'csv':
+        save_df_dict(results, path_prefix)
+        save_df_dict(run_inputs, path_prefix)
+    else:
+        save_results_store({**results, **run_inputs, **analysis.results()},
+                           results_store_path(path_prefix, data_format), metadata)
+
+
 def multiply_data_frames(df1: pd.DataFrame, df2: pd.DataFrame) -> pd.DataFrame:
     """
     Multiplies two data frames column by column.
@@ -1 +1,18 @@
-from .test_ssr import TestSSR
\ No newline at end of file
+from .test_ssr import TestSSR
+from .test_matrix_model import TestMatrixModel
+from .test_sweep import TestSweep
+from .test_repartition_keys_inputs import TestRepartitionKeysInputs
+from .test_closed_form import TestClosedForm
+from .test_decomposition import TestDecomposition
+from .test_cache import TestInputsCache
+from .test_results_store import TestResultsStore
+from .test_profiler import TestProfiler
+from .test_key_evaluator import TestKeyEvaluator
+from .test_keys import TestKeys
+from .test_representative_days import TestRepresentativeDays
+from .test_coarse_to_fine import TestCoarseToFine
+from .test_rolling_horizon import TestRollingHorizon
+from .test_billing_periods import TestBillingPeriods
+from .test_server import TestServer
+from .test_import_time import TestImportTime
+from .test_frontier import TestFrontier
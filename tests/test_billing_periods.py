@@ -0,0 +1,38 @@
+import os
+import unittest
+
+import numpy as np
+
+from benchmarks.generator import generate_community
+from repartition.optimizer import Optimizer
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+
+
+class TestBillingPeriods(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output/billing_periods'
+        paths = generate_community(6, 35 * 96, self.working_path, min_ssr_user=0.08, price_heterogeneity=0.1)
+        self.inputs = RepartitionKeysInputs(initial_keys_path='proportional_dynamic', output_path=self.working_path,
+                                            **paths)
+
+    def test_billing_periods(self):
+        optimizer = Optimizer(billing_period='M', jobs=2)
+        results = optimizer.optimization_arrays(self.inputs)
+        solver = optimizer.billing_period_solver
+        self.assertEqual(len(solver.periods), 2)  # January and 4 days of February
+        self.assertEqual(results['optimized_keys'].shape, (len(self.inputs.times), len(self.inputs.users)))
+
+        # Same results as each period optimized on its own
+        for p, (start, stop) in enumerate(solver.periods):
+            period_results = Optimizer(backend='matrix').optimization_arrays(solver.period_inputs(p))
+            np.testing.assert_allclose(results['verified_allocated_production'][start:stop].sum(axis=0),
+                                       period_results['verified_allocated_production'].sum(axis=0), atol=1e-6)
+            np.testing.assert_allclose(solver.ssr_report().iloc[p, :-1], period_results['ssr_user'], atol=1e-6)
+
+        # Minimum self-sufficiency rates reached in each period
+        report = solver.ssr_report()
+        self.assertTrue((report[self.inputs.users].values
+                         >= self.inputs.user_parameters['minimum_ssr_user'] - 1e-6).all())
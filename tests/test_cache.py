@@ -0,0 +1,91 @@
+import os
+import shutil
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from repartition.cache import InputsCache, CACHED_ARRAYS
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+from repartition.utils import read_data
+
+
+class TestInputsCache(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output/cache'
+        shutil.rmtree(self.working_path, ignore_errors=True)
+
+    @staticmethod
+    def _create_inputs(initial_keys: str, cache: InputsCache = None) -> RepartitionKeysInputs:
+        test_data_folder = 'tests/data/four_users'
+        return RepartitionKeysInputs(
+            consumption_path=f'{test_data_folder}/consumption.csv',
+            production_path=f'{test_data_folder}/production.csv',
+            initial_keys_path=initial_keys,
+            output_path='tests/test_output',
+            input_options_path=f'{test_data_folder}/inputs.json',
+            cache=cache
+        )
+
+    def test_cache_hit(self):
+        cache = InputsCache(self.working_path)
+        expected = self._create_inputs('proportional_dynamic')
+        self._create_inputs('proportional_dynamic', cache)
+        self.assertEqual(len(os.listdir(self.working_path)), 1)
+
+        # Second run read from the cache, with memory-mapped arrays
+        inputs = self._create_inputs('proportional_dynamic', cache)
+        self.assertEqual(len(os.listdir(self.working_path)), 1)
+        self.assertIsInstance(inputs.consumption_values, np.memmap)
+        self.assertTrue(inputs.times.equals(expected.times))
+        self.assertTrue(inputs.users.equals(expected.users))
+        for name in CACHED_ARRAYS:
+            np.testing.assert_array_equal(getattr(inputs, name), getattr(expected, name))
+        self.assertEqual(inputs.price_retailer_in, expected.price_retailer_in)
+
+        # Other initial keys are another entry
+        self._create_inputs('uniform', cache)
+        self.assertEqual(len(os.listdir(self.working_path)), 2)
+
+    def test_cache_timezone(self):
+        # Dates with a timezone offset, e.g. exported in local time
+        data_path = 'tests/test_output/cache_timezone'
+        os.makedirs(data_path, exist_ok=True)
+        for name in ['consumption', 'production']:
+            data = read_data(f'tests/data/four_users/{name}.csv')
+            data.index = data.index.tz_localize('Europe/Brussels')
+            data.to_csv(f'{data_path}/{name}.csv')
+
+        cache = InputsCache(self.working_path)
+        expected = RepartitionKeysInputs(consumption_path=f'{data_path}/consumption.csv',
+                                         production_path=f'{data_path}/production.csv', initial_keys_path='uniform',
+                                         output_path='tests/test_output', cache=cache)
+        inputs = RepartitionKeysInputs(consumption_path=f'{data_path}/consumption.csv',
+                                       production_path=f'{data_path}/production.csv', initial_keys_path='uniform',
+                                       output_path='tests/test_output', cache=cache)
+        self.assertIsInstance(inputs.consumption_values, np.memmap)  # Read from the cache
+        self.assertIsInstance(inputs.times, pd.DatetimeIndex)
+        self.assertTrue((inputs.times == expected.times).all())
+        self.assertEqual(inputs.times[0].utcoffset(), expected.times[0].utcoffset())
+
+    def test_eviction(self):
+        cache = InputsCache(self.working_path)
+        self._create_inputs('proportional_dynamic', cache)
+        entry_size = sum(f.stat().st_size for d in os.scandir(self.working_path) for f in os.scandir(d.path))
+
+        # Room for two entries only, the least recently used one is removed
+        cache.max_size = 2 * entry_size
+        time.sleep(0.01)
+        self._create_inputs('proportional_rolling:4', cache)
+        time.sleep(0.01)
+        self._create_inputs('proportional_dynamic', cache)
+        time.sleep(0.01)
+        self._create_inputs('priority', cache)
+        self.assertEqual(len(os.listdir(self.working_path)), 2)
+        key = cache.key(['tests/data/four_users/consumption.csv', 'tests/data/four_users/production.csv'],
+                        'proportional_rolling:4', None, np.dtype(np.float64))
+        self.assertIsNone(cache.load(key))
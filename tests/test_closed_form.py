@@ -0,0 +1,67 @@
+import os
+import unittest
+
+import numpy as np
+
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+from repartition.optimizer import Optimizer
+from repartition.closed_form import ClosedFormSolver
+
+
+class TestClosedForm(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.debug = False
+        self.working_path = 'tests/test_output'
+
+    def _create_inputs(self, test_data_folder: str, initial_keys: str = 'uniform') -> RepartitionKeysInputs:
+        # Create output folder
+        os.makedirs(self.working_path, exist_ok=True)
+
+        return RepartitionKeysInputs(
+            consumption_path=f'{test_data_folder}/consumption.csv',
+            production_path=f'{test_data_folder}/production.csv',
+            initial_keys_path=initial_keys,
+            output_path=self.working_path,
+            input_options_path=f'{test_data_folder}/inputs.json'
+        )
+
+    def _assert_same_results(self, inputs: RepartitionKeysInputs):
+        self.assertTrue(ClosedFormSolver.is_applicable(inputs))
+        results = ClosedFormSolver(inputs).solve()
+        results_lp = Optimizer(is_debug=self.debug, backend='matrix', is_closed_form=False).optimization_keys(inputs)
+
+        self.assertAlmostEqual(results['objective'].iloc[0] / results_lp['objective'].iloc[0], 1.0, places=6)
+        self.assertAlmostEqual(results['ssr_rec'].iloc[0], results_lp['ssr_rec'].iloc[0], places=6)
+
+        # The solution is feasible
+        keys = results['optimized_keys'].values
+        max_deviations = np.minimum(inputs.user_parameters['max_deviations'], 1.0)
+        self.assertTrue((keys.sum(axis=1) <= 1 + 1e-9).all())
+        self.assertTrue((np.abs(keys - inputs.initial_keys_values) <= max_deviations + 1e-9).all())
+        np.testing.assert_allclose(results['verified_allocated_production'].sum(axis=1),
+                                   results['locally_sold_production'].sum(axis=1))
+
+    def test_four_users(self):
+        for initial_keys in ['uniform', 'proportional_static', 'proportional_dynamic']:
+            self._assert_same_results(self._create_inputs("tests/data/four_users", initial_keys))
+
+    def test_three_users(self):
+        self._assert_same_results(self._create_inputs("tests/data/three_users"))
+
+    def test_price_retailer_out_individual(self):
+        self._assert_same_results(self._create_inputs("tests/data/price_local_out_individual"))
+
+    def test_max_deviation(self):
+        inputs = self._create_inputs("tests/data/four_users", 'proportional_dynamic')
+        for options in [{'default_max_deviation': 0.05}, {'default_price_allocated_energy': 5.0},
+                        {'default_price_deviation_energy': 0.01, 'default_price_allocated_energy': 1.0}]:
+            self._assert_same_results(inputs.with_options(options))
+
+    def test_not_applicable(self):
+        self.assertFalse(ClosedFormSolver.is_applicable(self._create_inputs("tests/data/ssr_user_default")))
+        self.assertFalse(ClosedFormSolver.is_applicable(self._create_inputs("tests/data/ssr_rec")))
+        inputs = self._create_inputs("tests/data/four_users")
+        self.assertFalse(ClosedFormSolver.is_applicable(inputs.with_options({'default_price_deviation_energy': 50.0})))
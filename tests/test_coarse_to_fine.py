@@ -0,0 +1,45 @@
+import os
+import unittest
+
+import numpy as np
+
+from benchmarks.generator import generate_community
+from repartition.optimizer import Optimizer
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+from repartition.utils import time_blocks
+
+
+class TestCoarseToFine(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output/coarse_to_fine'
+        paths = generate_community(6, 7 * 96, self.working_path, min_ssr_user=0.08, price_heterogeneity=0.1)
+        self.inputs = RepartitionKeysInputs(initial_keys_path='proportional_dynamic', output_path=self.working_path,
+                                            **paths)
+        self.exact_results = Optimizer(backend='matrix', is_closed_form=False).optimization_arrays(self.inputs)
+
+    def test_time_aggregate(self):
+        blocks = time_blocks(self.inputs.times, 'H', 4)
+        coarse = self.inputs.time_aggregate(blocks)
+
+        # Same totals, the initial keys allocating the same production
+        self.assertEqual(len(coarse.times), len(blocks))
+        np.testing.assert_allclose(coarse.consumption_values.sum(axis=0), self.inputs.consumption_values.sum(axis=0))
+        np.testing.assert_allclose(coarse.production_values.sum(axis=0), self.inputs.production_values.sum(axis=0))
+        np.testing.assert_allclose(coarse.compact_initial_keys.scale(coarse.production_values.sum(axis=1)),
+                                   coarse.initial_allocated_production_values)
+
+    def test_coarse_to_fine(self):
+        for backend, trust_radius in [('matrix', None), ('matrix', 0.05), ('decomposition', None)]:
+            optimizer = Optimizer(backend=backend, is_closed_form=False, coarse_frequency='H',
+                                  trust_radius=trust_radius)
+            results = optimizer.optimization_arrays(self.inputs)
+
+            # Same optimum as the solve at the original resolution
+            self.assertAlmostEqual(results['objective'], self.exact_results['objective'],
+                                   delta=1e-5 * abs(self.exact_results['objective']))
+            self.assertEqual(results['optimized_keys'].shape, self.exact_results['optimized_keys'].shape)
+            self.assertTrue((results['ssr_user'] >= self.inputs.user_parameters['minimum_ssr_user'] - 1e-6).all())
+            self.assertLessEqual(optimizer.duality_gap, 1e-6)
@@ -0,0 +1,81 @@
+import os
+import unittest
+
+from benchmarks.generator import generate_community
+from repartition.decomposition import DecompositionSolver
+from repartition.matrix_model import MatrixModel
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+from repartition.optimizer import Optimizer, SolverException
+
+
+class TestDecomposition(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.debug = False
+        self.working_path = 'tests/test_output'
+
+    def _create_inputs(self, test_data_folder: str) -> RepartitionKeysInputs:
+        # Create output folder
+        os.makedirs(self.working_path, exist_ok=True)
+
+        return RepartitionKeysInputs(
+            consumption_path=f'{test_data_folder}/consumption.csv',
+            production_path=f'{test_data_folder}/production.csv',
+            initial_keys_path='proportional_dynamic',
+            output_path=self.working_path,
+            input_options_path=f'{test_data_folder}/inputs.json'
+        )
+
+    def _assert_same_results(self, test_data_folder: str, jobs: int = 1):
+        inputs = self._create_inputs(test_data_folder)
+
+        # Hourly blocks of the 2 days of data
+        optimizer = Optimizer(is_debug=self.debug, backend='decomposition', block_frequency='H', jobs=jobs)
+        results = optimizer.optimization_keys(inputs)
+        results_matrix = Optimizer(is_debug=self.debug, backend='matrix').optimization_keys(inputs)
+
+        self.assertLessEqual(optimizer.duality_gap, 1e-6)
+        self.assertAlmostEqual(results['objective'].iloc[0] / results_matrix['objective'].iloc[0], 1.0, places=6)
+        for user in inputs.users:
+            self.assertGreaterEqual(results['ssr_user'][user], inputs.minimum_ssr_user[user] - 1e-4)
+        self.assertEqual(results['optimized_keys'].shape, inputs.consumption.shape)
+        self.assertTrue((results['optimized_keys'].sum(axis=1) <= 1 + 1e-6).all())
+
+    def test_ssr_user_default(self):
+        self._assert_same_results("tests/data/ssr_user_default")
+
+    def test_ssr_user_individual(self):
+        self._assert_same_results("tests/data/ssr_user_individual", jobs=2)
+
+    def test_ssr_rec(self):
+        inputs = self._create_inputs("tests/data/ssr_rec")
+        optimizer = Optimizer(is_debug=self.debug, backend='decomposition', block_frequency='H')
+        self.assertRaises(SolverException, optimizer.optimization_keys, inputs)
+
+    def _create_community(self) -> RepartitionKeysInputs:
+        working_path = f'{self.working_path}/decomposition'
+        paths = generate_community(6, 14 * 96, working_path, price_heterogeneity=0.1)
+        inputs = RepartitionKeysInputs(initial_keys_path='proportional_dynamic', output_path=working_path, **paths)
+
+        return inputs.with_options({'default_min_ssr_user': 0.13})
+
+    def test_dropped_solutions(self):
+        inputs = self._create_community()
+        solver = DecompositionSolver(inputs, block_frequency='D', is_debug=self.debug)
+        results = solver.solve_arrays()
+        model = MatrixModel(inputs)
+        self.assertAlmostEqual(results['objective'] / model.objective(model.solve()), 1.0, places=6)
+
+        # The solutions left out of the combination are dropped
+        self.assertGreater(solver.iterations, 5)
+        self.assertLess(solver.solutions, solver.iterations * len(solver.blocks()))
+
+    def test_not_converged(self):
+        inputs = self._create_community()
+        solver = DecompositionSolver(inputs, block_frequency='D', max_iterations=2, is_debug=self.debug)
+        with self.assertLogs(level='WARNING') as logs:
+            solver.solve_arrays()
+        self.assertGreater(solver.duality_gap, solver.tolerance)
+        self.assertIn('did not converge', logs.output[0])
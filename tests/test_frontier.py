@@ -0,0 +1,53 @@
+import os
+import unittest
+
+import numpy as np
+
+from benchmarks.generator import generate_community
+from repartition.frontier import SSRFrontier
+from repartition.matrix_model import MatrixModel
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+
+
+class TestFrontier(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output/frontier'
+        paths = generate_community(6, 7 * 96, self.working_path, price_heterogeneity=0.1)
+        self.inputs = RepartitionKeysInputs(initial_keys_path='proportional_dynamic', output_path=self.working_path,
+                                            **paths)
+
+    def _solve(self, input_options: dict) -> tuple:
+        model = MatrixModel(self.inputs.with_options(input_options))
+        return model, model.solve()
+
+    def test_frontier_user(self):
+        ssr_frontier = SSRFrontier(self.inputs, target='user')
+        frontier = ssr_frontier.solve()
+        self.assertGreater(len(frontier), 3)
+        self.assertLess(ssr_frontier.solves, 3 * len(frontier))
+        self.assertTrue((np.diff(frontier['marginal_cost'].values[:-1]) > 0).all())  # Convex
+
+        # Same costs as each minimum rate optimized on its own
+        for min_ssr in np.linspace(0.0, ssr_frontier.maximum_ssr, 9):
+            model, solution = self._solve({'default_min_ssr_user': min_ssr, 'min_ssr_user': {}})
+            objective = np.interp(min_ssr, frontier.index, frontier['objective'])
+            self.assertAlmostEqual(objective / model.objective(solution), 1.0, places=6)
+
+        # Maximum feasible rate
+        model, solution = self._solve({'default_min_ssr_user': ssr_frontier.maximum_ssr + 1e-3, 'min_ssr_user': {}})
+        self.assertGreater(model.values(solution, 'slack_ssr_user').max(), 1e-4)
+        self.assertAlmostEqual(frontier['lowest_ssr_user'].iloc[-1], ssr_frontier.maximum_ssr, places=6)
+
+    def test_frontier_rec(self):
+        ssr_frontier = SSRFrontier(self.inputs, target='rec')
+        frontier = ssr_frontier.solve()
+        self.assertEqual(list(frontier.index), [0.0, self.inputs.maximum_ssr()[1]])
+        self.assertAlmostEqual(frontier['ssr_rec'].iloc[-1], ssr_frontier.maximum_ssr, places=6)
+        self.assertEqual(ssr_frontier.solves, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import os
+import unittest
+
+from benchmarks.import_time import measure_import_time, IMPORT_TIME_BUDGET
+
+
+class TestImportTime(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def test_import_time(self):
+        for module in ['repartition', 'repartition.__main__']:
+            elapsed, modules = measure_import_time(module)
+
+            # Pyomo, SciPy's solvers and matplotlib only imported when they are used
+            self.assertEqual(modules, [], module)
+            self.assertLessEqual(elapsed, IMPORT_TIME_BUDGET, module)
+
+    def test_lazy_attributes(self):
+        import repartition
+        from repartition.optimizer import Optimizer
+        self.assertIs(repartition.Optimizer, Optimizer)
+        with self.assertRaises(AttributeError):
+            repartition.Missing
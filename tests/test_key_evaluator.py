@@ -0,0 +1,68 @@
+import os
+import unittest
+
+import numpy as np
+
+from repartition.key_evaluator import KeyEvaluator
+from repartition.optimizer import Optimizer
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+
+
+class TestKeyEvaluator(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output'
+        os.makedirs(self.working_path, exist_ok=True)
+        test_data_folder = 'tests/data/price_local_out_individual'
+        self.inputs = RepartitionKeysInputs(
+            consumption_path=f'{test_data_folder}/consumption.csv',
+            production_path=f'{test_data_folder}/production.csv',
+            initial_keys_path='proportional_dynamic',
+            output_path=self.working_path,
+            input_options_path=f'{test_data_folder}/inputs.json'
+        )
+
+    def test_optimized_keys(self):
+        results = Optimizer(backend='matrix', is_closed_form=False).optimization_arrays(self.inputs)
+        evaluation = KeyEvaluator(self.inputs).evaluate(results['optimized_keys'])
+
+        # The evaluation of the optimized keys gives back the solution of the linear program
+        self.assertAlmostEqual(evaluation['objective'], results['objective'], delta=1e-6 * abs(results['objective']))
+        np.testing.assert_allclose(evaluation['ssr_user'], results['ssr_user'], atol=1e-6)
+        self.assertAlmostEqual(evaluation['ssr_rec'], results['ssr_rec'], places=6)
+        np.testing.assert_allclose(evaluation['verified_allocated_production'],
+                                   results['verified_allocated_production'].sum(axis=0), atol=1e-4)
+        np.testing.assert_allclose(evaluation['locally_sold_production'],
+                                   results['locally_sold_production'].sum(axis=0), atol=1e-4)
+
+    def test_batch(self):
+        evaluator = KeyEvaluator(self.inputs, batch_size=2)
+        strategies = evaluator.evaluate_strategies(['uniform', 'proportional_static', 'proportional_dynamic'])
+        keys = np.stack([self.inputs.with_initial_keys(strategy).initial_keys_values for strategy in strategies])
+        evaluations = evaluator.evaluate(keys)
+
+        # One evaluation per set of keys, the same as when evaluated alone
+        self.assertEqual(evaluations['objective'].shape, (3,))
+        self.assertEqual(evaluations['ssr_user'].shape, (3, len(self.inputs.users)))
+        for k, evaluation in enumerate(strategies.values()):
+            for name, values in evaluation.items():
+                np.testing.assert_allclose(evaluations[name][k], values)
+
+        # The verified allocated production is bounded by the allocated production and the consumption
+        self.assertTrue((evaluations['spilled_production'] >= -1e-9).all())
+        self.assertTrue((evaluations['verified_allocated_production']
+                         <= self.inputs.consumption_values.sum(axis=0) + 1e-9).all())
+
+    def test_redistribution(self):
+        keys = self.inputs.with_initial_keys('uniform').initial_keys_values
+        evaluation = KeyEvaluator(self.inputs).evaluate(keys)
+        redistributed = KeyEvaluator(self.inputs, redistribution_passes=3).evaluate(keys)
+
+        # The redistribution of the spilled production increases the self-consumption of the community
+        self.assertGreater(evaluation['spilled_production'].sum(), 0.0)
+        self.assertLess(redistributed['spilled_production'].sum(), evaluation['spilled_production'].sum())
+        self.assertGreater(redistributed['ssr_rec'], evaluation['ssr_rec'])
+        self.assertAlmostEqual(redistributed['allocated_production'].sum(), evaluation['allocated_production'].sum(),
+                               places=6)
@@ -0,0 +1,80 @@
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from repartition.keys import Keys
+from repartition.optimizer import Optimizer
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+
+
+class TestKeys(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output'
+        os.makedirs(self.working_path, exist_ok=True)
+
+    @staticmethod
+    def _create_inputs(initial_keys: str) -> RepartitionKeysInputs:
+        test_data_folder = 'tests/data/four_users'
+        return RepartitionKeysInputs(
+            consumption_path=f'{test_data_folder}/consumption.csv',
+            production_path=f'{test_data_folder}/production.csv',
+            initial_keys_path=initial_keys,
+            output_path='tests/test_output',
+            input_options_path=f'{test_data_folder}/inputs.json'
+        )
+
+    def test_segments(self):
+        rng = np.random.default_rng(0)
+        blocks = rng.dirichlet(np.ones(3), 4)
+        dense = np.repeat(blocks, [5, 1, 3, 6], axis=0)
+        keys = Keys.from_array(dense)
+
+        # Consecutive time steps with the same keys are stored once
+        self.assertEqual(len(keys.values), 4)
+        np.testing.assert_array_equal(keys.starts, [0, 5, 6, 9])
+        np.testing.assert_array_equal(keys.as_array(), dense)
+        np.testing.assert_allclose(keys.row_sums(), dense.sum(axis=1))
+        factors = rng.uniform(size=15)
+        np.testing.assert_allclose(keys.scale(factors), dense * factors[:, np.newaxis])
+        for start, stop in [(0, 15), (3, 12), (5, 6), (6, 15), (14, 15), (7, 7)]:
+            np.testing.assert_array_equal(keys.time_slice(start, stop).as_array(), dense[start:stop])
+
+        # Static keys are broadcast, time-varying keys are used without copy
+        static = Keys.from_array(np.broadcast_to(blocks[0], (15, 3)))
+        self.assertTrue(static.is_static)
+        self.assertEqual(static.as_array().strides[0], 0)
+        varying = rng.uniform(size=(15, 3))
+        self.assertTrue(np.shares_memory(Keys.from_array(varying).as_array(), varying))
+
+    def test_keys_files(self):
+        inputs = self._create_inputs('proportional_static')
+        keys = inputs.initial_keys
+
+        # Single row file, without index
+        single_row_path = f'{self.working_path}/single_row_keys.csv'
+        keys.iloc[:1].to_csv(single_row_path, index=False)
+        single_row = self._create_inputs(single_row_path)
+        self.assertTrue(single_row.compact_initial_keys.is_static)
+        np.testing.assert_allclose(single_row.initial_keys_values, inputs.initial_keys_values)
+
+        # Keys changing every hour are stored per hour
+        hourly_keys = pd.DataFrame(np.repeat(np.random.default_rng(0).dirichlet(np.ones(len(inputs.users)), 12), 4,
+                                             axis=0), index=inputs.times, columns=inputs.users)
+        hourly_path = f'{self.working_path}/hourly_keys.csv'
+        hourly_keys.to_csv(hourly_path)
+        hourly = self._create_inputs(hourly_path)
+        self.assertEqual(len(hourly.compact_initial_keys.values), 12)
+        np.testing.assert_allclose(hourly.initial_keys_values, hourly_keys.values)
+
+        # Same optimization as with dense keys
+        dense = hourly.with_initial_keys(hourly_path)
+        dense.compact_initial_keys = Keys(hourly_keys.values, np.arange(len(inputs.times)), len(inputs.times))
+        dense.initial_allocated_production_values = dense._compute_initial_allocated_production()
+        objectives = [Optimizer(backend='matrix', is_closed_form=False).optimization_arrays(i)['objective']
+                      for i in (hourly, dense)]
+        self.assertAlmostEqual(objectives[0], objectives[1], places=4)
@@ -0,0 +1,116 @@
+import os
+import unittest
+
+import numpy as np
+
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+from repartition.optimizer import Optimizer, SolverException
+from repartition.matrix_model import MatrixModel
+
+
+class TestMatrixModel(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.solver = 'cbc'
+        self.debug = False
+        self.working_path = 'tests/test_output'
+
+    def _create_inputs(self, test_data_folder: str) -> RepartitionKeysInputs:
+        # Create output folder
+        os.makedirs(self.working_path, exist_ok=True)
+
+        return RepartitionKeysInputs(
+            consumption_path=f'{test_data_folder}/consumption.csv',
+            production_path=f'{test_data_folder}/production.csv',
+            initial_keys_path='proportional_static',
+            output_path=self.working_path,
+            input_options_path=f'{test_data_folder}/inputs.json'
+        )
+
+    def _assert_same_results(self, test_data_folder: str):
+        inputs = self._create_inputs(test_data_folder)
+
+        # Optimize with both backends
+        results_pyomo = Optimizer(solver_name=self.solver, is_debug=self.debug,
+                                  is_closed_form=False).optimization_keys(inputs)
+        results_matrix = Optimizer(is_debug=self.debug, backend='matrix', is_closed_form=False).optimization_keys(inputs)
+
+        # Optimal solutions may differ when the problem is degenerate, the optimal values may not
+        self.assertAlmostEqual(results_pyomo['objective'].iloc[0] / results_matrix['objective'].iloc[0], 1.0, places=6)
+        self.assertAlmostEqual(results_pyomo['ssr_rec'].iloc[0], results_matrix['ssr_rec'].iloc[0], places=4)
+        for user in inputs.users:
+            self.assertGreaterEqual(results_matrix['ssr_user'][user], inputs.minimum_ssr_user[user] - 1e-4)
+        self.assertEqual(results_matrix['optimized_keys'].shape, inputs.consumption.shape)
+
+    def test_ssr_user_default(self):
+        self._assert_same_results("tests/data/ssr_user_default")
+
+    def test_ssr_user_individual(self):
+        self._assert_same_results("tests/data/ssr_user_individual")
+
+    def test_ssr_rec(self):
+        inputs = self._create_inputs("tests/data/ssr_rec")
+        optimizer = Optimizer(is_debug=self.debug, backend='matrix')
+        self.assertRaises(SolverException, optimizer.optimization_keys, inputs)
+
+    def test_price_retailer_out_individual(self):
+        self._assert_same_results("tests/data/price_local_out_individual")
+
+    def test_four_users(self):
+        self._assert_same_results("tests/data/four_users")
+
+    def test_three_users(self):
+        self._assert_same_results("tests/data/three_users")
+
+    def test_persistent_model(self):
+        inputs = self._create_inputs("tests/data/ssr_user_default")
+        optimizer = Optimizer(is_debug=self.debug, backend='matrix', is_persistent=True, is_closed_form=False)
+        optimizer.optimization_keys(inputs)
+
+        # Re-solve the persistent model for other parameters and compare with a model built from scratch
+        for options in [{'default_min_ssr_user': 0.0}, {'default_max_deviation': 0.1},
+                        {'default_price_local_in': 150.0, 'min_ssr_rec': 0.1}]:
+            new_inputs = inputs.with_options(options)
+            results_persistent = optimizer.optimization_keys(new_inputs)
+            self.assertIn('update', optimizer.timings)
+            results_new = Optimizer(is_debug=self.debug, backend='matrix',
+                                    is_closed_form=False).optimization_keys(new_inputs)
+            self.assertAlmostEqual(results_persistent['objective'].iloc[0] / results_new['objective'].iloc[0], 1.0,
+                                   places=6)
+
+    def test_presolve(self):
+        for test_data_folder in ["tests/data/four_users", "tests/data/ssr_user_default"]:
+            inputs = self._create_inputs(test_data_folder)
+            model = MatrixModel(inputs, is_presolve=False)
+            model_presolved = MatrixModel(inputs)
+            self.assertLessEqual(model_presolved.shape[0], model.shape[0])
+            self.assertLessEqual(model_presolved.shape[1], model.shape[1])
+
+            # The variables left out of the model are filled in with their values
+            solution = model.solve()
+            solution_presolved = model_presolved.solve()
+            self.assertAlmostEqual(model.objective(solution) / model_presolved.objective(solution_presolved), 1.0,
+                                   places=6)
+            results = model_presolved.process_results(solution_presolved)
+            self.assertEqual(results['optimized_keys'].shape, inputs.consumption.shape)
+            self.assertTrue((results['optimized_keys'].sum(axis=1) <= 1 + 1e-6).all())
+            self.assertTrue((results['verified_allocated_production'] <= inputs.consumption + 1e-6).all(axis=None))
+
+    def test_result_arrays(self):
+        inputs = self._create_inputs("tests/data/ssr_user_default")
+        for backend in ['pyomo', 'matrix']:
+            optimizer = Optimizer(solver_name=self.solver, backend=backend, is_closed_form=False)
+            arrays = optimizer.optimization_arrays(inputs)
+            results = optimizer.optimization_keys(inputs)
+
+            # Same results, following the order of the times and users of the inputs
+            for name in ['optimized_keys', 'allocated_production', 'verified_allocated_production',
+                         'locally_sold_production']:
+                self.assertIsInstance(arrays[name], np.ndarray)
+                self.assertEqual(arrays[name].shape, inputs.consumption_values.shape)
+                self.assertTrue(results[name].index.equals(inputs.times))
+                self.assertTrue(results[name].columns.equals(inputs.users))
+            np.testing.assert_allclose(arrays['ssr_user'], results['ssr_user'].values)
+            self.assertAlmostEqual(arrays['objective'], results['objective'].iloc[0])
@@ -0,0 +1,52 @@
+import os
+import unittest
+
+from repartition.optimizer import Optimizer
+from repartition.profiler import Profiler
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output'
+        os.makedirs(self.working_path, exist_ok=True)
+
+    def test_matrix_profile(self):
+        test_data_folder = 'tests/data/ssr_user_default'
+        profiler = Profiler(is_tracemalloc=True)
+        ended_phases = list()
+        profiler.add_hook(lambda name, record: ended_phases.append(name))
+
+        with profiler.phase('parsing'):
+            inputs = RepartitionKeysInputs(
+                consumption_path=f'{test_data_folder}/consumption.csv',
+                production_path=f'{test_data_folder}/production.csv',
+                initial_keys_path='proportional_static',
+                output_path=self.working_path,
+                input_options_path=f'{test_data_folder}/inputs.json'
+            )
+        optimizer = Optimizer(backend='matrix', is_closed_form=False, profiler=profiler)
+        optimizer.optimization_keys(inputs)
+
+        # Phases of the run, in order, with their times and memory
+        self.assertEqual(ended_phases, ['parsing', 'build', 'solve', 'results'])
+        for name, record in profiler.phases.items():
+            self.assertGreaterEqual(record['wall_time'], 0.0)
+            self.assertGreaterEqual(record['cpu_time'], 0.0)
+            self.assertGreater(record['tracemalloc_peak'], 0)
+        self.assertAlmostEqual(profiler.phases['solve']['wall_time'], optimizer.timings['solve'], places=2)
+
+        # Size of the model, per family
+        statistics = profiler.report()['statistics']['model']
+        self.assertEqual(sum(statistics['variable_families'].values()), statistics['variables'])
+        self.assertEqual(sum(f['rows'] for f in statistics['constraint_families'].values()),
+                         statistics['constraints'])
+        self.assertEqual(sum(f['nonzeros'] for f in statistics['constraint_families'].values()),
+                         statistics['nonzeros'])
+        self.assertEqual(set(statistics['build_time']['constraints']), set(statistics['constraint_families']))
+
+        profiler.save(f'{self.working_path}/profile.json')
+        self.assertTrue(os.path.exists(f'{self.working_path}/profile.json'))
@@ -0,0 +1,171 @@
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from repartition.keys_strategies import register_keys_strategy, KEYS_STRATEGIES
+from repartition.matrix_model import MatrixModel
+from repartition.optimizer import Optimizer, SolverException
+from repartition.repartition_keys_inputs import RepartitionKeysInputs, UserInputException
+from repartition.results_store import pq
+from repartition.utils import convert_data, read_data, write_data
+
+
+class TestRepartitionKeysInputs(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output'
+
+    @staticmethod
+    def _create_inputs(folder: str, initial_keys: str = 'uniform', dtype: type = np.float64) -> RepartitionKeysInputs:
+        test_data_folder = f'tests/data/{folder}'
+        return RepartitionKeysInputs(
+            consumption_path=f'{test_data_folder}/consumption.csv',
+            production_path=f'{test_data_folder}/production.csv',
+            initial_keys_path=initial_keys,
+            output_path='tests/test_output',
+            input_options_path=f'{test_data_folder}/inputs.json',
+            dtype=dtype
+        )
+
+    def test_arrays(self):
+        inputs = self._create_inputs('four_users')
+
+        # Time series are T x N arrays following the order of the users
+        shape = (len(inputs.times), len(inputs.users))
+        for values in [inputs.data_consumption_values, inputs.data_production_values,
+                       inputs.data_net_consumption_values, inputs.consumption_values, inputs.production_values,
+                       inputs.initial_allocated_production_values]:
+            self.assertEqual(values.shape, shape)
+            self.assertTrue(values.flags['C_CONTIGUOUS'])
+
+        # Static keys are stored as one vector, broadcast to T x N
+        self.assertTrue(inputs.compact_initial_keys.is_static)
+        self.assertEqual(inputs.initial_keys_values.shape, shape)
+        self.assertEqual(inputs.initial_keys_values.strides[0], 0)
+        for user, i in inputs.user_index.items():
+            self.assertEqual(inputs.users[i], user)
+            self.assertEqual(inputs.user_parameters['price_retailer_in'][i], inputs.price_retailer_in[user])
+
+        # Data frames are views of the arrays
+        self.assertTrue(np.shares_memory(inputs.consumption.values, inputs.consumption_values))
+        np.testing.assert_allclose(inputs.consumption_total.values, inputs.consumption_values.sum(axis=1))
+
+    def test_initial_keys(self):
+        for initial_keys in ['uniform', 'proportional_static', 'proportional_dynamic']:
+            inputs = self._create_inputs('four_users', initial_keys)
+            keys_sum = inputs.initial_keys_values.sum(axis=1)
+            self.assertTrue(np.all(keys_sum <= 1 + 1e-9))
+            np.testing.assert_allclose(
+                inputs.initial_allocated_production_values,
+                inputs.initial_keys_values * inputs.production_values.sum(axis=1, keepdims=True)
+            )
+
+    def test_keys_strategies(self):
+        inputs = self._create_inputs('four_users')
+        consumption = inputs.consumption_values
+
+        # A window of one time step gives the proportional dynamic keys
+        np.testing.assert_allclose(inputs.with_initial_keys('proportional_rolling:1').initial_keys_values,
+                                   inputs.with_initial_keys('proportional_dynamic').initial_keys_values)
+        rolling_keys = inputs.with_initial_keys('proportional_rolling:4').initial_keys_values
+        window_consumption = consumption[4:8].sum(axis=0)
+        np.testing.assert_allclose(rolling_keys[7], window_consumption / window_consumption.sum())
+
+        # Priority keys cover the first user before the others, without allocating more than the consumption
+        first_user = inputs.users[-1]
+        allocated = inputs.with_initial_keys(f'priority:{first_user}').initial_allocated_production_values
+        production = inputs.production_values.sum(axis=1)
+        np.testing.assert_allclose(allocated[:, -1], np.minimum(consumption[:, -1], production))
+        self.assertTrue(np.all(allocated <= consumption + 1e-9))
+        np.testing.assert_allclose(allocated.sum(axis=1), np.minimum(consumption.sum(axis=1), production))
+
+        # Registered strategies are used as the built-in ones
+        register_keys_strategy('first_user', lambda i, argument: np.eye(len(i.users))[np.zeros(len(i.times), int)])
+        try:
+            keys = inputs.with_initial_keys('first_user').initial_keys_values
+            np.testing.assert_array_equal(keys[:, 0], 1.0)
+            np.testing.assert_array_equal(keys[:, 1:], 0.0)
+        finally:
+            del KEYS_STRATEGIES['first_user']
+
+        with self.assertRaises(UserInputException):
+            inputs.with_initial_keys('priority:Unknown')
+
+    def test_maximum_ssr(self):
+        inputs = self._create_inputs('four_users', initial_keys='proportional_dynamic')
+        for max_deviation in [1.0, 0.1]:
+            maximum_ssr_user, maximum_ssr_rec = inputs.with_options({'default_max_deviation': max_deviation}) \
+                .maximum_ssr()
+
+            # Each bound is reached by the optimized keys on its own, not beyond (pure producers excepted)
+            is_consumer = inputs.data_consumption_values.sum(axis=0) > 0
+            for u, maximum_ssr in zip(inputs.users[is_consumer], maximum_ssr_user[is_consumer]):
+                for minimum_ssr, slack in [(maximum_ssr - 1e-6, 0.0), (maximum_ssr + 1e-3, 1e-3)]:
+                    model = MatrixModel(inputs.with_options({'default_max_deviation': max_deviation,
+                                                             'min_ssr_user': {u: minimum_ssr}}))
+                    self.assertAlmostEqual(model.values(model.solve(), 'slack_ssr_user')[inputs.user_index[u]],
+                                           slack, delta=1e-5)
+            for minimum_ssr, slack in [(maximum_ssr_rec - 1e-6, 0.0), (maximum_ssr_rec + 1e-3, 1e-3)]:
+                model = MatrixModel(inputs.with_options({'default_max_deviation': max_deviation,
+                                                         'min_ssr_rec': minimum_ssr}))
+                self.assertAlmostEqual(model.values(model.solve(), 'slack_ssr_rec')[0], slack, delta=1e-5)
+
+        # Rates beyond the bounds rejected before building the model
+        optimizer = Optimizer(backend='matrix')
+        with self.assertRaises(SolverException):
+            optimizer.optimization_arrays(inputs.with_options({'min_ssr_rec': maximum_ssr_rec + 0.01}))
+        self.assertNotIn('build', optimizer.timings)
+
+    def test_float32(self):
+        inputs = self._create_inputs('four_users', dtype=np.float32)
+        self.assertEqual(inputs.consumption_values.dtype, np.float32)
+        self.assertEqual(inputs.initial_keys.dtypes.iloc[0], np.float32)
+
+    def test_binary_formats(self):
+        csv_inputs = self._create_inputs('four_users')
+        for data_format in ['npz', 'npy']:
+            output_path = f'{self.working_path}/{data_format}'
+            os.makedirs(output_path, exist_ok=True)
+            paths = {name: convert_data(f'tests/data/four_users/{name}.csv', data_format, output_path)
+                     for name in ['consumption', 'production']}
+            inputs = RepartitionKeysInputs(
+                consumption_path=paths['consumption'],
+                production_path=paths['production'],
+                initial_keys_path='uniform',
+                output_path=self.working_path,
+                input_options_path='tests/data/four_users/inputs.json'
+            )
+            self.assertTrue(inputs.times.equals(csv_inputs.times))
+            self.assertTrue(inputs.users.equals(csv_inputs.users))
+            np.testing.assert_array_equal(inputs.consumption_values, csv_inputs.consumption_values)
+            np.testing.assert_array_equal(inputs.production_values, csv_inputs.production_values)
+
+    @unittest.skipIf(pq is not None, 'pyarrow is installed')
+    def test_binary_formats_without_pyarrow(self):
+        for data_format in ['parquet', 'feather']:
+            with self.assertRaisesRegex(ImportError, f'The {data_format} format requires pyarrow'):
+                convert_data('tests/data/four_users/consumption.csv', data_format, self.working_path)
+
+    def test_binary_formats_timezone(self):
+        # Dates with a timezone offset, e.g. exported in local time
+        output_path = f'{self.working_path}/timezone'
+        os.makedirs(output_path, exist_ok=True)
+        data = read_data('tests/data/four_users/consumption.csv')
+        data.index = data.index.tz_localize('Europe/Brussels')
+        data.to_csv(f'{output_path}/consumption.csv')
+        csv_data = read_data(f'{output_path}/consumption.csv')
+        self.assertIsInstance(csv_data.index, pd.DatetimeIndex)
+
+        for data_format in ['npz', 'npy']:
+            converted = read_data(convert_data(f'{output_path}/consumption.csv', data_format, output_path))
+            self.assertIsInstance(converted.index, pd.DatetimeIndex)
+            self.assertTrue((converted.index == csv_data.index).all())
+            self.assertEqual(converted.index[0].utcoffset(), csv_data.index[0].utcoffset())
+
+        # Named timezones are kept
+        write_data(data, f'{output_path}/named.npz')
+        self.assertTrue(read_data(f'{output_path}/named.npz').index.equals(data.index))
@@ -0,0 +1,79 @@
+import os
+import unittest
+
+import numpy as np
+
+from benchmarks.generator import generate_community
+from repartition.matrix_model import MatrixModel
+from repartition.optimizer import Optimizer
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+
+
+class TestRepresentativeDays(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output/representative_days'
+        paths = generate_community(6, 14 * 96, self.working_path, min_ssr_user=0.1, price_heterogeneity=0.1)
+        self.inputs = RepartitionKeysInputs(initial_keys_path='proportional_dynamic', output_path=self.working_path,
+                                            **paths)
+        self.exact_results = Optimizer(backend='matrix', is_closed_form=False).optimization_arrays(self.inputs)
+
+    def test_time_weights(self):
+        # A day weighted twice is the same as the day repeated
+        day = np.arange(96)
+        repeated = MatrixModel(self.inputs.time_select(np.concatenate([day, day, day + 96])))
+        weighted = MatrixModel(self.inputs.time_select(np.concatenate([day, day + 96])),
+                               time_weights=np.repeat([2.0, 1.0], 96))
+        repeated_results = repeated.result_arrays(repeated.solve())
+        weighted_results = weighted.result_arrays(weighted.solve())
+        self.assertAlmostEqual(weighted_results['objective'], repeated_results['objective'], places=4)
+        np.testing.assert_allclose(weighted_results['ssr_user'], repeated_results['ssr_user'], atol=1e-6)
+
+    def test_all_days(self):
+        # As many representative days as days gives the exact solution
+        optimizer = Optimizer(backend='matrix', is_closed_form=False, representative_days=14)
+        results = optimizer.optimization_arrays(self.inputs)
+        self.assertAlmostEqual(results['objective'], self.exact_results['objective'],
+                               delta=1e-6 * abs(self.exact_results['objective']))
+        for errors in optimizer.representative_days_solver.errors(results, self.exact_results).values():
+            self.assertLess(errors['ssr_user'], 1e-6)
+
+    def test_representative_days(self):
+        optimizer = Optimizer(backend='matrix', is_closed_form=False, representative_days=4)
+        results = optimizer.optimization_arrays(self.inputs)
+        solver = optimizer.representative_days_solver
+
+        # Each day is represented by one of the 4 medoids, itself in its own cluster
+        self.assertEqual(len(solver.medoids), 4)
+        self.assertEqual(len(solver.labels), 14)
+        np.testing.assert_array_equal(solver.labels[solver.medoids], np.arange(4))
+
+        # Results over the whole horizon, close to the exact ones
+        self.assertEqual(results['optimized_keys'].shape, (len(self.inputs.times), len(self.inputs.users)))
+        self.assertTrue((results['verified_allocated_production'] <= self.inputs.consumption_values + 1e-9).all())
+        errors = solver.errors(results, self.exact_results)
+        self.assertLess(errors['estimated']['objective'], 0.05)
+        self.assertLess(errors['horizon']['ssr_rec'], 0.05)
+
+    def test_unreached_targets(self):
+        # Target of User1 reachable over the whole horizon, but not over the representative days alone
+        paths = generate_community(6, 7 * 96, self.working_path, price_heterogeneity=0.1)
+        inputs = RepartitionKeysInputs(initial_keys_path='proportional_dynamic', output_path=self.working_path, **paths)
+        model = MatrixModel(inputs)
+        ssr_user = model.result_arrays(model.solve())['ssr_user'][0]
+        min_ssr_user = ssr_user + 0.7 * (inputs.maximum_ssr()[0][0] - ssr_user)
+        inputs = inputs.with_options({'min_ssr_user': {inputs.users[0]: min_ssr_user}})
+        exact_results = Optimizer(backend='matrix', is_closed_form=False).optimization_arrays(inputs)
+        self.assertGreaterEqual(exact_results['ssr_user'][0], min_ssr_user - 1e-6)
+
+        # The approximate results are kept, with the slack of the reduced problem as an error
+        optimizer = Optimizer(backend='matrix', is_closed_form=False, representative_days=3)
+        with self.assertLogs(level='WARNING') as logs:
+            results = optimizer.optimization_arrays(inputs)
+        self.assertIn(str(inputs.users[0]), logs.output[0])
+        self.assertEqual(results['optimized_keys'].shape, (len(inputs.times), len(inputs.users)))
+        errors = optimizer.representative_days_solver.errors(results, exact_results)
+        self.assertGreater(errors['estimated']['slack_ssr_user'], 1e-4)
+        self.assertEqual(errors['estimated']['slack_ssr_rec'], 0.0)
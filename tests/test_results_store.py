@@ -0,0 +1,59 @@
+import os
+import shutil
+import unittest
+
+import numpy as np
+
+from repartition.cost_analysis import CostAnalysis
+from repartition.optimizer import Optimizer
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+from repartition.results_store import load_results_store, load_results_metadata, results_store_path, pq
+from repartition.utils import save_run
+
+
+class TestResultsStore(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output/results_store'
+        shutil.rmtree(self.working_path, ignore_errors=True)
+        os.makedirs(self.working_path, exist_ok=True)
+
+    def _assert_round_trip(self, data_format: str):
+        test_data_folder = 'tests/data/four_users'
+        inputs = RepartitionKeysInputs(
+            consumption_path=f'{test_data_folder}/consumption.csv',
+            production_path=f'{test_data_folder}/production.csv',
+            initial_keys_path='uniform',
+            output_path=self.working_path,
+            input_options_path=f'{test_data_folder}/inputs.json'
+        )
+        results = Optimizer(backend='matrix').optimization_keys(inputs)
+        analysis = CostAnalysis(inputs, results)
+        analysis.analyze(is_saved=False)
+        save_run(inputs, results, analysis, self.working_path, data_format=data_format, metadata={'solver': 'highs'})
+
+        # Single file with the results, the inputs and the metadata of the run
+        path = results_store_path(self.working_path, data_format)
+        self.assertEqual(os.listdir(self.working_path), [os.path.basename(path)])
+        self.assertEqual(load_results_metadata(path), {'solver': 'highs'})
+        stored = load_results_store(path)
+        for name in ['optimized_keys', 'initial_keys', 'global_sales']:
+            self.assertTrue(stored[name].index.equals(inputs.times))
+            self.assertEqual(list(stored[name].columns), list(inputs.users))
+        np.testing.assert_allclose(stored['optimized_keys'].values, results['optimized_keys'].values)
+        np.testing.assert_allclose(stored['consumption'].values, inputs.consumption_total.values)
+        np.testing.assert_allclose(stored['costs_users'].values, analysis.cost_users.values)
+        self.assertAlmostEqual(stored['objective'].iloc[0], results['objective'].iloc[0])
+
+        # Selective loading
+        self.assertEqual(list(load_results_store(path, ['ssr_user', 'allocated_production'])),
+                         ['ssr_user', 'allocated_production'])
+
+    def test_npz(self):
+        self._assert_round_trip('npz')
+
+    @unittest.skipIf(pq is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        self._assert_round_trip('parquet')
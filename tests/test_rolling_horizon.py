@@ -0,0 +1,49 @@
+import os
+import shutil
+import unittest
+
+import numpy as np
+
+from benchmarks.generator import generate_community
+from repartition.repartition_keys_inputs import RepartitionKeysInputs, UserInputException
+from repartition.rolling_horizon import RollingHorizon
+
+STEPS_PER_DAY = 96
+
+
+class TestRollingHorizon(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output/rolling_horizon'
+        self.state_path = os.path.join(self.working_path, 'state')
+        shutil.rmtree(self.state_path, ignore_errors=True)
+        paths = generate_community(6, 3 * STEPS_PER_DAY, self.working_path, min_ssr_user=0.08,
+                                   price_heterogeneity=0.1)
+        self.inputs = RepartitionKeysInputs(initial_keys_path='proportional_dynamic', output_path=self.working_path,
+                                            **paths)
+
+    def test_rolling_horizon(self):
+        for day in range(3):
+            # State read back by a new run every day
+            rolling_horizon = RollingHorizon(self.state_path)
+            window = self.inputs.time_slice(day * STEPS_PER_DAY, (day + 1) * STEPS_PER_DAY)
+            results = rolling_horizon.step(window)
+            self.assertEqual(results['optimized_keys'].shape, (STEPS_PER_DAY, len(self.inputs.users)))
+            self.assertTrue(os.path.isfile(os.path.join(self.state_path, f'window_{day:06d}.npz')))
+
+        # Totals of the whole horizon carried in the state
+        totals = RollingHorizon(self.state_path).carried_totals(self.inputs)
+        np.testing.assert_allclose(totals['consumption'], self.inputs.data_consumption_values.sum(axis=0))
+        self.assertEqual(rolling_horizon.state['windows'], 3)
+        self.assertEqual(rolling_horizon.state['time_steps'], len(self.inputs.times))
+
+        # Running targets reached over the year to date
+        self.assertTrue((results['ssr_user'] >= self.inputs.user_parameters['minimum_ssr_user'] - 1e-6).all())
+
+    def test_overlapping_window(self):
+        window = self.inputs.time_slice(0, STEPS_PER_DAY)
+        RollingHorizon(self.state_path).step(window)
+        with self.assertRaises(UserInputException):
+            RollingHorizon(self.state_path).step(window)
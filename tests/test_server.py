@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+from benchmarks.generator import generate_community
+from repartition.repartition_keys_inputs import UserInputException
+from repartition.server import parse_job, submit
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output/server'
+        self.paths = generate_community(6, 2 * 96, self.working_path, min_ssr_user=0.08)
+        self.socket_path = os.path.join(self.working_path, 'server.sock')
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.server = subprocess.Popen([sys.executable, '-m', 'repartition', 'serve', '--socket', self.socket_path,
+                                        '--cache', os.path.join(self.working_path, 'cache')])
+        for _ in range(300):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.1)
+
+    def tearDown(self):
+        self.server.terminate()
+        self.server.wait()
+
+    def test_parse_job(self):
+        job = parse_job(b'{"data_consumption": "consumption.csv", "backend": "decomposition"}')
+        self.assertEqual(job['backend'], 'decomposition')
+        self.assertEqual(job['initial_keys'], 'uniform')
+        for line in [b'[]', b'{"data_production": "production.csv"}', b'{"data_consumption": "c.csv", "foo": 1}']:
+            with self.assertRaises(UserInputException):
+                parse_job(line)
+
+    def test_server(self):
+        job = {'data_consumption': self.paths['consumption_path'], 'data_production': self.paths['production_path'],
+               'input_options': self.paths['input_options_path'],
+               'output_path': os.path.join(self.working_path, 'results'), 'output_format': 'npz'}
+        first = list(submit(job, self.socket_path))
+        self.assertEqual([m['status'] for m in first], ['queued', 'running', 'optimal'])
+        self.assertTrue(os.path.isfile(os.path.join(self.working_path, 'results', 'results.npz')))
+
+        # Same data: model of the first job updated, same optimum
+        second = list(submit(job, self.socket_path))
+        self.assertIn('update', second[-1]['timings'])
+        self.assertAlmostEqual(second[-1]['objective'], first[-1]['objective'])
+
+        # Errors reported, the server still running
+        self.assertEqual(list(submit({**job, 'data_consumption': 'missing.csv'}, self.socket_path))[-1]['status'],
+                         'failed')
+        self.assertIsNone(self.server.poll())
@@ -0,0 +1,55 @@
+import json
+import os
+import shutil
+import unittest
+
+from repartition.repartition_keys_inputs import RepartitionKeysInputs
+from repartition.sweep import read_grid, run_sweep, point_name, MARKER_FILE
+
+
+class TestSweep(unittest.TestCase):
+
+    def setUp(self):
+        # Set the working directory to the root
+        os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.working_path = 'tests/test_output/sweep'
+
+    def test_sweep_resume(self):
+        # Required inputs
+        test_data_folder = "tests/data/four_users"  # Data corresponding to 2 time-steps.
+        path_consumption = f'{test_data_folder}/consumption.csv'
+        path_production = f'{test_data_folder}/production.csv'
+        input_options = f'{test_data_folder}/inputs.json'
+
+        # Create output folder and grid specification
+        shutil.rmtree(self.working_path, ignore_errors=True)
+        os.makedirs(self.working_path, exist_ok=True)
+        path_grid = f'{self.working_path}/grid.json'
+        with open(path_grid, 'w') as f:
+            f.write(json.dumps({'initial_keys': ['uniform', 'proportional_static'],
+                                'default_max_deviation': [0.1, 1.0]}))
+
+        # Create inputs
+        inputs = RepartitionKeysInputs(
+            consumption_path=path_consumption,
+            production_path=path_production,
+            initial_keys_path='uniform',
+            output_path=self.working_path,
+            input_options_path=input_options
+        )
+
+        # Run the sweep
+        points = read_grid(path_grid)
+        self.assertEqual(len(points), 4)
+        summary = run_sweep(inputs, points, self.working_path, backend='matrix')
+        self.assertEqual(list(summary['status']), ['optimal'] * 4)
+        for point in points:
+            self.assertTrue(os.path.exists(f'{self.working_path}/{point_name(point)}/optimized_keys.csv'))
+
+        # Restart the sweep with one point left
+        os.remove(f'{self.working_path}/{point_name(points[0])}/{MARKER_FILE}')
+        finished_time = os.path.getmtime(f'{self.working_path}/{point_name(points[1])}/{MARKER_FILE}')
+        summary_resumed = run_sweep(inputs, points, self.working_path, backend='matrix')
+        self.assertEqual(finished_time, os.path.getmtime(f'{self.working_path}/{point_name(points[1])}/{MARKER_FILE}'))
+        self.assertTrue(os.path.exists(f'{self.working_path}/{point_name(points[0])}/{MARKER_FILE}'))
+        self.assertAlmostEqual(summary['objective'].sum(), summary_resumed['objective'].sum())